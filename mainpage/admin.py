@@ -1,11 +1,80 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin
+from django.core.paginator import Paginator
+from django.db.models import Max
+from django.utils.functional import cached_property
+from django.utils.html import format_html
 
-from mainpage.models import User, Question, Answer, Tag
+from mainpage import moderation
+from mainpage.models import User, Question, Answer, Tag, PurgeJob, refresh_answer_stats
+
+
+ADMIN_BATCH_SIZE = 1000
+
+
+class EstimatedCountPaginator(Paginator):
+    # На больших таблицах точный COUNT(*) дороже самой страницы.
+    # Без фильтров оцениваем по максимальному id, с фильтрами считаем не дальше COUNT_CAP строк
+    COUNT_CAP = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list.order_by()
+        if not queryset.query.where:
+            return queryset.aggregate(last=Max('pk'))['last'] or 0
+        return queryset[:self.COUNT_CAP].count()
+
+
+def iter_id_batches(queryset, batch_size=ADMIN_BATCH_SIZE):
+    batch = []
+    for pk in queryset.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=batch_size):
+        batch.append(pk)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class ScalableAdminMixin:
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+    @admin.action(description='Деактивировать выбранные (пачками)')
+    def deactivate_selected(self, request, queryset):
+        updated = 0
+        for batch in iter_id_batches(queryset):
+            updated += self.model._base_manager.filter(pk__in=batch).update(is_active=False)
+            self.after_batch_update(batch)
+        self.message_user(request, f'Деактивировано: {updated}', messages.SUCCESS)
+
+    def after_batch_update(self, ids):
+        pass
+
+
+class ModerationAdminMixin:
+    # Удаление из админки идет через mainpage.moderation: объект сразу скрывается,
+    # связанные строки удаляет фоновая очистка (PurgeJob), а не коллектор Django
+    purge_target = None
+
+    def get_deleted_objects(self, objs, request):
+        # страница подтверждения не обходит все связанные объекты
+        objs = list(objs)
+        return [str(obj) for obj in objs[:100]], {self.model._meta.verbose_name_plural: len(objs)}, set(), []
+
+    def delete_model(self, request, obj):
+        moderation.soft_delete(self.purge_target, [obj.pk], moderator=request.user)
+
+    def delete_queryset(self, request, queryset):
+        for batch in iter_id_batches(queryset):
+            moderation.soft_delete(self.purge_target, batch, moderator=request.user)
 
 
 @admin.register(User)
-class UserAdmin(UserAdmin):
+class UserAdmin(ModerationAdminMixin, ScalableAdminMixin, UserAdmin):
+    purge_target = 'user'
+
     # Костыльно вывожу slug, сам он появлятся не хотел
     fieldsets = list(UserAdmin.fieldsets)
     fieldsets.append((None, {'fields': ('slug', 'avatar')}))
@@ -14,21 +83,104 @@ class UserAdmin(UserAdmin):
 
 
 @admin.register(Question)
-class QuestionAdmin(admin.ModelAdmin):
-    list_display = ('title', 'author', 'is_active', 'created_at', 'updated_at')
+class QuestionAdmin(ModerationAdminMixin, ScalableAdminMixin, admin.ModelAdmin):
+    purge_target = 'question'
+    list_display = ('title', 'author', 'answers_count', 'is_active', 'created_at', 'updated_at')
+    list_select_related = ('author', )
+    raw_id_fields = ('author', 'accepted_answer')
+    autocomplete_fields = ('tags', )
+    actions = ('deactivate_selected', 'refresh_stats_selected')
 
     class AnswerInline(admin.TabularInline):
         model = Answer
         extra = 0
-    
+        raw_id_fields = ('author', )
+        # Ответы показываются страницами по PAGE_SIZE, от новых к старым,
+        # следующая страница - параметр ?answers_before=<id>
+        PAGE_SIZE = 20
+
+        def get_queryset(self, request):
+            question_id = request.resolver_match.kwargs.get('object_id')
+            answers = Answer.all_objects.select_related('author')
+            if not question_id:
+                return answers.none()
+
+            page = Answer.all_objects.filter(question_id=question_id).order_by('-id')
+            before = request.GET.get('answers_before')
+            if before and before.isdigit():
+                page = page.filter(id__lt=int(before))
+            return answers.filter(id__in=list(page.values_list('id', flat=True)[:self.PAGE_SIZE]))
+
     inlines = (AnswerInline, )
 
+    def get_queryset(self, request):
+        # в админке нужны и неактивные вопросы
+        return Question.all_objects.order_by('-id')
+
+    def change_view(self, request, object_id, form_url='', extra_context=None):
+        if request.method == 'GET' and object_id:
+            answers = self.AnswerInline(self.model, self.admin_site).get_queryset(request)
+            last_id = min(answers.values_list('id', flat=True), default=None)
+            if last_id and Answer.all_objects.filter(question_id=object_id, id__lt=last_id).exists():
+                self.message_user(request, format_html(
+                    'Показаны не все ответы. <a href="?answers_before={}">Более старые ответы</a>', last_id,
+                ), messages.INFO)
+        return super().change_view(request, object_id, form_url, extra_context)
+
+    @admin.action(description='Пересчитать число ответов и принятый ответ (пачками)')
+    def refresh_stats_selected(self, request, queryset):
+        total = 0
+        for batch in iter_id_batches(queryset):
+            refresh_answer_stats(batch)
+            total += len(batch)
+        self.message_user(request, f'Пересчитано вопросов: {total}', messages.SUCCESS)
+
 
 @admin.register(Answer)
-class AnswerAdmin(admin.ModelAdmin):
-    list_display = ('question', 'author', 'is_active', 'created_at', 'updated_at')
+class AnswerAdmin(ScalableAdminMixin, admin.ModelAdmin):
+    list_display = ('question_title', 'author', 'is_correct', 'is_active', 'created_at', 'updated_at')
+    list_select_related = ('question', 'author')
+    raw_id_fields = ('question', 'author')
+    actions = ('deactivate_selected', )
+
+    def get_queryset(self, request):
+        # текст вопроса в списке не нужен, а он может быть большим
+        return Answer.all_objects.defer('question__detailed').order_by('-id')
+
+    @admin.display(description='Вопрос', ordering='question__title')
+    def question_title(self, answer):
+        return answer.question.title
+
+    def after_batch_update(self, ids):
+        # неактивные ответы не считаются в answers_count
+        question_ids = set(Answer.all_objects.filter(pk__in=ids).values_list('question_id', flat=True))
+        refresh_answer_stats(question_ids)
 
 
 @admin.register(Tag)
 class TagAdmin(admin.ModelAdmin):
-    list_display = ('title', )
\ No newline at end of file
+    list_display = ('title', )
+    search_fields = ('title', ) # для autocomplete тегов в QuestionAdmin
+
+
+@admin.register(PurgeJob)
+class PurgeJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'target', 'target_id', 'status', 'step', 'progress_display', 'moderator', 'created_at', 'updated_at')
+    list_filter = ('status', 'target')
+    list_select_related = ('moderator', )
+    readonly_fields = [field.name for field in PurgeJob._meta.fields]
+    actions = ('resume_selected', )
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.display(description='Прогресс')
+    def progress_display(self, job):
+        return f'{job.deleted_rows}/{job.total_rows} ({job.progress:.0%})'
+
+    @admin.action(description='Продолжить очистку (в фоне)')
+    def resume_selected(self, request, queryset):
+        job_ids = list(queryset.exclude(status__in=('done', 'cancelled')).values_list('id', flat=True))
+        for job_id in job_ids:
+            moderation.schedule_purge(job_id)
+        self.message_user(request, f'Поставлено в очередь: {len(job_ids)}', messages.SUCCESS)
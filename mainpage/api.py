@@ -0,0 +1,213 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Count, OuterRef, Subquery, Sum, IntegerField
+from django.db.models.functions import Coalesce
+from django.http import JsonResponse, Http404, HttpResponseForbidden
+from django.views import View
+
+from mainpage.mixins import QuestionFilterMixin
+from mainpage.models import Question, Answer, Tag, User, Vote
+from mainpage import versions, lookups, suggest
+
+
+def rating_subquery(model, vote_model=Vote):
+    # для архива: model=ArchivedAnswer, vote_model=ArchivedVote, голоса - по типу исходной модели
+    ct = ContentType.objects.get_for_model(getattr(model, 'ARCHIVED_FROM', model))
+    votes = (
+        vote_model.objects.filter(content_type=ct, object_id=OuterRef('pk'))
+        .order_by()
+        .values('object_id')
+        .annotate(total=Sum('value'))
+        .values('total')
+    )
+    return Coalesce(Subquery(votes, output_field=IntegerField()), 0)
+
+
+class JsonApiView(View):
+    http_method_names = [ 'get', 'head', ]
+
+    # поля, которые можно запросить через ?fields=a,b,c
+    FIELDS = ()
+    DEFAULT_FIELDS = ()
+
+    def get_fields(self):
+        fields = self.request.GET.get('fields')
+        if not fields:
+            return list(self.DEFAULT_FIELDS)
+
+        selected = [f for f in fields.split(',') if f in self.FIELDS]
+        if 'id' not in selected:
+            selected.insert(0, 'id') # id нужен для курсора и связей
+        return selected
+
+    def get_version(self):
+        return None, None
+
+    def get_data(self):
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        etag, last_modified = self.get_version()
+
+        response = versions.not_modified_response(request, etag)
+        if response is None:
+            response = JsonResponse(self.get_data(), json_dumps_params={'ensure_ascii': False, 'separators': (',', ':')})
+
+        return versions.set_version_headers(response, etag, last_modified)
+
+
+class QuestionListApiView(QuestionFilterMixin, JsonApiView):
+    FIELDS = ('id', 'slug', 'title', 'excerpt', 'detailed', 'author', 'created_at', 'updated_at', 'rating', 'answers_count', 'accepted_answer', 'tags')
+    DEFAULT_FIELDS = ('id', 'slug', 'title', 'excerpt', 'author', 'created_at', 'rating', 'answers_count', 'accepted_answer', 'tags')
+    DEFAULT_LIMIT = 20
+    MAX_LIMIT = 100
+
+    def get_limit(self):
+        try:
+            limit = int(self.request.GET.get('limit', self.DEFAULT_LIMIT))
+        except ValueError:
+            limit = self.DEFAULT_LIMIT
+        return max(1, min(limit, self.MAX_LIMIT))
+
+    def get_cursor(self):
+        # курсор - id последнего вопроса с предыдущей страницы (лента идет по убыванию id)
+        try:
+            return int(self.request.GET.get('cursor'))
+        except (TypeError, ValueError):
+            return None
+
+    def get_version(self):
+        etag, last_modified = self.get_feed_version()
+        if etag is None:
+            return None, None
+        # курсор, лимит и поля тоже влияют на тело ответа
+        etag = versions.make_etag(etag, self.get_cursor(), self.get_limit(), ','.join(self.get_fields()))
+        return etag, last_modified
+
+    def get_data(self):
+        fields = self.get_fields()
+        limit = self.get_limit()
+        cursor = self.get_cursor()
+
+        questions = self.get_filtered_questions()
+        if cursor is not None:
+            questions = questions.filter(id__lt=cursor)
+
+        annotations = {}
+        if 'rating' in fields:
+            annotations['rating'] = rating_subquery(Question)
+
+        # author и tags - id, slug берутся из кеша lookups без JOIN на каждую страницу
+        value_fields = [f for f in fields if f not in ('tags', 'rating')]
+        if 'author' in value_fields:
+            value_fields[value_fields.index('author')] = 'author_id'
+
+        rows = list(
+            questions.annotate(**annotations)
+            .order_by('-id')
+            .values(*value_fields, *annotations.keys())[:limit + 1]
+        )
+
+        has_next = len(rows) > limit
+        rows = rows[:limit]
+
+        if 'author' in fields:
+            authors = lookups.get_rows(User, [row['author_id'] for row in rows], ('slug', ))
+            for row in rows:
+                row['author'] = authors[row.pop('author_id')]['slug']
+
+        if 'tags' in fields and rows:
+            tags = {row['id']: [] for row in rows}
+            links = list(Question.tags.through.objects.filter(question_id__in=tags.keys()).values_list('question_id', 'tag_id'))
+            tag_rows = lookups.get_rows(Tag, [tag_id for _, tag_id in links], ('slug', ))
+            for question_id, tag_id in links:
+                tags[question_id].append(tag_rows[tag_id]['slug'])
+            for row in rows:
+                row['tags'] = tags[row['id']]
+
+        return {
+            'results': rows,
+            'next_cursor': rows[-1]['id'] if has_next else None,
+        }
+
+
+class QuestionDetailApiView(JsonApiView):
+    FIELDS = ('id', 'slug', 'title', 'detailed', 'detailed_html', 'author', 'created_at', 'updated_at', 'rating', 'answers_count', 'accepted_answer', 'tags')
+    DEFAULT_FIELDS = FIELDS
+    ANSWER_FIELDS = ('id', 'answer_text', 'answer_html', 'author__slug', 'is_correct', 'created_at', 'updated_at')
+
+    def get_version(self):
+        etag, last_modified = versions.question_version(self.kwargs['qid'])
+        if etag is None:
+            raise Http404("Question not found")
+        return versions.make_etag(etag, ','.join(self.get_fields())), last_modified
+
+    def get_data(self):
+        fields = self.get_fields()
+        value_fields = [f for f in fields if f not in ('tags', 'rating')]
+        if 'author' in value_fields:
+            value_fields[value_fields.index('author')] = 'author__slug'
+
+        question = (
+            Question.objects.filter(pk=self.kwargs['qid'])
+            .annotate(rating=rating_subquery(Question))
+            .values(*value_fields, 'rating')
+            .first()
+        )
+        if question is None:
+            raise Http404("Question not found")
+
+        if 'author__slug' in question:
+            question['author'] = question.pop('author__slug')
+        if 'rating' not in fields:
+            question.pop('rating')
+        if 'tags' in fields:
+            question['tags'] = list(Tag.objects.filter(question__id=question['id']).values_list('slug', flat=True))
+
+        # сортируем от лучших ответов к худшим, как на странице вопроса
+        answers = list(
+            Answer.objects.filter(question_id=question['id'])
+            .annotate(rating=rating_subquery(Answer))
+            .order_by('-rating', 'id')
+            .values(*self.ANSWER_FIELDS, 'rating')
+        )
+        for answer in answers:
+            answer['author'] = answer.pop('author__slug')
+
+        question['answers'] = answers
+        return question
+
+
+class TagListApiView(JsonApiView):
+    def get_version(self):
+        return versions.tags_version()
+
+    def get_data(self):
+        tags = Tag.objects.annotate(questions_count=Count('question')).order_by('-questions_count', 'title')
+        return {'results': list(tags.values('id', 'slug', 'title', 'questions_count'))}
+
+
+class LookupCacheStatsApiView(JsonApiView):
+    # счетчики попаданий кеша mainpage.lookups в текущем процессе, только для staff
+    def get(self, request, *args, **kwargs):
+        if not request.user.is_staff:
+            return HttpResponseForbidden()
+        return super().get(request, *args, **kwargs)
+
+    def get_data(self):
+        return {'size': len(lookups.process_cache), 'namespaces': lookups.stats.snapshot()}
+
+
+class SuggestApiView(JsonApiView):
+    # подсказки по префиксу: ?q=dock&kind=tag|question, без kind - оба вида
+    MAX_LIMIT = 20
+
+    def get_data(self):
+        kind = self.request.GET.get('kind')
+        kinds = (kind, ) if kind in (suggest.TAG, suggest.QUESTION) else (suggest.TAG, suggest.QUESTION)
+        try:
+            limit = max(1, min(int(self.request.GET.get('limit', 10)), self.MAX_LIMIT))
+        except ValueError:
+            limit = 10
+
+        found = suggest.index.suggest(self.request.GET.get('q', ''), kinds, limit)
+        return {kind + 's': found[kind] for kind in kinds}
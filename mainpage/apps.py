@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class MainpageConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'mainpage'
+
+    def ready(self):
+        from mainpage import lookups # подключает сигналы сброса кеша
+        from mainpage import suggest # и сигналы индекса подсказок
+        from mainpage import similarity # и индекса похожих вопросов
+
+        if settings.PASSWORD_PRELOAD_COMMON:
+            from mainpage import passwords
+            passwords.preload()
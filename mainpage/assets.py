@@ -0,0 +1,167 @@
+import gzip
+import json
+import mimetypes
+import os
+import re
+from wsgiref.util import FileWrapper
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+from django.utils.http import http_date
+
+from mainpage import compression
+
+try:
+    import brotli
+except ImportError: # brotli не обязателен, без него собираем только .gz
+    brotli = None
+
+
+# Бандлы CSS: одна страница - один файл стилей
+BUNDLES = {
+    'base': ['css/base.css'],
+    'index': ['css/base.css', 'css/index.css'],
+    'question': ['css/base.css', 'css/question.css'],
+    'ask': ['css/base.css', 'css/ask.css'],
+    'login': ['css/base.css', 'css/login.css'],
+    'registration': ['css/base.css', 'css/registration.css'],
+    'settings': ['css/base.css', 'css/settings.css'],
+}
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.txt', '.html', '.json', '.map')
+COMPRESS_MIN_SIZE = 256
+
+
+def bundle_name(name):
+    return f'css/bundles/{name}.css'
+
+
+def minify_css(text):
+    text = re.sub(r'/\*.*?\*/', '', text, flags=re.S)
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+    text = re.sub(r':\s+', ':', text) # пробел перед ':' в селекторе значим, его не трогаем
+    text = text.replace(';}', '}')
+    return text.strip()
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    manifest_strict = False
+
+    def stored_name(self, name):
+        # Без собранного manifest (тесты, свежий checkout) отдаем имена без хеша:
+        # родительский метод попытался бы посчитать хеш файла из пустого STATIC_ROOT
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+    def build_bundles(self, paths):
+        for name, sources in BUNDLES.items():
+            parts = []
+            for source in sources:
+                with self.open(source) as f:
+                    parts.append(f.read().decode())
+
+            target = bundle_name(name)
+            if self.exists(target):
+                self.delete(target)
+            self._save(target, ContentFile(minify_css('\n'.join(parts)).encode()))
+            paths[target] = (self, target)
+
+    def compress(self, name):
+        if not name.endswith(COMPRESSIBLE_EXTENSIONS):
+            return
+
+        path = self.path(name)
+        with open(path, 'rb') as f:
+            content = f.read()
+        if len(content) < COMPRESS_MIN_SIZE:
+            return
+
+        with open(path + '.gz', 'wb') as f:
+            f.write(gzip.compress(content, compresslevel=9, mtime=0))
+        if brotli is not None:
+            with open(path + '.br', 'wb') as f:
+                f.write(brotli.compress(content))
+
+    def post_process(self, paths, dry_run=False, **options):
+        if dry_run:
+            return
+
+        paths = dict(paths)
+        self.build_bundles(paths)
+
+        yield from super().post_process(paths, dry_run, **options)
+
+        # сжимаем заранее, чтобы не тратить CPU на каждый запрос
+        for name in set(paths) | set(self.hashed_files.values()):
+            self.compress(name)
+
+
+class StaticFilesApplication:
+    """WSGI-обертка, которая сама отдает собранную статику из STATIC_ROOT.
+
+    Файлы с хешем в имени (из staticfiles.json) кешируются навсегда,
+    заранее сжатые .br/.gz выбираются по Accept-Encoding.
+    """
+    IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+    DEFAULT_CACHE_CONTROL = 'public, max-age=3600'
+
+    def __init__(self, application, root=None, prefix=None):
+        self.application = application
+        self.root = os.path.realpath(root or settings.STATIC_ROOT)
+        self.prefix = '/' + (prefix or settings.STATIC_URL).strip('/') + '/'
+        self._immutable = None
+
+    @property
+    def immutable(self):
+        if self._immutable is None:
+            try:
+                with open(os.path.join(self.root, 'staticfiles.json')) as f:
+                    self._immutable = frozenset(json.load(f)['paths'].values())
+            except (OSError, ValueError, KeyError):
+                self._immutable = frozenset()
+        return self._immutable
+
+    def find_file(self, name):
+        path = os.path.realpath(os.path.join(self.root, name))
+        if not path.startswith(self.root + os.sep) or not os.path.isfile(path):
+            return None
+        return path
+
+    def __call__(self, environ, start_response):
+        path_info = environ.get('PATH_INFO', '')
+        if not path_info.startswith(self.prefix) or environ.get('REQUEST_METHOD') not in ('GET', 'HEAD'):
+            return self.application(environ, start_response)
+
+        name = path_info[len(self.prefix):]
+        path = self.find_file(name)
+        if path is None:
+            return self.application(environ, start_response)
+
+        content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        headers = [('Vary', 'Accept-Encoding')]
+
+        # модуль brotli здесь не нужен: .br уже собран, поэтому не choose_encoding()
+        accepted = compression.parse_accept_encoding(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if compression.is_accepted(accepted, encoding) and os.path.isfile(path + suffix):
+                path += suffix
+                headers.append(('Content-Encoding', encoding))
+                break
+
+        stat = os.stat(path)
+        cache_control = self.IMMUTABLE_CACHE_CONTROL if name in self.immutable else self.DEFAULT_CACHE_CONTROL
+        headers += [
+            ('Content-Type', content_type),
+            ('Content-Length', str(stat.st_size)),
+            ('Last-Modified', http_date(stat.st_mtime)),
+            ('Cache-Control', cache_control),
+        ]
+        start_response('200 OK', headers)
+
+        if environ['REQUEST_METHOD'] == 'HEAD':
+            return []
+        file_wrapper = environ.get('wsgi.file_wrapper', FileWrapper)
+        return file_wrapper(open(path, 'rb'))
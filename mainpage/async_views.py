@@ -0,0 +1,160 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Q, Sum
+from django.views.generic import TemplateView
+from django.views.generic.edit import FormMixin
+
+from mainpage import versions, lookups, views
+from mainpage.api import rating_subquery
+from mainpage.mixins import ConditionalPageMixin
+from mainpage.models import Question, Answer, Vote
+
+
+# Асинхронные версии ленты и страницы вопроса, включаются ASYNC_VIEWS под ASGI.
+# Независимые запросы страницы выполняются через asyncio.gather.
+# TemplateResponse Django рендерит в sync-потоке, но все, что нужно шаблону
+# (автор, теги, рейтинг), подгружается заранее, чтобы не было запросов на каждую карточку.
+
+sync_question_view = views.QuestionView.as_view()
+
+
+def get_content_types():
+    return ContentType.objects.get_for_model(Question), ContentType.objects.get_for_model(Answer)
+
+
+class AsyncConditionalPageMixin(ConditionalPageMixin):
+    async def get(self, request, *args, **kwargs):
+        request.user = await request.auser()
+
+        (etag, last_modified), sidebar, user = await asyncio.gather(
+            sync_to_async(self.get_page_version)(),
+            sync_to_async(versions.sidebar_version)(),
+            sync_to_async(versions.user_version)(request.user),
+        )
+        if etag is not None:
+            etag = versions.make_etag(etag, *sidebar, *user)
+
+        response = versions.not_modified_response(request, etag)
+        if response is None:
+            response = await self.aget_response(request, *args, **kwargs)
+
+        return self.patch_page_response(request, response, etag, last_modified)
+
+    async def aget_response(self, request, *args, **kwargs):
+        return self.render_to_response(await self.aget_context_data(**kwargs))
+
+
+class IndexView(AsyncConditionalPageMixin, views.IndexView):
+    async def aget_page(self, questions, page):
+        start = (page - 1) * self.QUESTIONS_PER_PAGE
+        rating = await sync_to_async(rating_subquery)(Question)
+        page_questions = (
+            questions.select_related('author')
+            .prefetch_related('tags')
+            .annotate(annotated_rating=rating)
+            .defer('detailed', 'detailed_html')[start:start + self.QUESTIONS_PER_PAGE]
+        )
+        return [question async for question in page_questions]
+
+    async def aget_context_data(self, **kwargs):
+        context = TemplateView.get_context_data(self, **kwargs)
+        questions = (await sync_to_async(self.get_filtered_questions)()).order_by('-id')
+
+        # страницу берем сразу, не дожидаясь количества; если номер вне диапазона - перечитаем
+        requested_page = self.get_requested_page()
+        count, new_questions, (tags, members), follow_context = await asyncio.gather(
+            questions.acount(),
+            self.aget_page(questions, requested_page),
+            sync_to_async(self.get_tags_and_members)(),
+            sync_to_async(self.get_follow_context)(),
+        )
+
+        context['search_query'] = self.request.GET.get('search', '').strip()
+        context['count_questions'] = count
+        context['questions_per_page'] = self.QUESTIONS_PER_PAGE
+        context.update(self.get_pagination(count, self.QUESTIONS_PER_PAGE))
+        if context['page'] != requested_page:
+            new_questions = await self.aget_page(questions, context['page'])
+
+        context['new_questions'] = new_questions
+        context['tags_list'], context['members_list'] = tags, members
+        context.update(follow_context)
+        return context
+
+
+class QuestionView(AsyncConditionalPageMixin, views.QuestionView):
+    async def aget_question_id(self):
+        slug = self.kwargs.get('slug')
+        if slug:
+            return await sync_to_async(lookups.get_question_id)(slug)
+        return self.kwargs.get('qid')
+
+    async def aget_question(self, question_id):
+        questions = Question.objects.select_related('author').prefetch_related('tags').filter(pk=question_id)
+        return await questions.afirst()
+
+    async def aget_answers(self, question_id):
+        rating = await sync_to_async(rating_subquery)(Answer)
+        answers = (
+            Answer.objects.filter(question_id=question_id)
+            .select_related('author')
+            .defer('answer_text')
+            .annotate(annotated_rating=rating)
+        )
+        return [answer async for answer in answers]
+
+    async def aget_question_rating(self, question_ct, question_id):
+        result = await Vote.objects.filter(content_type=question_ct, object_id=question_id).aaggregate(total=Sum('value'))
+        return result['total'] or 0
+
+    async def aget_user_votes(self, question_ct, answer_ct, question_id):
+        # голоса пользователя за вопрос и все его ответы одним запросом
+        if not self.request.user.is_authenticated:
+            return {}
+        votes = Vote.objects.filter(user=self.request.user).filter(
+            Q(content_type=question_ct, object_id=question_id) |
+            Q(content_type=answer_ct, object_id__in=Answer.objects.filter(question_id=question_id).values('id'))
+        )
+        return {(ct_id, object_id): value async for ct_id, object_id, value in votes.values_list('content_type_id', 'object_id', 'value')}
+
+    async def aget_response(self, request, *args, **kwargs):
+        question_id = await self.aget_question_id()
+        if not question_id:
+            # архив и 404 - редкие пути, их обслуживает синхронная версия
+            return await sync_to_async(sync_question_view)(request, *args, **kwargs)
+
+        question_ct, answer_ct = await sync_to_async(get_content_types)()
+        question, answers, question_rating, user_votes, (tags, members) = await asyncio.gather(
+            self.aget_question(question_id),
+            self.aget_answers(question_id),
+            self.aget_question_rating(question_ct, question_id),
+            self.aget_user_votes(question_ct, answer_ct, question_id),
+            sync_to_async(self.get_tags_and_members)(),
+        )
+        if question is None:
+            return await sync_to_async(sync_question_view)(request, *args, **kwargs)
+
+        context = FormMixin.get_context_data(self, **kwargs)
+        context['question'] = question
+        context['question_rating'] = question_rating
+        context['user_vote_question'] = user_votes.get((question_ct.id, question.id), 0)
+
+        # сортируем от лучших ответов к худшим
+        context['answers'] = sorted(
+            [(answer, user_votes.get((answer_ct.id, answer.id), 0), answer.rating) for answer in answers],
+            key=lambda x: x[2], reverse=True,
+        )
+        context['count_answers'] = len(answers)
+        context['answers_per_page'] = self.ANSWERS_PER_PAGE
+        context.update(self.get_pagination(len(answers), self.ANSWERS_PER_PAGE))
+        start = (context['page'] - 1) * self.ANSWERS_PER_PAGE
+        context['best_answers'] = context['answers'][start:start + self.ANSWERS_PER_PAGE]
+
+        context['tags_list'], context['members_list'] = tags, members
+        return self.render_to_response(context)
+
+    async def post(self, request, *args, **kwargs):
+        # запись остается синхронной: транзакции, сигналы, ограничение частоты
+        return await sync_to_async(sync_question_view)(request, *args, **kwargs)
@@ -0,0 +1,159 @@
+import zlib
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError: # brotli не обязателен, без него отдаем только gzip
+    brotli = None
+
+
+# Сжатие HTML и JSON ответов по Accept-Encoding: br (если есть brotli), иначе gzip.
+# Статику сжимает collectstatic заранее (mainpage.assets), здесь - только
+# динамические ответы. Уровни умеренные: страница сжимается на каждый запрос.
+# CSRF-токен в разметке маскируется заново в каждом ответе, поэтому сжатие
+# страниц с формами не открывает BREACH-атаку на токен.
+
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'application/xml', 'image/svg+xml')
+# поток событий должен уходить сразу, буфер компрессора его задержит
+SKIP_TYPES = ('text/event-stream', )
+
+
+def parse_accept_encoding(header):
+    # 'br;q=1.0, gzip;q=0.5, *;q=0' -> {'br': 1.0, 'gzip': 0.5, '*': 0.0}
+    accepted = {}
+    for part in header.split(','):
+        name, _, params = part.strip().partition(';')
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    return accepted
+
+
+def is_accepted(accepted, encoding):
+    # accepted - результат parse_accept_encoding; q=0 означает явный отказ
+    return accepted.get(encoding, accepted.get('*', 0)) > 0
+
+
+def choose_encoding(header):
+    accepted = parse_accept_encoding(header)
+    for encoding in ('br', 'gzip'):
+        if encoding == 'br' and brotli is None:
+            continue
+        if is_accepted(accepted, encoding):
+            return encoding
+    return None
+
+
+class StreamCompressor:
+    """Потоковый компрессор: каждый кусок сразу сбрасывается, чтобы не задерживать поток."""
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == 'br':
+            self.compressor = brotli.Compressor(quality=settings.RESPONSE_BROTLI_QUALITY)
+        else:
+            self.compressor = zlib.compressobj(settings.RESPONSE_GZIP_LEVEL, zlib.DEFLATED, 31) # 31 - формат gzip
+
+    def compress(self, data):
+        if self.encoding == 'br':
+            return self.compressor.process(data) + self.compressor.flush()
+        return self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self.encoding == 'br':
+            return self.compressor.finish()
+        return self.compressor.flush(zlib.Z_FINISH)
+
+
+def compress_bytes(encoding, data):
+    if encoding == 'br':
+        return brotli.compress(data, quality=settings.RESPONSE_BROTLI_QUALITY)
+    compressor = zlib.compressobj(settings.RESPONSE_GZIP_LEVEL, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+def compress_stream(chunks, compressor):
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+async def acompress_stream(chunks, compressor):
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+def should_compress(response):
+    content_type = response.get('Content-Type', '').lower()
+    return (
+        response.status_code == 200
+        and not response.has_header('Content-Encoding')
+        and not response.has_header('Content-Range')
+        and content_type.startswith(COMPRESSIBLE_TYPES)
+        and not content_type.startswith(SKIP_TYPES)
+    )
+
+
+class CompressionMiddleware:
+    # работает и в синхронной, и в асинхронной цепочке (async_views под ASGI)
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.process_response(request, await self.get_response(request))
+
+    def process_response(self, request, response):
+        if not should_compress(response):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding', ))
+
+        encoding = choose_encoding(request.headers.get('Accept-Encoding', ''))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            compressor = StreamCompressor(encoding)
+            if response.is_async:
+                response.streaming_content = acompress_stream(response.streaming_content, compressor)
+            else:
+                response.streaming_content = compress_stream(response.streaming_content, compressor)
+            del response.headers['Content-Length']
+        else:
+            if len(response.content) < settings.RESPONSE_COMPRESS_MIN_SIZE:
+                return response
+            compressed = compress_bytes(encoding, response.content)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        # тело другое, но смысл тот же: сильный ETag становится слабым
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
@@ -0,0 +1,59 @@
+import contextlib
+import gzip
+import io
+import sys
+
+
+# Формат дампа форума: JSONL, одна строка - одна запись вида {"model": ..., ...поля}.
+# Записи идут в порядке MODELS, чтобы при импорте все ссылки уже были известны.
+MODELS = ('user', 'tag', 'question', 'answer', 'vote')
+
+USER_FIELDS = ('id', 'username', 'email', 'password', 'first_name', 'last_name',
+               'is_staff', 'is_superuser', 'is_active', 'date_joined', 'last_login', 'slug', 'avatar')
+TAG_FIELDS = ('id', 'title', 'slug')
+QUESTION_FIELDS = ('id', 'slug', 'title', 'detailed', 'author_id', 'is_active', 'created_at', 'updated_at')
+ANSWER_FIELDS = ('id', 'question_id', 'answer_text', 'author_id', 'is_correct', 'is_active', 'created_at', 'updated_at')
+VOTE_FIELDS = ('user_id', 'value', 'object_id')
+
+
+def is_gzip(path, force=False):
+    return force or str(path).endswith('.gz')
+
+
+@contextlib.contextmanager
+def open_dump(path, mode, compress=False):
+    # '-' - stdin/stdout, *.gz или compress=True - gzip
+    if path == '-':
+        stream = sys.stdout if mode == 'w' else sys.stdin
+        if is_gzip(path, compress):
+            raw = stream.buffer
+            stream = io.TextIOWrapper(gzip.GzipFile(fileobj=raw, mode=mode + 'b'), encoding='utf-8')
+        yield stream
+        stream.flush()
+        return
+
+    if is_gzip(path, compress):
+        f = gzip.open(path, mode + 't', encoding='utf-8')
+    else:
+        f = open(path, mode, encoding='utf-8')
+    with f:
+        yield f
+
+
+@contextlib.contextmanager
+def keep_timestamps(*models):
+    # bulk_create вызывает pre_save, и auto_now/auto_now_add затерли бы даты из дампа
+    fields = [
+        field
+        for model in models
+        for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
@@ -1,5 +1,6 @@
 from django import forms
 from mainpage.models import Question, Answer, User
+from mainpage import similarity
 from django.contrib.auth import password_validation
 from django.contrib.auth.forms import UserCreationForm
 
@@ -23,8 +24,13 @@ class QuestionForm(forms.ModelForm):
         label='Tags',
         required=True,
         error_messages={'required': 'You must enter at least one tag.'},
-        widget=forms.TextInput(attrs={'placeholder': 'Tags (e.g. golang, docker, kubernetes)'}),
+        widget=forms.TextInput(attrs={'placeholder': 'Tags (e.g. golang, docker, kubernetes)', 'data-suggest': 'tag', 'autocomplete': 'off'}),
         )
+
+    # показывается вместе со списком похожих вопросов
+    post_anyway = forms.BooleanField(label='Post anyway', required=False)
+
+    similar_questions = ()
     
     def clean_title(self):
         title = self.cleaned_data.get('title').strip()
@@ -45,6 +51,17 @@ class QuestionForm(forms.ModelForm):
             raise forms.ValidationError('You must enter at least one tag.')
         return tags
 
+    def clean(self):
+        cleaned_data = super().clean()
+        title = cleaned_data.get('title')
+        detailed = cleaned_data.get('detailed')
+
+        if title and detailed and not cleaned_data.get('post_anyway'):
+            self.similar_questions = similarity.find_similar(title, detailed)
+            if self.similar_questions:
+                raise forms.ValidationError('Similar questions already exist. Check them or post anyway.')
+        return cleaned_data
+
 
 class SettingsForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,156 @@
+import asyncio
+import json
+import re
+import threading
+
+from django.db import transaction
+
+
+# Живые обновления страницы вопроса через Server-Sent Events.
+# Хаб живет в памяти процесса: события доходят до подписчиков того же воркера.
+
+EVENTS_PATH_RE = re.compile(r'^/question/id/(?P<qid>\d+)/events$')
+HEARTBEAT_SECONDS = 20
+
+
+class Subscriber:
+    # Одно SSE-соединение. Пока клиент не забрал события, новые события
+    # с тем же ключом заменяют старые (например, промежуточные значения рейтинга)
+    def __init__(self, loop):
+        self.loop = loop
+        self.pending = {}
+        self.ready = asyncio.Event()
+
+    def push(self, key, event, data):
+        self.pending[key] = (event, data)
+        self.ready.set()
+
+    def take(self):
+        events = list(self.pending.values())
+        self.pending.clear()
+        self.ready.clear()
+        return events
+
+
+class Hub:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._channels = {}
+
+    def subscribe(self, channel):
+        subscriber = Subscriber(asyncio.get_running_loop())
+        with self._lock:
+            self._channels.setdefault(channel, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, channel, subscriber):
+        with self._lock:
+            subscribers = self._channels.get(channel)
+            if subscribers:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._channels[channel]
+
+    def subscribers_count(self, channel=None):
+        with self._lock:
+            if channel is not None:
+                return len(self._channels.get(channel, ()))
+            return sum(len(s) for s in self._channels.values())
+
+    def publish(self, channel, key, event, data):
+        # можно вызывать из любого потока, в том числе из синхронных view.
+        # Будим каждый цикл событий один раз, а не каждого подписчика отдельно
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+
+        by_loop = {}
+        for subscriber in subscribers:
+            by_loop.setdefault(subscriber.loop, []).append(subscriber)
+
+        for loop, loop_subscribers in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(self._deliver, loop_subscribers, key, event, data)
+            except RuntimeError: # цикл событий уже закрыт
+                for subscriber in loop_subscribers:
+                    self.unsubscribe(channel, subscriber)
+
+    @staticmethod
+    def _deliver(subscribers, key, event, data):
+        for subscriber in subscribers:
+            subscriber.push(key, event, data)
+
+
+hub = Hub()
+
+
+def question_channel(question_id):
+    return f'question:{question_id}'
+
+
+def publish_after_commit(question_id, key, event, data):
+    transaction.on_commit(lambda: hub.publish(question_channel(question_id), key, event, data))
+
+
+def get_question_id(obj):
+    return obj.id if obj._meta.model_name == 'question' else obj.question_id
+
+
+def has_subscribers(obj):
+    return hub.subscribers_count(question_channel(get_question_id(obj))) > 0
+
+
+def publish_rating(obj, rating):
+    target = obj._meta.model_name
+    publish_after_commit(get_question_id(obj), ('rating', target, obj.id), 'rating', {'target': target, 'id': obj.id, 'rating': rating})
+
+
+def publish_answer(answer):
+    publish_after_commit(answer.question_id, ('answer', answer.id), 'answer', {'id': answer.id})
+
+
+def publish_correct(answer):
+    publish_after_commit(answer.question_id, ('correct', answer.id), 'correct', {'id': answer.id, 'is_correct': answer.is_correct})
+
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def events_application(scope, receive, send, question_id):
+    """Чистое ASGI-приложение без middleware: idle-подписчик стоит одну корутину."""
+    if scope['method'] != 'GET':
+        await send({'type': 'http.response.start', 'status': 405, 'headers': [(b'allow', b'GET')]})
+        await send({'type': 'http.response.body', 'body': b''})
+        return
+
+    async def wait_disconnect():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream; charset=utf-8'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ],
+    })
+
+    channel = question_channel(question_id)
+    subscriber = hub.subscribe(channel)
+    disconnected = asyncio.ensure_future(wait_disconnect())
+    try:
+        await send({'type': 'http.response.body', 'body': b'retry: 5000\n\n', 'more_body': True})
+        while not disconnected.done():
+            ready = asyncio.ensure_future(subscriber.ready.wait())
+            await asyncio.wait({ready, disconnected}, timeout=HEARTBEAT_SECONDS, return_when=asyncio.FIRST_COMPLETED)
+            ready.cancel()
+            if disconnected.done():
+                break
+
+            payload = ''.join(format_event(event, data) for event, data in subscriber.take())
+            await send({'type': 'http.response.body', 'body': (payload or ': ping\n\n').encode(), 'more_body': True})
+    finally:
+        hub.unsubscribe(channel, subscriber)
+        disconnected.cancel()
@@ -0,0 +1,241 @@
+import contextvars
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from mainpage.models import Question, Tag, User
+
+
+# Кеш частых мелких запросов (slug -> id, id -> строка, списки для боковой панели).
+# Два уровня: словарь на время одного запроса и общий LRU процесса с TTL.
+# В своем процессе записи сбрасываются сигналами post_save/post_delete,
+# изменения из других воркеров станут видны не позже, чем через TTL.
+
+MISSING = object()
+
+
+class LRUCache:
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._by_tag = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return MISSING
+            value, expires, tags = item
+            if expires < time.monotonic():
+                self._remove(key)
+                return MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, tags=()):
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, time.monotonic() + self.ttl, tags)
+            for tag in tags:
+                self._by_tag.setdefault(tag, set()).add(key)
+            while len(self._data) > self.maxsize:
+                self._remove(next(iter(self._data)))
+
+    def invalidate(self, tag):
+        with self._lock:
+            for key in self._by_tag.pop(tag, ()):
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._by_tag.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def _remove(self, key):
+        _, _, tags = self._data.pop(key)
+        for tag in tags:
+            keys = self._by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[tag]
+
+
+class Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+
+    def add(self, namespace, kind):
+        with self._lock:
+            counters = self.counters.setdefault(namespace, {'request_hits': 0, 'hits': 0, 'misses': 0})
+            counters[kind] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {namespace: dict(counters) for namespace, counters in self.counters.items()}
+
+
+process_cache = LRUCache(settings.LOOKUP_CACHE_SIZE, settings.LOOKUP_CACHE_TTL)
+stats = Stats()
+request_cache = contextvars.ContextVar('mainpage_request_lookup_cache', default=None)
+
+
+def lookup(namespace, key):
+    full_key = (namespace, key)
+
+    local = request_cache.get()
+    if local is not None and full_key in local:
+        stats.add(namespace, 'request_hits')
+        return local[full_key]
+
+    value = process_cache.get(full_key)
+    if value is MISSING:
+        stats.add(namespace, 'misses')
+        return MISSING
+
+    stats.add(namespace, 'hits')
+    if local is not None:
+        local[full_key] = value
+    return value
+
+
+def store(namespace, key, value, tags=()):
+    full_key = (namespace, key)
+    process_cache.set(full_key, value, tags)
+    local = request_cache.get()
+    if local is not None:
+        local[full_key] = value
+
+
+def cached(namespace, key, loader, tags=()):
+    value = lookup(namespace, key)
+    if value is MISSING:
+        value = loader()
+        store(namespace, key, value, tags)
+    return value
+
+
+def model_tag(model):
+    return ('model', model._meta.label_lower)
+
+
+def slug_tag(model, slug):
+    return ('slug', model._meta.label_lower, slug)
+
+
+def row_tag(model, pk):
+    return ('row', model._meta.label_lower, pk)
+
+
+def slug_to_id(model, slug):
+    # кешируется и отсутствие объекта (None), сбросится при создании объекта с таким slug
+    return cached(
+        model._meta.model_name + '_slug', slug,
+        lambda: model.objects.filter(slug=slug).values_list('id', flat=True).first(),
+        tags=(slug_tag(model, slug), ),
+    )
+
+
+def get_tag_id(slug):
+    return slug_to_id(Tag, slug)
+
+
+def get_user_id(slug):
+    return slug_to_id(User, slug)
+
+
+def get_question_id(slug):
+    return slug_to_id(Question, slug)
+
+
+def get_rows(model, ids, fields):
+    # id -> словарь с полями fields (None, если объекта нет); промахи - одним запросом на все
+    namespace = model._meta.model_name + '_row'
+    fields = tuple(fields)
+    rows, missing = {}, []
+    for pk in dict.fromkeys(ids):
+        row = lookup(namespace, (pk, fields))
+        if row is MISSING:
+            missing.append(pk)
+        else:
+            rows[pk] = row
+
+    if missing:
+        loaded = {row['id']: row for row in model.objects.filter(pk__in=missing).values('id', *fields)}
+        for pk in missing:
+            rows[pk] = loaded.get(pk)
+            store(namespace, (pk, fields), rows[pk], tags=(row_tag(model, pk), ))
+    return rows
+
+
+def get_all(model, queryset):
+    # небольшой список (лучше .values() только с нужными полями); отдаем копии, чтобы вызывающий код мог их менять
+    objects = cached(model._meta.model_name + '_all', None, lambda: list(queryset), tags=(model_tag(model), ))
+    return [copy.copy(obj) for obj in objects]
+
+
+# sender указываем явно: подписка на все модели отключила бы быстрое удаление
+# (например, голосов в toggle_vote)
+@receiver(pre_save, sender=Tag)
+@receiver(pre_save, sender=User)
+@receiver(pre_save, sender=Question)
+def remember_old_slug(sender, instance, raw=False, **kwargs):
+    # при смене slug старый адрес не должен продолжать открываться из кеша
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    instance._lookup_old_slug = sender._base_manager.filter(pk=instance.pk).values_list('slug', flat=True).first()
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Question)
+def invalidate_lookups(sender, instance, **kwargs):
+    process_cache.invalidate(model_tag(sender))
+    process_cache.invalidate(slug_tag(sender, instance.slug))
+    old_slug = instance.__dict__.pop('_lookup_old_slug', None)
+    if old_slug is not None and old_slug != instance.slug:
+        process_cache.invalidate(slug_tag(sender, old_slug))
+    process_cache.invalidate(row_tag(sender, instance.pk))
+
+
+class RequestLookupCacheMiddleware:
+    # умеет работать и в синхронной, и в асинхронной цепочке (async_views под ASGI)
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = request_cache.set({})
+        try:
+            return self.get_response(request)
+        finally:
+            request_cache.reset(token)
+
+    async def __acall__(self, request):
+        token = request_cache.set({})
+        try:
+            return await self.get_response(request)
+        finally:
+            request_cache.reset(token)
@@ -0,0 +1,93 @@
+import datetime
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from mainpage import moderation
+from mainpage.models import Question, Answer, Vote, ArchivedQuestion, ArchivedAnswer, ArchivedVote
+
+
+class Command(BaseCommand):
+    help = 'Перенос неактивных и старых вопросов (с ответами и голосами) в архивные таблицы'
+
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, default=None,
+                            help='Архивировать вопросы, созданные раньше, чем N дней назад')
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--dry-run', action='store_true')
+
+
+    def get_candidates(self, older_than_days):
+        condition = Q(is_active=False)
+        if older_than_days is not None:
+            cutoff = timezone.now().date() - datetime.timedelta(days=older_than_days)
+            condition |= Q(created_at__lt=cutoff)
+        # вопросы и авторы, которых еще чистит модерация, не трогаем: очистка удалит их сама
+        jobs = moderation.unfinished_jobs()
+        return (
+            Question.all_objects.filter(condition)
+            .exclude(id__in=jobs.filter(target='question').values('target_id'))
+            .exclude(author_id__in=jobs.filter(target='user').values('target_id'))
+            .order_by('id').values_list('id', flat=True)
+        )
+
+    @transaction.atomic
+    def archive_batch(self, question_ids):
+        q_ct = ContentType.objects.get_for_model(Question)
+        a_ct = ContentType.objects.get_for_model(Answer)
+
+        questions = Question.all_objects.filter(id__in=question_ids)
+        ArchivedQuestion.objects.bulk_create([
+            ArchivedQuestion(
+                id=q['id'], slug=q['slug'], title=q['title'], detailed=q['detailed'], detailed_html=q['detailed_html'],
+                author_id=q['author_id'], is_active=q['is_active'],
+                created_at=q['created_at'], updated_at=q['updated_at'],
+            )
+            for q in questions.values('id', 'slug', 'title', 'detailed', 'detailed_html', 'author_id', 'is_active', 'created_at', 'updated_at')
+        ])
+
+        tag_links = Question.tags.through.objects.filter(question_id__in=question_ids)
+        ArchivedQuestion.tags.through.objects.bulk_create([
+            ArchivedQuestion.tags.through(archivedquestion_id=question_id, tag_id=tag_id)
+            for question_id, tag_id in tag_links.values_list('question_id', 'tag_id')
+        ])
+
+        answers = Answer.all_objects.filter(question_id__in=question_ids)
+        answer_ids = list(answers.values_list('id', flat=True))
+        ArchivedAnswer.objects.bulk_create([
+            ArchivedAnswer(**a)
+            for a in answers.values('id', 'question_id', 'answer_text', 'answer_html', 'author_id', 'is_correct', 'is_active', 'created_at', 'updated_at')
+        ])
+
+        votes = Vote.objects.filter(
+            Q(content_type=q_ct, object_id__in=question_ids) |
+            Q(content_type=a_ct, object_id__in=answer_ids)
+        )
+        ArchivedVote.objects.bulk_create([
+            ArchivedVote(**v) for v in votes.values('user_id', 'value', 'content_type_id', 'object_id')
+        ])
+
+        # удаляем из горячих таблиц: сначала зависимые строки, потом сами вопросы
+        votes.delete()
+        answers.delete()
+        tag_links.delete()
+        questions.delete()
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        candidates = list(self.get_candidates(options['older_than_days']))
+
+        if options['dry_run']:
+            self.stdout.write(f"Будет перенесено в архив вопросов: {len(candidates)}")
+            return
+
+        for start in range(0, len(candidates), batch_size):
+            # каждая пачка - отдельная короткая транзакция, чтобы не блокировать SQLite надолго
+            self.archive_batch(candidates[start:start + batch_size])
+            self.stdout.write(f"Перенесено в архив: {min(start + batch_size, len(candidates))}/{len(candidates)}")
+
+        self.stdout.write(self.style.SUCCESS(f"Готово, перенесено вопросов: {len(candidates)}"))
@@ -0,0 +1,96 @@
+import asyncio
+import importlib
+import statistics
+import time
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from django.urls import clear_url_caches
+
+from mainpage.models import Question
+
+
+class Command(BaseCommand):
+    help = 'Сравнение синхронных и асинхронных IndexView/QuestionView под ASGI: пропускная способность и задержки'
+
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Запросов на каждый путь и режим')
+        parser.add_argument('--concurrency', type=int, default=20, help='Одновременных запросов')
+        parser.add_argument('--path', action='append', dest='paths', help='Путь для нагрузки, можно несколько раз')
+
+
+    def reload_urls(self):
+        # выбор синхронных/асинхронных представлений происходит при импорте mainpage.urls
+        import mainpage.urls
+        importlib.reload(mainpage.urls)
+        importlib.reload(importlib.import_module(settings.ROOT_URLCONF))
+        clear_url_caches()
+
+    async def request(self, app, path):
+        path, _, query = path.partition('?')
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+            'method': 'GET', 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+            'query_string': query.encode(), 'root_path': '',
+            'headers': [(b'host', b'localhost')],
+            'client': ('127.0.0.1', 50000), 'server': ('localhost', 80),
+        }
+        messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+        status = None
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            await asyncio.Future() # тело уже отдано, ждем отмены как настоящий сервер
+
+        async def send(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+
+        started = time.perf_counter()
+        await app(scope, receive, send)
+        return status, time.perf_counter() - started
+
+    async def run(self, app, path, total, concurrency):
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with semaphore:
+                return await self.request(app, path)
+
+        await self.request(app, path) # прогрев: шаблоны, ContentType, кеши
+        started = time.perf_counter()
+        results = await asyncio.gather(*(one() for _ in range(total)))
+        elapsed = time.perf_counter() - started
+
+        statuses = {status for status, _ in results}
+        if statuses != {200}:
+            raise CommandError(f'{path}: неожиданные статусы {statuses}')
+        latencies = sorted(latency for _, latency in results)
+        return {
+            'rps': total / elapsed,
+            'p50': statistics.median(latencies) * 1000,
+            'p95': latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        }
+
+    def handle(self, *args, **options):
+        paths = options['paths']
+        if not paths:
+            question = Question.objects.order_by('-answers_count').first()
+            paths = ['/'] + ([f'/question/id/{question.id}'] if question else [])
+
+        for mode, async_views in (('sync', False), ('async', True)):
+            with override_settings(ASYNC_VIEWS=async_views):
+                self.reload_urls()
+                app = ASGIHandler()
+                for path in paths:
+                    result = asyncio.run(self.run(app, path, options['requests'], options['concurrency']))
+                    self.stdout.write(
+                        f"{mode:5} {path}: {result['rps']:.0f} req/s, "
+                        f"p50 {result['p50']:.1f} ms, p95 {result['p95']:.1f} ms"
+                    )
+        self.reload_urls()
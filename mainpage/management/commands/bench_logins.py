@@ -0,0 +1,82 @@
+import statistics
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from mainpage.models import User
+
+
+PASSWORD = 'bench-Password-123'
+
+
+class Command(BaseCommand):
+    help = 'Пропускная способность входа: много потоков вызывают authenticate(), хеши считаются в пуле mainpage.passwords'
+
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16, help='Потоков-"запросов"')
+        parser.add_argument('--users', type=int, default=16, help='Тестовых пользователей, половина со старым pbkdf2_sha256')
+        parser.add_argument('--logins', type=int, default=10, help='Входов на поток')
+        parser.add_argument('--keep', action='store_true', help='Не удалять тестовых пользователей')
+
+
+    def worker(self, usernames, logins, latencies, failures):
+        try:
+            for i in range(logins):
+                started = time.perf_counter()
+                user = authenticate(username=usernames[i % len(usernames)], password=PASSWORD)
+                latencies.append(time.perf_counter() - started)
+                if user is None:
+                    failures.append(usernames[i % len(usernames)])
+        finally:
+            connection.close() # у каждого потока свое соединение
+
+    def handle(self, *args, **options):
+        User.objects.filter(username__startswith='bench-login-').delete()
+        legacy = make_password(PASSWORD, hasher='pbkdf2_sha256')
+        User.objects.bulk_create([
+            User(username=f'bench-login-{i}', slug=f'bench-login-{i}', password=legacy if i % 2 else make_password(PASSWORD))
+            for i in range(options['users'])
+        ])
+        usernames = [f'bench-login-{i}' for i in range(options['users'])]
+
+        latencies, failures = [], []
+        threads = [
+            threading.Thread(target=self.worker, args=(usernames[n::options['threads']] or usernames, options['logins'], latencies, failures))
+            for n in range(options['threads'])
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        algorithms = {}
+        for password in User.objects.filter(username__startswith='bench-login-').values_list('password', flat=True):
+            algorithm = identify_hasher(password).algorithm
+            algorithms[algorithm] = algorithms.get(algorithm, 0) + 1
+
+        self.stdout.write(
+            f"Входов: {len(latencies)} за {elapsed:.2f} с, {len(latencies) / elapsed:.1f} входов/с, "
+            f"потоков: {options['threads']}, пул: {settings.PASSWORD_HASHING_WORKERS}"
+        )
+        self.stdout.write(
+            f"Задержка: p50 {statistics.median(latencies) * 1000:.0f} мс, "
+            f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.0f} мс"
+        )
+        self.stdout.write(f"Хеши после входа: {algorithms}")
+
+        if not options['keep']:
+            User.objects.filter(username__startswith='bench-login-').delete()
+
+        if failures:
+            self.stderr.write(self.style.ERROR(f"Неудачных входов: {len(failures)}"))
+        else:
+            self.stdout.write(self.style.SUCCESS('Все входы успешны'))
@@ -0,0 +1,131 @@
+import io
+import os
+import statistics
+import time
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from mainpage.management.commands.bench_asgi import Command as BenchAsgiCommand
+
+
+class SendfileWrapper:
+    """wsgi.file_wrapper как у gunicorn: файл уходит через os.sendfile.
+
+    Вместо сокета пишем в /dev/null, так что меряется стоимость самого
+    приложения, а не сети.
+    """
+    def __init__(self, filelike, block_size=8192):
+        self.filelike = filelike
+        self.block_size = block_size
+
+    def send(self, out_fd, length):
+        fd = self.filelike.fileno()
+        offset = os.lseek(fd, 0, os.SEEK_CUR)
+        end = offset + length if length is not None else os.fstat(fd).st_size
+        while offset < end:
+            sent = os.sendfile(out_fd, fd, offset, min(end - offset, 1 << 30))
+            if sent == 0:
+                break
+            offset += sent
+        return offset
+
+    def close(self):
+        self.filelike.close()
+
+
+class Command(BaseCommand):
+    help = 'Пропускная способность отдачи MEDIA_ROOT: django.views.static.serve против mainpage.media.serve'
+
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Запросов на каждый сценарий')
+        parser.add_argument('--path', help='Файл внутри MEDIA_ROOT, по умолчанию самый большой аватар')
+
+
+    def pick_file(self):
+        root = os.path.join(settings.MEDIA_ROOT, 'avatars')
+        try:
+            names = [name for name in os.listdir(root) if os.path.isfile(os.path.join(root, name))]
+        except FileNotFoundError:
+            names = []
+        if not names:
+            raise CommandError('В MEDIA_ROOT/avatars нет файлов, укажите --path')
+        return 'avatars/' + max(names, key=lambda name: os.path.getsize(os.path.join(root, name)))
+
+    def request(self, app, path, out_fd, headers):
+        environ = {
+            'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '', 'SCRIPT_NAME': '',
+            'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+            'HTTP_HOST': 'localhost', 'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(),
+            'wsgi.file_wrapper': SendfileWrapper,
+            **headers,
+        }
+        result = {}
+
+        def start_response(status, response_headers):
+            result['status'] = int(status.split()[0])
+            result['headers'] = dict(response_headers)
+
+        started = time.perf_counter()
+        body = app(environ, start_response)
+        sent = 0
+        try:
+            if isinstance(body, SendfileWrapper):
+                length = result['headers'].get('Content-Length')
+                sent = body.send(out_fd, int(length) if length is not None else None)
+            else:
+                for chunk in body:
+                    sent += os.write(out_fd, chunk)
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+        return result['status'], result['headers'], sent, time.perf_counter() - started
+
+    def run(self, app, path, total, headers, out_fd):
+        self.request(app, path, out_fd, headers) # прогрев
+        latencies, sent, statuses = [], 0, set()
+        started = time.perf_counter()
+        for _ in range(total):
+            status, _, size, latency = self.request(app, path, out_fd, headers)
+            statuses.add(status)
+            latencies.append(latency)
+            sent += size
+        elapsed = time.perf_counter() - started
+        latencies.sort()
+        return {
+            'statuses': statuses,
+            'rps': total / elapsed,
+            'mbps': sent / elapsed / 2 ** 20,
+            'p50': statistics.median(latencies) * 1000,
+            'p95': latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        }
+
+    def handle(self, *args, **options):
+        path = '/' + settings.MEDIA_URL.strip('/') + '/' + (options['path'] or self.pick_file())
+        reload_urls = BenchAsgiCommand().reload_urls
+
+        out_fd = os.open(os.devnull, os.O_WRONLY)
+        try:
+            for mode, media_serve in (('static()', False), ('media', True)):
+                with override_settings(MEDIA_SERVE=media_serve, DEBUG=True, ALLOWED_HOSTS=['localhost']):
+                    reload_urls()
+                    app = WSGIHandler()
+                    _, headers, size, _ = self.request(app, path, out_fd, {})
+                    scenarios = {
+                        'full': {},
+                        'revalidate': {'HTTP_IF_NONE_MATCH': headers['ETag']} if 'ETag' in headers
+                                      else {'HTTP_IF_MODIFIED_SINCE': headers['Last-Modified']},
+                        'range': {'HTTP_RANGE': f'bytes=0-{max(size // 4, 1) - 1}'},
+                    }
+                    for scenario, request_headers in scenarios.items():
+                        result = self.run(app, path, options['requests'], request_headers, out_fd)
+                        self.stdout.write(
+                            f"{mode:9} {scenario:10} {sorted(result['statuses'])}: {result['rps']:.0f} req/s, "
+                            f"{result['mbps']:.1f} Mb/s, p50 {result['p50']:.2f} ms, p95 {result['p95']:.2f} ms"
+                        )
+        finally:
+            os.close(out_fd)
+            reload_urls()
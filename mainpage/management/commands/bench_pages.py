@@ -0,0 +1,76 @@
+import copy
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import override_settings
+
+from mainpage import compression
+from mainpage.models import Question
+
+
+class Command(BaseCommand):
+    help = 'Байты на страницу и CPU на ответ: без оптимизаций, с минификацией шаблонов, с gzip/br'
+
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100, help='Запросов на каждый путь и вариант')
+        parser.add_argument('--path', action='append', dest='paths', help='Путь, можно несколько раз')
+
+
+    def get_variants(self):
+        # "до": шаблоны как раньше (APP_DIRS, без минификации), без CompressionMiddleware
+        plain_templates = copy.deepcopy(settings.TEMPLATES)
+        for engine in plain_templates:
+            engine['OPTIONS'].pop('loaders', None)
+            engine['APP_DIRS'] = True
+        plain_middleware = [name for name in settings.MIDDLEWARE if name != 'mainpage.compression.CompressionMiddleware']
+
+        variants = [
+            ('before', {'TEMPLATES': plain_templates, 'MIDDLEWARE': plain_middleware}, ''),
+            ('minify', {'MIDDLEWARE': plain_middleware}, ''),
+            ('minify+gzip', {}, 'gzip'),
+        ]
+        if compression.brotli is not None:
+            variants.append(('minify+br', {}, 'br'))
+        return variants
+
+    def measure(self, path, total, accept_encoding):
+        client = Client(HTTP_ACCEPT_ENCODING=accept_encoding)
+        response = client.get(path) # прогрев: загрузка и компиляция шаблонов
+        if response.status_code != 200:
+            raise CommandError(f'{path}: статус {response.status_code}')
+
+        sizes, cpu, wall = [], [], []
+        for _ in range(total):
+            cpu_started, wall_started = time.process_time(), time.perf_counter()
+            response = client.get(path)
+            body = b''.join(response.streaming_content) if response.streaming else response.content
+            cpu.append(time.process_time() - cpu_started)
+            wall.append(time.perf_counter() - wall_started)
+            sizes.append(len(body))
+        return {
+            'bytes': statistics.mean(sizes),
+            'cpu': statistics.mean(cpu) * 1000,
+            'p50': statistics.median(wall) * 1000,
+            'encoding': response.get('Content-Encoding', '-'),
+        }
+
+    def handle(self, *args, **options):
+        paths = options['paths']
+        if not paths:
+            question = Question.objects.order_by('-answers_count').first()
+            paths = ['/'] + ([f'/question/id/{question.id}'] if question else [])
+
+        for path in paths:
+            baseline = None
+            for name, overrides, accept_encoding in self.get_variants():
+                with override_settings(**overrides):
+                    result = self.measure(path, options['requests'], accept_encoding)
+                baseline = baseline or result
+                self.stdout.write(
+                    f"{path:24} {name:12} {result['encoding']:5} {result['bytes']:9.0f} B "
+                    f"({result['bytes'] / baseline['bytes']:4.0%}), CPU {result['cpu']:.2f} ms/ответ, p50 {result['p50']:.2f} ms"
+                )
@@ -0,0 +1,76 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.text import slugify
+
+from mainpage.models import Question, Tag, User
+from mainpage.slugs import RU_TO_LATIN, make_slug, make_slugs
+
+
+# Строки, на которых легко ошибиться: все буквы алфавита, регистр, ъ/ь, смесь с латиницей
+EXTRA_CORPUS = [
+    'Съешь же ещё этих мягких французских булок, да выпей чаю',
+    'ЩЁТКА, ЪЕЛ, ЮЛА, ЯМА, ЦАПЛЯ, ЧАЙ, ШУМ, ЖУК, ЭХО',
+    'Как настроить Django + PostgreSQL в Docker?',
+    'тег на русском',
+    'Python 3.12: что нового',
+    '   пробелы   и\tтабы  ',
+    'Ёжик в тумане №5',
+    ''.join(RU_TO_LATIN),
+]
+
+
+class Command(BaseCommand):
+    help = 'Сравнение mainpage.slugs с slugify(translit(...)): совпадение результатов и скорость'
+
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20, help='Сколько раз прогнать корпус')
+        parser.add_argument('--check', action='store_true', help='Ошибка, если результаты расходятся')
+
+
+    def get_corpus(self):
+        corpus = list(EXTRA_CORPUS)
+        corpus += Question.all_objects.values_list('title', flat=True)
+        corpus += Tag.objects.values_list('title', flat=True)
+        corpus += User.objects.values_list('username', flat=True)
+        return corpus
+
+    def measure(self, name, func, corpus, repeat):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            func(corpus)
+        elapsed = time.perf_counter() - started
+        per_item_us = elapsed / (repeat * len(corpus)) * 1e6
+        self.stdout.write(f"  {name:<28} {elapsed * 1000:9.1f} мс  ({per_item_us:.2f} мкс/строка)")
+        return elapsed
+
+    def handle(self, *args, **options):
+        from transliterate import translit
+
+        corpus = self.get_corpus()
+        repeat = options['repeat']
+
+        reference = [slugify(translit(text, 'ru', reversed=True)) for text in corpus]
+        mismatches = [
+            (text, expected, actual)
+            for text, expected, actual in zip(corpus, reference, make_slugs(corpus))
+            if expected != actual or make_slug(text) != expected
+        ]
+
+        self.stdout.write(f"Корпус: {len(corpus)} строк, расхождений: {len(mismatches)}")
+        for text, expected, actual in mismatches[:20]:
+            self.stdout.write(f"  {text!r}: ожидалось {expected!r}, получено {actual!r}")
+
+        self.stdout.write(f"\nВремя на {repeat} прогонов корпуса:")
+        base = self.measure('slugify(translit(...))', lambda c: [slugify(translit(t, 'ru', reversed=True)) for t in c], corpus, repeat)
+
+        make_slug.cache_clear()
+        self.measure('make_slug (холодный кеш)', lambda c: [make_slug.__wrapped__(t) for t in c], corpus, repeat)
+        cached = self.measure('make_slug (LRU)', lambda c: [make_slug(t) for t in c], corpus, repeat)
+        batch = self.measure('make_slugs (пачкой)', make_slugs, corpus, repeat)
+
+        self.stdout.write(f"\nУскорение: LRU x{base / cached:.1f}, пачкой x{base / batch:.1f}")
+
+        if options['check'] and mismatches:
+            raise CommandError(f"Найдено расхождений: {len(mismatches)}")
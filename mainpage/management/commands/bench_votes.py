@@ -0,0 +1,85 @@
+import random
+import threading
+import time
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Sum
+
+from mainpage.models import Question, User, Vote
+from mainpage.utilts import toggle_vote
+
+
+class Command(BaseCommand):
+    help = 'Нагрузочная проверка toggle_vote: много потоков голосуют за один вопрос, итоговый рейтинг должен сойтись'
+
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--users', type=int, default=32, help='Сколько тестовых пользователей голосует')
+        parser.add_argument('--votes', type=int, default=200, help='Нажатий на каждого пользователя')
+        parser.add_argument('--question', type=int, default=None, help='id вопроса, по умолчанию первый')
+        parser.add_argument('--keep', action='store_true', help='Не удалять тестовых пользователей и их голоса')
+
+
+    def get_rating(self, ct, question):
+        return Vote.objects.filter(content_type=ct, object_id=question.id).aggregate(Sum('value'))['value__sum'] or 0
+
+    def worker(self, users, question, votes_per_user, results, errors):
+        try:
+            rng = random.Random()
+            for user in users:
+                state = 0
+                delta_sum = 0
+                for _ in range(votes_per_user):
+                    value = rng.choice((1, -1))
+                    delta_sum += toggle_vote(user, question, value)
+                    state = 0 if state == value else value # та же логика переключения, что и в toggle_vote
+                results.append((state, delta_sum))
+        except Exception as e:
+            errors.append(repr(e))
+        finally:
+            connection.close() # у каждого потока свое соединение
+
+    def handle(self, *args, **options):
+        question = Question.objects.filter(pk=options['question']).first() if options['question'] else Question.objects.first()
+        if not question:
+            raise CommandError('Нет вопросов в БД')
+
+        User.objects.filter(username__startswith='bench-voter-').delete()
+        users = User.objects.bulk_create([
+            User(username=f'bench-voter-{i}', slug=f'bench-voter-{i}') for i in range(options['users'])
+        ])
+        users = list(User.objects.filter(username__startswith='bench-voter-'))
+
+        ct = ContentType.objects.get_for_model(Question)
+        initial = self.get_rating(ct, question)
+
+        results, errors = [], []
+        chunks = [users[i::options['threads']] for i in range(options['threads'])]
+        threads = [threading.Thread(target=self.worker, args=(chunk, question, options['votes'], results, errors)) for chunk in chunks]
+
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+
+        final = self.get_rating(ct, question)
+        expected = initial + sum(state for state, _ in results)
+        deltas = sum(delta for _, delta in results)
+        total_votes = len(results) * options['votes']
+
+        self.stdout.write(f"Вопрос #{question.id}: рейтинг {initial} -> {final}, ожидалось {expected}, сумма дельт {deltas:+d}")
+        self.stdout.write(f"Нажатий: {total_votes} за {elapsed:.2f} с, {total_votes / elapsed:.0f} голосов/с, потоков: {options['threads']}")
+        for error in errors[:10]:
+            self.stderr.write(error)
+
+        if not options['keep']:
+            User.objects.filter(username__startswith='bench-voter-').delete()
+
+        if errors or final != expected or final - initial != deltas:
+            raise CommandError('Рейтинг не сошелся или были ошибки')
+        self.stdout.write(self.style.SUCCESS('Рейтинг сошелся'))
@@ -0,0 +1,67 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from mainpage import similarity
+from mainpage.models import Question, QuestionSignature, QuestionLshBucket
+
+
+class Command(BaseCommand):
+    help = 'Построение индекса похожих вопросов (mainpage.similarity) для уже существующих вопросов'
+
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=None, help='Процессов для подсчета подписей, по умолчанию - по числу ядер')
+
+
+    def read_batches(self, batch_size):
+        batch = []
+        rows = Question.all_objects.order_by('id').values_list('id', 'title', 'detailed').iterator(chunk_size=batch_size)
+        for question_id, title, detailed in rows:
+            batch.append((question_id, title, detailed[:similarity.MAX_TEXT_LENGTH]))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    @transaction.atomic
+    def write_batch(self, signatures):
+        signature_rows = []
+        bucket_rows = []
+        for question_id, sig in signatures:
+            sig_row, buckets = similarity.index_rows(question_id, sig)
+            signature_rows.append(sig_row)
+            bucket_rows.extend(buckets)
+        QuestionSignature.objects.bulk_create(signature_rows)
+        QuestionLshBucket.objects.bulk_create(bucket_rows)
+        return len(signature_rows)
+
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        QuestionLshBucket.objects.all().delete()
+        QuestionSignature.objects.all().delete()
+
+        # подписи считаются в пуле процессов (это чистый CPU), пишет в БД только этот процесс
+        # Executor.map забрал бы все пачки сразу, держим в работе не больше двух на процесс
+        workers = options['workers'] or os.cpu_count() or 1
+        total = 0
+        pending = deque()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for batch in self.read_batches(options['batch_size']):
+                pending.append(pool.submit(similarity.signatures_for_batch, batch))
+                if len(pending) >= workers * 2:
+                    total += self.write_batch(pending.popleft().result())
+                    self.stdout.write(f"Проиндексировано вопросов: {total}")
+            while pending:
+                total += self.write_batch(pending.popleft().result())
+                self.stdout.write(f"Проиндексировано вопросов: {total}")
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Готово: {total} вопросов за {elapsed:.1f} с"))
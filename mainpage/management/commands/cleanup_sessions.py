@@ -0,0 +1,38 @@
+import time
+
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = 'Удаление просроченных сессий небольшими пачками, чтобы не держать блокировку SQLite'
+
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--sleep', type=float, default=0.05, help='Пауза между пачками, сек')
+
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        pause = options['sleep']
+        now = timezone.now()
+        deleted_total = 0
+
+        while True:
+            keys = list(
+                Session.objects.filter(expire_date__lt=now)
+                .values_list('session_key', flat=True)[:batch_size]
+            )
+            if not keys:
+                break
+
+            deleted, _ = Session.objects.filter(session_key__in=keys).delete()
+            deleted_total += deleted
+            self.stdout.write(f"Удалено сессий: {deleted_total}")
+
+            if pause:
+                time.sleep(pause) # даем записать голоса и ответы между пачками
+
+        self.stdout.write(self.style.SUCCESS(f"Готово, всего удалено: {deleted_total}"))
@@ -0,0 +1,80 @@
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+
+from mainpage import dump
+from mainpage.models import User, Tag, Question, Answer, Vote
+
+
+class Command(BaseCommand):
+    help = 'Потоковая выгрузка пользователей, тегов, вопросов, ответов и голосов в JSONL'
+
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Файл дампа, '-' для stdout, *.gz сжимается gzip")
+        parser.add_argument('--gzip', action='store_true')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+
+    def write_rows(self, out, model_name, rows):
+        encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(',', ':'))
+        count = 0
+        for row in rows:
+            out.write(encoder.encode({'model': model_name, **row}))
+            out.write('\n')
+            count += 1
+        if self.verbose:
+            self.stderr.write(f"{model_name}: {count}")
+        return count
+
+    def iter_questions(self, chunk_size):
+        # теги вопроса добавляем пачками по chunk_size вопросов, без загрузки всей таблицы
+        questions = Question.all_objects.order_by('id').values(*dump.QUESTION_FIELDS).iterator(chunk_size=chunk_size)
+        chunk = []
+        for question in questions:
+            chunk.append(question)
+            if len(chunk) >= chunk_size:
+                yield from self.attach_tags(chunk)
+                chunk = []
+        yield from self.attach_tags(chunk)
+
+    def attach_tags(self, questions):
+        if not questions:
+            return
+        tags = {q['id']: [] for q in questions}
+        links = Question.tags.through.objects.filter(question_id__in=tags.keys()).values_list('question_id', 'tag_id')
+        for question_id, tag_id in links:
+            tags[question_id].append(tag_id)
+        for question in questions:
+            question['tags'] = tags[question['id']]
+            yield question
+
+    def iter_votes(self, chunk_size):
+        types = {
+            ContentType.objects.get_for_model(Question).id: 'question',
+            ContentType.objects.get_for_model(Answer).id: 'answer',
+        }
+        votes = Vote.objects.filter(content_type_id__in=types.keys()).order_by('id')
+        for vote in votes.values('content_type_id', *dump.VOTE_FIELDS).iterator(chunk_size=chunk_size):
+            vote['target'] = types[vote.pop('content_type_id')]
+            yield vote
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        self.verbose = options['path'] != '-' and options['verbosity'] > 0
+
+        sources = {
+            'user': User.objects.order_by('id').values(*dump.USER_FIELDS).iterator(chunk_size=chunk_size),
+            'tag': Tag.objects.order_by('id').values(*dump.TAG_FIELDS).iterator(chunk_size=chunk_size),
+            'question': self.iter_questions(chunk_size),
+            'answer': Answer.all_objects.order_by('id').values(*dump.ANSWER_FIELDS).iterator(chunk_size=chunk_size),
+            'vote': self.iter_votes(chunk_size),
+        }
+
+        total = 0
+        with dump.open_dump(options['path'], 'w', options['gzip']) as out:
+            for model_name in dump.MODELS:
+                total += self.write_rows(out, model_name, sources[model_name])
+
+        if self.verbose:
+            self.stderr.write(self.style.SUCCESS(f"Выгружено записей: {total}"))
@@ -3,6 +3,7 @@ import typing as t
 from django.core.management.base import BaseCommand
 from django.utils.text import slugify
 from mainpage.models import Question, User
+from mainpage import rendering
 
 
 FAKE_QUESTION_DETAILED = """Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor incididunt ut labore et dolore magna aliqua. Ut enim ad minim veniam, quis nostrud exercitation ullamco laboris nisi ut aliquip ex ea commodo consequat. Duis aute irure dolor in reprehenderit in voluptate velit esse cillum dolore eu fugiat nulla pariatur. Excepteur sint occaecat cupidatat non proident, sunt in culpa qui officia deserunt mollit anim id est laborum."""
@@ -33,7 +34,8 @@ class Command(BaseCommand):
                 title=f"Вопрос под номером #{count_exist_questions + n + 1}",
                 slug=str(slugify(Question.objects.values_list('slug', flat=True))) + f"{n}",
                 detailed=FAKE_QUESTION_DETAILED,
-                author=author
+                author=author,
+                **rendering.render_question(FAKE_QUESTION_DETAILED),
             ))
 
         Question.objects.bulk_create(questions_to_create, batch_size=100) # ограничиваем размер запроса для запроси из бд
@@ -0,0 +1,38 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from mainpage import media
+from mainpage.models import User
+
+
+class Command(BaseCommand):
+    help = 'Переименование старых аватаров в имена с хешем содержимого, чтобы они кешировались навсегда'
+
+
+    def add_arguments(self, parser):
+        parser.add_argument('--delete-old', action='store_true', help='Удалять файлы со старыми именами')
+
+
+    def handle(self, *args, **options):
+        renamed = missing = 0
+        users = User.objects.exclude(avatar='').exclude(avatar__isnull=True).values_list('pk', 'avatar')
+        for pk, name in users.iterator():
+            if media.is_hashed(name):
+                continue
+            if not default_storage.exists(name):
+                missing += 1
+                continue
+
+            with default_storage.open(name) as file:
+                new_name = media.hashed_name('avatars', name, file)
+                if not default_storage.exists(new_name): # одинаковые картинки хранятся один раз
+                    new_name = default_storage.save(new_name, file)
+
+            # update(), а не save(): не трогаем updated_at и сигналы
+            User.objects.filter(pk=pk, avatar=name).update(avatar=new_name)
+            if options['delete_old'] and not User.objects.filter(avatar=name).exists():
+                default_storage.delete(name)
+            renamed += 1
+
+        self.stdout.write(f"Переименовано: {renamed}, файлов нет: {missing}")
+        self.stdout.write(self.style.SUCCESS("Готово"))
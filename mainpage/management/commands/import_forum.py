@@ -0,0 +1,207 @@
+import json
+import uuid
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from mainpage import dump, rendering
+from mainpage.models import (
+    User, Tag, Question, Answer, Vote, ArchivedQuestion, ImportRun, ImportIdMap, refresh_answer_stats,
+)
+from mainpage.slugs import make_slugs, make_unique_slugs
+
+
+class Command(BaseCommand):
+    help = 'Потоковая загрузка дампа export_forum пачками через bulk_create, с возможностью продолжить после сбоя'
+
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Файл дампа, '-' для stdin, *.gz читается через gzip")
+        parser.add_argument('--gzip', action='store_true')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--skip-indexes', action='store_true',
+                            help='Не пересобирать индекс похожих вопросов и ленты (тогда запустить build_similarity_index и rebuild_timelines вручную)')
+        parser.add_argument('--checkpoint', default=None,
+                            help='Имя импорта (ImportRun); если импорт с таким именем прерывался, он продолжается с сохраненного места')
+
+
+    # --- прогресс и карты id ---
+    # Все хранится в базе (ImportRun, ImportIdMap) и пишется в транзакции пачки:
+    # либо пачка, ее карты id и номер строки закоммичены вместе, либо ничего из этого.
+
+    def get_run(self, name):
+        if name is None:
+            # без --checkpoint продолжать нечего, карты id нужны только на время импорта
+            return ImportRun.objects.create(name=f'import-{uuid.uuid4().hex}')
+        run, created = ImportRun.objects.get_or_create(name=name)
+        if not created:
+            self.stdout.write(f"Продолжаем со строки {run.line + 1}")
+        return run
+
+    def load_maps(self, name, old_ids):
+        # карта только для id текущей пачки, а не для всего дампа
+        self.maps[name] = dict(
+            ImportIdMap.objects.filter(run=self.run, model=name, old_id__in=set(old_ids))
+            .values_list('old_id', 'new_id')
+        )
+
+    def save_maps(self, name, pairs):
+        ImportIdMap.objects.bulk_create([
+            ImportIdMap(run=self.run, model=name, old_id=old_id, new_id=new_id)
+            for old_id, new_id in pairs
+        ])
+
+    def remap(self, name, old_id):
+        return self.maps[name].get(old_id)
+
+    def assign_unique_slugs(self, model_queryset, rows, source_field):
+        slugs = [row.get('slug') for row in rows]
+        generated = iter(make_slugs(row[source_field] for row in rows if not row.get('slug')))
+        slugs = [slug or next(generated) for slug in slugs]
+
+        taken = set(model_queryset.filter(slug__in=slugs).values_list('slug', flat=True))
+        for row, slug in zip(rows, make_unique_slugs(slugs, taken)):
+            row['slug'] = slug
+
+    def load_user(self, rows):
+        existing = dict(User.objects.filter(username__in=[r['username'] for r in rows]).values_list('username', 'id'))
+        self.save_maps('user', [(row['id'], existing[row['username']]) for row in rows if row['username'] in existing])
+        new_rows = [row for row in rows if row['username'] not in existing]
+
+        self.assign_unique_slugs(User.objects, new_rows, 'username')
+        old_ids = [row.pop('id') for row in new_rows]
+        created = User.objects.bulk_create([User(**row) for row in new_rows])
+        self.save_maps('user', zip(old_ids, (u.id for u in created)))
+
+    def load_tag(self, rows):
+        for row in rows:
+            row['title'] = row['title'].strip().lower()
+        existing = dict(Tag.objects.filter(title__in=[r['title'] for r in rows]).values_list('title', 'id'))
+        self.save_maps('tag', [(row['id'], existing[row['title']]) for row in rows if row['title'] in existing])
+        new_rows = [row for row in rows if row['title'] not in existing]
+
+        self.assign_unique_slugs(Tag.objects, new_rows, 'title')
+        old_ids = [row.pop('id') for row in new_rows]
+        created = Tag.objects.bulk_create([Tag(**row) for row in new_rows])
+        self.save_maps('tag', zip(old_ids, (t.id for t in created)))
+
+    def load_question(self, rows):
+        self.load_maps('user', [row['author_id'] for row in rows])
+        self.load_maps('tag', [tag_id for row in rows for tag_id in row.get('tags', [])])
+        rows = [row for row in rows if self.remap('user', row['author_id'])]
+        for row in rows:
+            row['author_id'] = self.remap('user', row['author_id'])
+
+        self.assign_unique_slugs(Question.all_objects, rows, 'title')
+        taken = set(ArchivedQuestion.objects.filter(slug__in=[r['slug'] for r in rows]).values_list('slug', flat=True))
+        for row, slug in zip(rows, make_unique_slugs([r['slug'] for r in rows], taken)):
+            row['slug'] = slug
+
+        old_ids = [row.pop('id') for row in rows]
+        tags = [row.pop('tags', []) for row in rows]
+        # bulk_create не вызывает save(), HTML и excerpt считаем здесь
+        created = Question.all_objects.bulk_create([Question(**row, **rendering.render_question(row['detailed'])) for row in rows])
+        self.save_maps('question', zip(old_ids, (q.id for q in created)))
+
+        # M2M связываем одной вставкой на пачку, когда id вопросов уже известны
+        Through = Question.tags.through
+        Through.objects.bulk_create([
+            Through(question_id=question.id, tag_id=self.remap('tag', tag_id))
+            for question, question_tags in zip(created, tags)
+            for tag_id in question_tags
+            if self.remap('tag', tag_id)
+        ], ignore_conflicts=True)
+
+    def load_answer(self, rows):
+        self.load_maps('user', [row['author_id'] for row in rows])
+        self.load_maps('question', [row['question_id'] for row in rows])
+        rows = [row for row in rows if self.remap('user', row['author_id']) and self.remap('question', row['question_id'])]
+        for row in rows:
+            row['author_id'] = self.remap('user', row['author_id'])
+            row['question_id'] = self.remap('question', row['question_id'])
+
+        old_ids = [row.pop('id') for row in rows]
+        created = Answer.all_objects.bulk_create([Answer(**row, **rendering.render_answer(row['answer_text'])) for row in rows])
+        self.save_maps('answer', zip(old_ids, (a.id for a in created)))
+        # bulk_create не проходит через Answer.save, поэтому счетчики вопросов пересчитываем сами
+        refresh_answer_stats({row['question_id'] for row in rows})
+
+    def load_vote(self, rows):
+        content_types = {
+            'question': ContentType.objects.get_for_model(Question).id,
+            'answer': ContentType.objects.get_for_model(Answer).id,
+        }
+        self.load_maps('user', [row['user_id'] for row in rows])
+        for target in content_types:
+            self.load_maps(target, [row['object_id'] for row in rows if row['target'] == target])
+        votes = []
+        for row in rows:
+            user_id = self.remap('user', row['user_id'])
+            object_id = self.remap(row['target'], row['object_id'])
+            if user_id and object_id:
+                votes.append(Vote(user_id=user_id, value=row['value'], content_type_id=content_types[row['target']], object_id=object_id))
+        Vote.objects.bulk_create(votes, ignore_conflicts=True)
+        return len(votes)
+
+    def flush(self, model_name, rows, last_line):
+        if not rows:
+            return
+        loader = getattr(self, 'load_' + model_name)
+
+        with transaction.atomic():
+            loader([dict(row) for row in rows])
+            ImportRun.objects.filter(pk=self.run.pk).update(line=last_line)
+        self.run.line = last_line
+
+        self.counts[model_name] = self.counts.get(model_name, 0) + len(rows)
+        if self.verbosity > 1:
+            self.stdout.write(f"{model_name}: {self.counts[model_name]} (строка {last_line})")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        self.verbosity = options['verbosity']
+        self.run = self.get_run(options['checkpoint'])
+        self.maps = {}
+        self.counts = {}
+
+        try:
+            self.load_dump(options, batch_size)
+        except BaseException:
+            if options['checkpoint'] is None:
+                self.run.delete() # без имени продолжить импорт все равно нельзя
+            raise
+
+        for name in dump.MODELS:
+            self.stdout.write(f"{name}: {self.counts.get(name, 0)}")
+        self.stdout.write(self.style.SUCCESS('Импорт завершен'))
+        # карты id больше не нужны, повторный запуск с тем же именем начнет импорт заново
+        self.run.delete()
+
+        # bulk_create не шлет post_save: индекс похожих вопросов и ленты подписчиков
+        # пересобираются целиком. Индекс подсказок (mainpage.suggest) живет в памяти
+        # воркеров и подхватит новые вопросы после их перезапуска
+        if not options['skip_indexes']:
+            call_command('build_similarity_index', stdout=self.stdout, stderr=self.stderr)
+            call_command('rebuild_timelines', stdout=self.stdout, stderr=self.stderr)
+
+    def load_dump(self, options, batch_size):
+        model_name, rows, line_no = None, [], self.run.line
+
+        with dump.open_dump(options['path'], 'r', options['gzip']) as f, dump.keep_timestamps(Question, Answer):
+            for line_no, line in enumerate(f, 1):
+                if line_no <= self.run.line or not line.strip():
+                    continue
+
+                record = json.loads(line)
+                record_model = record.pop('model')
+                if record_model not in dump.MODELS:
+                    raise CommandError(f"Строка {line_no}: неизвестная модель {record_model!r}")
+
+                if record_model != model_name or len(rows) >= batch_size:
+                    self.flush(model_name, rows, line_no - 1)
+                    model_name, rows = record_model, []
+                rows.append(record)
+
+            self.flush(model_name, rows, line_no)
@@ -0,0 +1,341 @@
+import http.client
+import json
+import random
+import re
+import secrets
+import statistics
+import threading
+import time
+import urllib.parse
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+
+from mainpage.models import Question, Answer, Tag, User, refresh_answer_stats
+
+
+USER_PREFIX = 'bench-load-'
+
+DEFAULT_MIX = 'feed=40,tag=15,search=10,question=25,vote=5,answer=3,ask=2'
+
+SEARCH_WORDS = ('python', 'django', 'docker', 'error', 'sql', 'async', 'test', 'deploy', 'cache', 'api')
+TEXT_WORDS = ('load', 'test', 'request', 'latency', 'server', 'thread', 'queue', 'index', 'query', 'page', 'token', 'pool')
+
+SLUG_RE = re.compile(r'[-a-zA-Z0-9_]+')
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        kind, _, weight = part.partition('=')
+        if kind.strip() not in RequestPlanner.KINDS:
+            raise CommandError(f'Неизвестный тип запроса: {kind}')
+        mix[kind.strip()] = float(weight or 1)
+    return mix
+
+
+def percentile(values, fraction):
+    return values[max(int(len(values) * fraction) - 1, 0)]
+
+
+class RequestPlanner:
+    """Генератор запросов по весам mix из реальных id, тегов и слов базы.
+
+    Запрос - словарь {kind, method, path, data, user}, в таком же виде
+    он пишется в журнал и читается при повторе.
+    """
+    KINDS = ('feed', 'tag', 'search', 'question', 'vote', 'answer', 'ask')
+
+    def __init__(self, mix, usernames, seed=None):
+        self.kinds, self.weights = zip(*mix.items())
+        self.usernames = usernames
+        self.rng = random.Random(seed)
+
+        self.questions = list(Question.objects.order_by('-id').values_list('id', 'slug')[:1000])
+        self.answer_ids = list(Answer.objects.order_by('-id').values_list('id', flat=True)[:1000])
+        self.tags = list(Tag.objects.order_by('-id').values_list('slug', flat=True)[:200])
+        if not self.questions:
+            raise CommandError('Нет вопросов в БД, сначала generate_questions')
+
+    def words(self, count):
+        return ' '.join(self.rng.choice(TEXT_WORDS) for _ in range(count))
+
+    def question_path(self):
+        qid, slug = self.rng.choice(self.questions)
+        if slug and SLUG_RE.fullmatch(slug):
+            return f'/question/{slug}'
+        return f'/question/id/{qid}'
+
+    def make(self):
+        kind = self.rng.choices(self.kinds, self.weights)[0]
+        request = {'kind': kind, 'method': 'GET', 'path': '/', 'data': None, 'user': None}
+
+        if kind == 'feed':
+            page = self.rng.choice((1, 1, 1, 2, 3))
+            request['path'] = '/' if page == 1 else f'/?page={page}'
+        elif kind == 'tag':
+            tag = self.rng.choice(self.tags) if self.tags else 'python'
+            request['path'] = '/?' + urllib.parse.urlencode({'tag': tag})
+        elif kind == 'search':
+            request['path'] = '/?' + urllib.parse.urlencode({'search': self.rng.choice(SEARCH_WORDS)})
+        elif kind == 'question':
+            request['path'] = self.question_path()
+        else:
+            request['method'] = 'POST'
+            request['user'] = self.rng.choice(self.usernames)
+
+        if kind == 'vote':
+            if self.answer_ids and self.rng.random() < 0.5:
+                target, obj_id = 'answer', self.rng.choice(self.answer_ids)
+            else:
+                target, obj_id = 'question', self.rng.choice(self.questions)[0]
+            request['path'] = '/vote/'
+            request['data'] = {'target': target, 'id': obj_id, 'value': self.rng.choice((1, -1))}
+        elif kind == 'answer':
+            request['path'] = self.question_path()
+            request['data'] = {'answer_text': f'{self.words(12)} {secrets.token_hex(4)}'}
+        elif kind == 'ask':
+            request['path'] = '/ask/'
+            request['data'] = {
+                'title': f'Load test {self.words(4)} {secrets.token_hex(4)}',
+                'detailed': self.words(40),
+                'tags_text': ', '.join(self.rng.sample(TEXT_WORDS, 2)),
+                'post_anyway': 'on', # проверку похожих вопросов нагружаем, но не блокируемся ей
+            }
+        return request
+
+
+class InProcessTransport:
+    """Запросы через django.test.Client, без сети; у каждого потока свои клиенты."""
+    def __init__(self):
+        self.local = threading.local()
+        self.users = {user.username: user for user in User.objects.filter(username__startswith=USER_PREFIX)}
+
+    def client(self, username):
+        clients = self.local.__dict__.setdefault('clients', {})
+        if username not in clients:
+            client = Client(raise_request_exception=False)
+            if username:
+                client.force_login(self.users[username])
+            clients[username] = client
+        return clients[username]
+
+    def send(self, request):
+        client = self.client(request['user'])
+        if request['method'] == 'POST':
+            response = client.post(request['path'], request['data'] or {})
+        else:
+            response = client.get(request['path'])
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response.status_code
+
+    def close(self):
+        connection.close() # у каждого потока свое соединение с БД
+
+
+class HttpTransport:
+    """Запросы к локальному серверу по HTTP (runserver, gunicorn, uvicorn).
+
+    Сессии пользователей выпускаются здесь же через force_login, поэтому
+    сервер должен работать с теми же настройками и той же базой.
+    """
+    def __init__(self, url):
+        parsed = urllib.parse.urlsplit(url)
+        if parsed.hostname not in ('localhost', '127.0.0.1', '::1'):
+            raise CommandError('Нагрузку даем только на локальный сервер')
+        self.host, self.port = parsed.hostname, parsed.port or 80
+        self.local = threading.local()
+        self.csrf_token = secrets.token_hex(16)
+        self.cookies = {None: f'{settings.CSRF_COOKIE_NAME}={self.csrf_token}'}
+        for user in User.objects.filter(username__startswith=USER_PREFIX):
+            client = Client()
+            client.force_login(user)
+            self.cookies[user.username] = (
+                f'{settings.CSRF_COOKIE_NAME}={self.csrf_token}; '
+                f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'
+            )
+
+    def get_connection(self):
+        # keep-alive: одно соединение на поток
+        if getattr(self.local, 'connection', None) is None:
+            self.local.connection = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        return self.local.connection
+
+    def send(self, request):
+        headers = {'Host': f'{self.host}:{self.port}', 'Cookie': self.cookies[request['user']]}
+        body = None
+        if request['method'] == 'POST':
+            body = urllib.parse.urlencode(request['data'] or {})
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            headers['X-CSRFToken'] = self.csrf_token
+        try:
+            conn = self.get_connection()
+            conn.request(request['method'], request['path'], body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            self.local.connection = None
+            raise
+        return response.status
+
+    def close(self):
+        if getattr(self.local, 'connection', None) is not None:
+            self.local.connection.close()
+            self.local.connection = None
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест mainpage.urls: смесь ленты, тегов, поиска, вопросов, голосов, ответов и новых вопросов. '
+        'Работает в процессе или против локального сервера, пишет и повторяет журнал запросов (JSONL)'
+    )
+
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='Локальный сервер, например http://127.0.0.1:8000; без него - в процессе')
+        parser.add_argument('--requests', type=int, default=1000, help='Всего запросов')
+        parser.add_argument('--concurrency', type=int, default=8, help='Потоков')
+        parser.add_argument('--mix', default=DEFAULT_MIX, help=f'Веса типов запросов, по умолчанию {DEFAULT_MIX}')
+        parser.add_argument('--users', type=int, default=20, help=f'Тестовых пользователей {USER_PREFIX}N для записи')
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--record', help='Записать выполненные запросы в JSONL')
+        parser.add_argument('--replay', help='Повторить запросы из JSONL вместо генерации')
+        parser.add_argument('--speed', type=float, default=0, help='При повторе: 1 - исходный темп, 2 - вдвое быстрее, 0 - без пауз')
+        parser.add_argument('--no-ratelimit', action='store_true', help='В процессе: отключить RATE_LIMITS')
+        parser.add_argument('--keep', action='store_true', help='Не удалять тестовых пользователей и их записи')
+
+
+    def ensure_users(self, usernames):
+        existing = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+        User.objects.bulk_create([
+            User(username=name, slug=name) for name in usernames if name not in existing
+        ])
+
+    def load_plan(self, options):
+        if options['replay']:
+            with open(options['replay']) as f:
+                plan = [json.loads(line) for line in f if line.strip()]
+            if not plan:
+                raise CommandError('Пустой журнал')
+            usernames = sorted({request['user'] for request in plan if request.get('user')})
+            if any(not name.startswith(USER_PREFIX) for name in usernames):
+                raise CommandError(f'В журнале пользователи не из {USER_PREFIX}*')
+            self.ensure_users(usernames)
+            return plan
+
+        usernames = [f'{USER_PREFIX}{i}' for i in range(options['users'])]
+        self.ensure_users(usernames)
+        planner = RequestPlanner(parse_mix(options['mix']), usernames, options['seed'])
+        return [planner.make() for _ in range(options['requests'])]
+
+    def run_plan(self, transport, plan, concurrency, speed):
+        results = [None] * len(plan)
+        indexes = iter(range(len(plan)))
+        lock = threading.Lock()
+        started = time.perf_counter()
+
+        def one(index):
+            request = plan[index]
+            if speed and 'offset' in request: # повтор с исходными интервалами
+                delay = request['offset'] / speed - (time.perf_counter() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            offset = time.perf_counter() - started
+            request_started = time.perf_counter()
+            try:
+                status, error = transport.send(request), None
+            except Exception as e:
+                status, error = None, repr(e)
+            results[index] = {
+                'offset': round(offset, 4),
+                'latency': time.perf_counter() - request_started,
+                'status': status,
+                'error': error,
+            }
+
+        def worker():
+            try:
+                while True:
+                    with lock:
+                        index = next(indexes, None)
+                    if index is None:
+                        return
+                    one(index)
+            finally:
+                transport.close()
+
+        threads = [threading.Thread(target=worker, name=f'load-{n}') for n in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, time.perf_counter() - started
+
+    def record(self, path, plan, results):
+        with open(path, 'w') as f:
+            for request, result in zip(plan, results):
+                line = {key: request.get(key) for key in ('kind', 'method', 'path', 'data', 'user')}
+                line.update(offset=result['offset'], status=result['status'], latency_ms=round(result['latency'] * 1000, 2))
+                f.write(json.dumps(line, ensure_ascii=False) + '\n')
+
+    def report(self, plan, results, elapsed):
+        by_kind = {}
+        for request, result in zip(plan, results):
+            by_kind.setdefault(request['kind'], []).append(result)
+
+        self.stdout.write(f"Запросов: {len(results)} за {elapsed:.2f} с, {len(results) / elapsed:.1f} req/s")
+        self.stdout.write(f"{'тип':10} {'кол-во':>7} {'req/s':>8} {'p50 мс':>8} {'p95 мс':>8} {'p99 мс':>8} {'429':>5} {'ошибки':>7}")
+        for kind in [*RequestPlanner.KINDS, *sorted(set(by_kind) - set(RequestPlanner.KINDS))]:
+            kind_results = by_kind.get(kind)
+            if not kind_results:
+                continue
+            self.write_row(kind, kind_results, elapsed)
+        self.write_row('всего', results, elapsed)
+
+        statuses = {}
+        for result in results:
+            statuses[result['status'] or 'exc'] = statuses.get(result['status'] or 'exc', 0) + 1
+        self.stdout.write(f"Коды ответов: {dict(sorted(statuses.items(), key=str))}")
+        for error in sorted({result['error'] for result in results if result['error']})[:5]:
+            self.stderr.write(error)
+
+    def write_row(self, name, results, elapsed):
+        latencies = sorted(result['latency'] * 1000 for result in results)
+        throttled = sum(1 for result in results if result['status'] == 429)
+        errors = sum(1 for result in results if result['status'] is None or (result['status'] >= 400 and result['status'] != 429))
+        self.stdout.write(
+            f"{name:10} {len(results):7} {len(results) / elapsed:8.1f} {statistics.median(latencies):8.1f} "
+            f"{percentile(latencies, 0.95):8.1f} {percentile(latencies, 0.99):8.1f} {throttled:5} "
+            f"{errors / len(results):6.1%}"
+        )
+
+    def cleanup(self):
+        # ответы тестовых пользователей удаляются каскадом, счетчики пересчитываем
+        question_ids = list(Answer.all_objects.filter(author__username__startswith=USER_PREFIX).values_list('question_id', flat=True).distinct())
+        User.objects.filter(username__startswith=USER_PREFIX).delete()
+        refresh_answer_stats(question_ids)
+
+    def handle(self, *args, **options):
+        plan = self.load_plan(options)
+        overrides = {'RATE_LIMITS': {} if options['no_ratelimit'] else settings.RATE_LIMITS}
+        if not options['url']:
+            # django.test.Client шлет Host: testserver
+            overrides['ALLOWED_HOSTS'] = [*settings.ALLOWED_HOSTS, 'testserver']
+
+        try:
+            with override_settings(**overrides):
+                transport = HttpTransport(options['url']) if options['url'] else InProcessTransport()
+                results, elapsed = self.run_plan(transport, plan, options['concurrency'], options['speed'] if options['replay'] else 0)
+        finally:
+            if not options['keep']:
+                self.cleanup()
+
+        if options['record']:
+            self.record(options['record'], plan, results)
+            self.stdout.write(f"Журнал записан: {options['record']}")
+        self.report(plan, results, elapsed)
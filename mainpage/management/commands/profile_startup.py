@@ -0,0 +1,108 @@
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+# Выполняется в отдельном чистом процессе: так измеряется настоящий холодный старт воркера
+CHILD_SCRIPT = """
+import json, time
+started = time.perf_counter()
+
+import django
+from django.conf import settings
+from django.utils.module_loading import import_string
+django.setup()
+
+from django.urls import get_resolver
+get_resolver().url_patterns
+application = import_string(settings.WSGI_APPLICATION)
+booted = time.perf_counter()
+
+from wsgiref.util import setup_testing_defaults
+environ = {'PATH_INFO': %(path)r, 'HTTP_HOST': 'localhost'}
+setup_testing_defaults(environ)
+status = []
+body = application(environ, lambda s, h, exc_info=None: status.append(s))
+b''.join(body)
+finished = time.perf_counter()
+
+print(json.dumps({
+    'boot_ms': (booted - started) * 1000,
+    'first_request_ms': (finished - booted) * 1000,
+    'status': status[0],
+}))
+"""
+
+IMPORTTIME_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+class Command(BaseCommand):
+    help = 'Замер холодного старта воркера: -X importtime, время загрузки Django и первого запроса'
+
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=3)
+        parser.add_argument('--top', type=int, default=20)
+        parser.add_argument('--path', default='/', help='URL первого запроса')
+        parser.add_argument('--check', action='store_true',
+                            help='Завершиться с ошибкой, если превышен STARTUP_BUDGET_MS')
+
+
+    def run_child(self, path, importtime=False):
+        args = [sys.executable]
+        if importtime:
+            args += ['-X', 'importtime']
+        args += ['-c', CHILD_SCRIPT % {'path': path}]
+
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(p for p in sys.path if p))
+        env.setdefault('DJANGO_SETTINGS_MODULE', os.environ.get('DJANGO_SETTINGS_MODULE', 'vibecode_forum.settings'))
+        result = subprocess.run(args, capture_output=True, text=True, env=env)
+        if result.returncode != 0:
+            raise CommandError(result.stderr[-2000:])
+        return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+    def report_imports(self, stderr, top):
+        imports = []
+        for line in stderr.splitlines():
+            match = IMPORTTIME_RE.match(line)
+            if match:
+                self_us, cumulative_us, indent, name = match.groups()
+                imports.append((int(cumulative_us), int(self_us), len(indent) // 2, name))
+
+        self.stdout.write(f"\nТоп-{top} импортов по суммарному времени (мс):")
+        for cumulative_us, self_us, level, name in sorted(imports, reverse=True)[:top]:
+            self.stdout.write(f"  {cumulative_us / 1000:8.1f}  self {self_us / 1000:6.1f}  {'  ' * min(level, 5)}{name}")
+
+        own = [i for i in imports if i[3].split('.')[0] in ('mainpage', 'vibecode_forum')]
+        self.stdout.write("\nМодули проекта:")
+        for cumulative_us, self_us, level, name in sorted(own, reverse=True):
+            self.stdout.write(f"  {cumulative_us / 1000:8.1f}  self {self_us / 1000:6.1f}  {name}")
+
+    def handle(self, *args, **options):
+        timings, stderr = self.run_child(options['path'], importtime=True)
+        self.report_imports(stderr, options['top'])
+
+        # -X importtime сам замедляет импорт, поэтому время старта меряем отдельными запусками
+        runs = [self.run_child(options['path'])[0] for _ in range(options['runs'])]
+        boot_ms = statistics.median(r['boot_ms'] for r in runs)
+        first_request_ms = statistics.median(r['first_request_ms'] for r in runs)
+
+        self.stdout.write(f"\nЗагрузка Django + URLconf: {boot_ms:.1f} мс (медиана из {len(runs)})")
+        self.stdout.write(f"Первый запрос {options['path']}: {first_request_ms:.1f} мс, статус {runs[0]['status']}")
+
+        if options['check']:
+            budget = settings.STARTUP_BUDGET_MS
+            exceeded = []
+            if boot_ms > budget['boot']:
+                exceeded.append(f"загрузка {boot_ms:.1f} > {budget['boot']} мс")
+            if first_request_ms > budget['first_request']:
+                exceeded.append(f"первый запрос {first_request_ms:.1f} > {budget['first_request']} мс")
+            if exceeded:
+                raise CommandError('Превышен бюджет холодного старта: ' + ', '.join(exceeded))
+            self.stdout.write(self.style.SUCCESS('Бюджет холодного старта соблюден'))
@@ -0,0 +1,47 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils import timezone
+
+from mainpage import moderation
+from mainpage.models import User, Question, PurgeJob
+
+
+class Command(BaseCommand):
+    help = 'Очистка скрытых модерацией пользователей и вопросов: незавершенные PurgeJob или новые по --user/--question'
+
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', default=[], help='Скрыть и очистить пользователя по id')
+        parser.add_argument('--question', type=int, action='append', default=[], help='Скрыть и очистить вопрос по id')
+        parser.add_argument('--job', type=int, action='append', default=[], help='Только эти задания')
+        parser.add_argument('--stale-minutes', type=int, default=10, help='Через сколько минут без прогресса задание считается прерванным')
+
+
+    def progress(self, job):
+        percent = f'{job.progress:.0%}' if job.total_rows else '?'
+        self.stdout.write(f"  #{job.pk} {job.step}: {job.deleted_rows}/{job.total_rows} ({percent})")
+
+    def handle(self, *args, **options):
+        job_ids = list(options['job'])
+        for target, model, ids in (('user', User, options['user']), ('question', Question, options['question'])):
+            missing = set(ids) - set(model._base_manager.filter(pk__in=ids).values_list('pk', flat=True))
+            if missing:
+                raise CommandError(f'Не найдены {target}: {sorted(missing)}')
+            if ids:
+                # очищаем ниже в этом же процессе, а не в фоновом пуле
+                job_ids += [job.pk for job in moderation.soft_delete(target, ids, schedule=False)]
+
+        if not job_ids:
+            # running без прогресса дольше --stale-minutes - прерванные очистки, их продолжаем
+            stale = timezone.now() - datetime.timedelta(minutes=options['stale_minutes'])
+            jobs = PurgeJob.objects.filter(Q(status__in=('pending', 'failed')) | Q(status='running', updated_at__lt=stale))
+            job_ids = list(jobs.order_by('id').values_list('id', flat=True))
+
+        for job_id in job_ids:
+            job = moderation.run_purge(job_id, progress=self.progress)
+            self.stdout.write(f"{job}: удалено строк {job.deleted_rows}")
+
+        self.stdout.write(self.style.SUCCESS(f"Готово, заданий: {len(job_ids)}"))
+
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from mainpage import timeline
+from mainpage.models import User
+
+
+class Command(BaseCommand):
+    help = 'Пересборка персональных лент всех подписанных пользователей (mainpage.timeline)'
+
+
+    def handle(self, *args, **options):
+        users = (
+            User.objects.filter(Q(followed_tags__isnull=False) | Q(followed_authors__isnull=False))
+            .order_by('id').values_list('id', flat=True).distinct()
+        )
+        total = 0
+        for n, user_id in enumerate(users.iterator(), start=1):
+            total += timeline.rebuild_timeline(user_id)
+            if n % 100 == 0:
+                self.stdout.write(f"Лент: {n}, записей: {total}")
+
+        self.stdout.write(self.style.SUCCESS(f"Готово, записей: {total}"))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from mainpage import rendering
+from mainpage.models import Question, Answer, ArchivedQuestion, ArchivedAnswer
+
+
+class Command(BaseCommand):
+    help = 'Перерисовка HTML и excerpt вопросов и ответов, например после изменения mainpage.rendering'
+
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+
+    def handle(self, *args, **options):
+        targets = (
+            (Question.all_objects.all(), 'detailed', rendering.render_question),
+            (ArchivedQuestion.objects.all(), 'detailed', lambda text: {'detailed_html': rendering.render_markdown(text)}),
+            (Answer.all_objects.all(), 'answer_text', rendering.render_answer),
+            (ArchivedAnswer.objects.all(), 'answer_text', rendering.render_answer),
+        )
+        for queryset, source_field, render in targets:
+            updated = rendering.rerender_all(queryset, source_field, render, options['batch_size'])
+            self.stdout.write(f"{queryset.model._meta.verbose_name_plural}: {updated}")
+
+        self.stdout.write(self.style.SUCCESS("Готово"))
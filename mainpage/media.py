@@ -0,0 +1,185 @@
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.deconstruct import deconstructible
+from django.utils.http import http_date, quote_etag
+
+
+# Отдача загруженных файлов (аватаров) из MEDIA_ROOT самим приложением.
+# FileResponse отдает открытый файл, и WSGI-сервер с wsgi.file_wrapper
+# (gunicorn) шлет его через os.sendfile, без копирования в Python.
+# Диапазоны отдаются так же: файл заранее смещен на начало, длина - в Content-Length.
+# Имена аватаров содержат хеш содержимого, поэтому они кешируются навсегда.
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+DEFAULT_CACHE_CONTROL = 'public, max-age=3600'
+
+HASH_LENGTH = 16
+HASHED_NAME_RE = re.compile(r'(^|/)[0-9a-f]{%d}\.\w+$' % HASH_LENGTH)
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+BLOCK_SIZE = 64 * 1024 # для серверов без sendfile и для ASGI
+
+
+def file_hash(file):
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in file.chunks() if hasattr(file, 'chunks') else iter(lambda: file.read(BLOCK_SIZE), b''):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()[:HASH_LENGTH]
+
+
+def hashed_name(directory, filename, file):
+    ext = os.path.splitext(filename)[1].lower()
+    return posixpath.join(directory, file_hash(file) + ext)
+
+
+@deconstructible
+class ContentHashedUploadTo:
+    """upload_to для FileField: имя файла - хеш содержимого.
+
+    Новый файл - новое имя, поэтому старое можно кешировать навсегда.
+    """
+    def __init__(self, directory, field_name):
+        self.directory = directory
+        self.field_name = field_name
+
+    def __call__(self, instance, filename):
+        return hashed_name(self.directory, filename, getattr(instance, self.field_name).file)
+
+    def __eq__(self, other):
+        return isinstance(other, ContentHashedUploadTo) and (self.directory, self.field_name) == (other.directory, other.field_name)
+
+
+def is_hashed(name):
+    return HASHED_NAME_RE.search(name) is not None
+
+
+class ContentHashedFileSystemStorage(FileSystemStorage):
+    """FileSystemStorage, который не дублирует файлы с хешем в имени.
+
+    Одинаковое имя с хешем - одинаковое содержимое, поэтому повторная загрузка
+    той же картинки получает имя уже сохраненного файла, а не копию с суффиксом
+    _AbCdEf1 (такое имя не прошло бы is_hashed и не кешировалось бы навсегда).
+    """
+    def get_available_name(self, name, max_length=None):
+        if is_hashed(name) and self.exists(name):
+            return name
+        return super().get_available_name(name, max_length)
+
+    def _save(self, name, content):
+        if is_hashed(name) and self.exists(name):
+            return name
+        return super()._save(name, content)
+
+
+def file_etag(stat):
+    return quote_etag(f'{stat.st_mtime_ns:x}-{stat.st_size:x}')
+
+
+def parse_range(header, size):
+    # поддерживаем один диапазон; для нескольких (multipart/byteranges) отдаем файл целиком
+    match = RANGE_RE.match(header.strip())
+    if match is None or size == 0:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first: # последние N байт
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    if start > end or start >= size:
+        raise ValueError('unsatisfiable range')
+    return start, end
+
+
+class FileRange:
+    """Часть открытого файла для FileResponse.
+
+    read() не выходит за конец диапазона, fileno() оставлен для sendfile:
+    сервер начинает с текущей позиции файла и шлет Content-Length байт.
+    """
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.name = file.name
+        self.remaining = length
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def find_file(root, name):
+    root = os.path.realpath(root)
+    path = os.path.realpath(os.path.join(root, name))
+    if not path.startswith(root + os.sep):
+        return None
+    return path
+
+
+def serve(request, path, document_root=None):
+    """Замена django.views.static.serve с ETag, диапазонами и долгим кешем."""
+    full_path = find_file(document_root or settings.MEDIA_ROOT, path)
+    try:
+        file = open(full_path, 'rb') if full_path else None
+    except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+        file = None
+    if file is None:
+        raise Http404('Файл не найден')
+
+    stat = os.fstat(file.fileno())
+    etag = file_etag(stat)
+    last_modified = http_date(stat.st_mtime)
+    cache_control = IMMUTABLE_CACHE_CONTROL if is_hashed(path) else DEFAULT_CACHE_CONTROL
+
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is not None: # 304 или 412
+        file.close()
+        response.headers['Cache-Control'] = cache_control
+        return response
+
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+    byte_range = None
+    range_header = request.headers.get('Range')
+    if range_header and request.headers.get('If-Range', etag) in (etag, last_modified):
+        try:
+            byte_range = parse_range(range_header, stat.st_size)
+        except ValueError:
+            file.close()
+            response = HttpResponse(status=416)
+            response.headers['Content-Range'] = f'bytes */{stat.st_size}'
+            return response
+
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type)
+    else:
+        start, end = byte_range
+        response = FileResponse(FileRange(file, start, end - start + 1), content_type=content_type, status=206)
+        response.headers['Content-Length'] = end - start + 1
+        response.headers['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+
+    response.block_size = BLOCK_SIZE
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.headers['ETag'] = etag
+    response.headers['Last-Modified'] = last_modified
+    response.headers['Cache-Control'] = cache_control
+    return response
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.7 on 2026-10-19 14:57
+
+import django.db.models.deletion
+import mainpage.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('mainpage', '0006_answer_is_correct'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedQuestion',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('slug', models.SlugField(max_length=200, unique=True)),
+                ('title', models.CharField(max_length=200)),
+                ('detailed', models.TextField()),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateField(null=True)),
+                ('updated_at', models.DateField(null=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('tags', models.ManyToManyField(blank=True, related_name='archived_questions', to='mainpage.tag')),
+            ],
+            options={
+                'verbose_name': 'Архивный вопрос',
+                'verbose_name_plural': 'Архивные вопросы',
+            },
+            bases=(mainpage.models.ArchivedVotesMixin, models.Model),
+        ),
+        migrations.CreateModel(
+            name='ArchivedAnswer',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('answer_text', models.TextField()),
+                ('is_correct', models.BooleanField(default=False)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateField(null=True)),
+                ('updated_at', models.DateField(null=True)),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='answer_set', to='mainpage.archivedquestion')),
+            ],
+            options={
+                'verbose_name': 'Архивный ответ',
+                'verbose_name_plural': 'Архивные ответы',
+            },
+            bases=(mainpage.models.ArchivedVotesMixin, models.Model),
+        ),
+        migrations.CreateModel(
+            name='ArchivedVote',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.SmallIntegerField(choices=[(1, 'Up'), (-1, 'Down')])),
+                ('object_id', models.PositiveIntegerField()),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['content_type', 'object_id'], name='mainpage_ar_content_de4563_idx')],
+            },
+        ),
+    ]
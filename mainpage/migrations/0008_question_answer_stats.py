@@ -0,0 +1,50 @@
+# Generated by Django 5.2.7 on 2026-10-19 15:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_answer_stats(apps, schema_editor):
+    Question = apps.get_model('mainpage', 'Question')
+    Answer = apps.get_model('mainpage', 'Answer')
+
+    answers = Answer.objects.filter(question=OuterRef('pk'), is_active=True).order_by()
+    Question.objects.update(
+        answers_count=Coalesce(Subquery(answers.values('question').annotate(cnt=Count('id')).values('cnt')), 0),
+        accepted_answer=Subquery(answers.filter(is_correct=True).order_by('id').values('id')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainpage', '0007_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='accepted_answer',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='mainpage.answer', verbose_name='Принятый ответ'),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='answers_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество ответов'),
+        ),
+        migrations.RunPython(fill_answer_stats, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(models.OrderBy(models.F('id'), descending=True), condition=models.Q(('answers_count', 0)), name='question_unanswered_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(models.OrderBy(models.F('id'), descending=True), condition=models.Q(('accepted_answer__isnull', False)), name='question_solved_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(models.OrderBy(models.F('id'), descending=True), condition=models.Q(('accepted_answer__isnull', True), ('answers_count__gt', 0)), name='question_open_idx'),
+        ),
+    ]
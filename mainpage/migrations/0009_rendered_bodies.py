@@ -0,0 +1,52 @@
+# Generated by Django 5.2.7 on 2026-10-19 15:08
+
+from django.db import migrations, models
+
+from mainpage import rendering
+
+
+def render_bodies(apps, schema_editor):
+    for model_name, source_field, render in (
+        ('Question', 'detailed', rendering.render_question),
+        ('ArchivedQuestion', 'detailed', lambda text: {'detailed_html': rendering.render_markdown(text)}),
+        ('Answer', 'answer_text', rendering.render_answer),
+        ('ArchivedAnswer', 'answer_text', rendering.render_answer),
+    ):
+        model = apps.get_model('mainpage', model_name)
+        rendering.rerender_all(model._base_manager.all(), source_field, render)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainpage', '0008_question_answer_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='answer',
+            name='answer_html',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='archivedanswer',
+            name='answer_html',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='archivedquestion',
+            name='detailed_html',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='detailed_html',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='excerpt',
+            field=models.CharField(blank=True, default='', editable=False, max_length=201),
+        ),
+        migrations.RunPython(render_bodies, migrations.RunPython.noop),
+    ]
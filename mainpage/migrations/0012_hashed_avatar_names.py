@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-19 15:18
+
+import mainpage.media
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainpage', '0011_similarity_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='avatar',
+            field=models.ImageField(blank=True, null=True, upload_to=mainpage.media.ContentHashedUploadTo('avatars', 'avatar')),
+        ),
+    ]
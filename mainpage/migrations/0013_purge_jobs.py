@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-19 15:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainpage', '0012_hashed_avatar_names'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PurgeJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('target', models.CharField(choices=[('user', 'Пользователь'), ('question', 'Вопрос')], max_length=20, verbose_name='Объект')),
+                ('target_id', models.BigIntegerField(verbose_name='ID объекта')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('running', 'Выполняется'), ('done', 'Готово'), ('failed', 'Ошибка'), ('cancelled', 'Отменено')], default='pending', max_length=20, verbose_name='Статус')),
+                ('step', models.CharField(blank=True, default='', max_length=100, verbose_name='Шаг')),
+                ('total_rows', models.PositiveIntegerField(default=0, verbose_name='Строк всего')),
+                ('deleted_rows', models.PositiveIntegerField(default=0, verbose_name='Строк удалено')),
+                ('error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('moderator', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Модератор')),
+            ],
+            options={
+                'verbose_name': 'Очистка',
+                'verbose_name_plural': 'Очистки',
+                'indexes': [models.Index(fields=['status', 'id'], name='mainpage_pu_status_610f5b_idx')],
+            },
+        ),
+    ]
@@ -1,13 +1,23 @@
-from mainpage.models import Tag, User
+import math
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.module_loading import import_string
+
+from mainpage.models import Question, Tag, User
+from mainpage import versions, lookups
 import random
 
 
 class TagsAndMembersMixin:
+    # в кеше процесса лежат только поля для боковой панели, а не целые объекты
+    # (у User там были бы хеш пароля и email)
     def get_tags(self):
-        return Tag.objects.all()
+        return lookups.get_all(Tag, Tag.objects.values('id', 'title', 'slug'))
     
     def get_members(self):
-        return User.objects.all()
+        return lookups.get_all(User, User.objects.order_by('id').values('id', 'username', 'slug', 'avatar')[:20])
     
     def get_tags_and_members(self):
         tags = list(self.get_tags())
@@ -16,7 +26,129 @@ class TagsAndMembersMixin:
         colors = ['blueviolet', 'brown', 'chartreuse', 'orange', 'red']
 
         for tag in tags:
-            tag.color = random.choice(colors)
+            tag['color'] = random.choice(colors)
         for member in members:
-            member.color = random.choice(colors)
-        return tags, members
\ No newline at end of file
+            member['color'] = random.choice(colors)
+        return tags, members
+
+
+class QuestionFilterMixin:
+    # Общие фильтры ленты вопросов, используются и в HTML, и в JSON API
+    # Для каждого режима ?filter= есть частичный индекс в Question.Meta.indexes
+    FEED_FILTERS = {
+        'unanswered': Q(answers_count=0),
+        'solved': Q(accepted_answer__isnull=False),
+        'open': Q(accepted_answer__isnull=True, answers_count__gt=0),
+    }
+
+    def get_questions(self, tag = None, user = None, search = None, feed_filter = None):
+        question = Question.objects.all()
+        if feed_filter in self.FEED_FILTERS:
+            question = question.filter(self.FEED_FILTERS[feed_filter])
+        if tag:
+            tag_id = lookups.get_tag_id(tag)
+            if tag_id:
+                question = question.filter(tags=tag_id)
+        if user:
+            question = question.filter(author=user)
+        
+        if search:
+            words = search.split()
+            for word in words:
+                question = question.filter(
+                    Q(slug__icontains=word) |
+                    Q(title__icontains=word) |
+                    Q(detailed__icontains=word) |
+                    Q(author__username__icontains=word) |
+                    Q(tags__slug__icontains=word)
+                ).distinct()
+        
+        return question
+
+    def get_search(self):
+        return self.request.GET.get('search', '').strip()
+
+    def get_feed_version(self):
+        # поиск по LIKE не проверяем на 304: версия стоила бы как сама выборка
+        if self.get_search():
+            return None, None
+        return versions.feed_version(self.get_filtered_questions())
+
+    def get_filtered_questions(self):
+        # фильтры берутся из GET-параметров, queryset кешируем на время запроса
+        if not hasattr(self, '_filtered_questions'):
+            author = None
+            author_slug = self.request.GET.get('author', None)
+            if author_slug:
+                author = lookups.get_user_id(author_slug)
+
+            self._filtered_questions = self.get_questions(
+                tag=self.request.GET.get('tag', None),
+                user=author,
+                search=self.get_search(),
+                feed_filter=self.request.GET.get('filter', None),
+            )
+        return self._filtered_questions
+
+
+class PaginationMixin:
+    def get_requested_page(self):
+        try: # Защищаемся от ввода строки
+            return max(int(self.request.GET.get('page', 1)), 1)
+        except (TypeError, ValueError):
+            return 1
+
+    def get_pagination(self, count, per_page):
+        max_page = max(math.ceil(count / per_page), 1)
+        page = min(self.get_requested_page(), max_page) # и от выхода за предел страниц
+
+        # Вычисляем номера страниц, которые нужно показывать
+        if max_page < 6:
+            pages = [i for i in range(1, max_page + 1)]
+        elif page < 4:
+            pages = [i for i in range(1, 5)] + [max_page]
+        elif page > (max_page - 3):
+            pages = [1] + [i for i in range(max_page - 3, max_page + 1)]
+        else:
+            pages = [1] + [i for i in range(page - 1, page + 2)] + [max_page]
+
+        return {'max_page': max_page, 'page': page, 'pages': pages}
+
+
+class ConditionalPageMixin:
+    # Отдает 304 по If-None-Match до того, как собирается контекст страницы.
+    # Наследник определяет get_page_version(), возвращающий (etag, last_modified)
+    # Страницы с CSRF-токеном в разметке нельзя класть в общие кеши: PUBLIC_CACHE = False
+    PUBLIC_CACHE = True
+
+    def get_page_version(self):
+        return None, None
+
+    def get(self, request, *args, **kwargs):
+        etag, last_modified = self.get_page_version()
+        if etag is not None:
+            etag = versions.make_etag(etag, *versions.sidebar_version(), *versions.user_version(request.user))
+
+        response = versions.not_modified_response(request, etag)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+
+        return self.patch_page_response(request, response, etag, last_modified)
+
+    def patch_page_response(self, request, response, etag, last_modified):
+        versions.set_version_headers(response, etag, last_modified)
+        patch_vary_headers(response, ('Cookie', ))
+        if request.user.is_authenticated or not self.PUBLIC_CACHE:
+            # страница персональная, хранить ее можно только в браузере и только с ревалидацией
+            patch_cache_control(response, private=True, no_cache=True)
+        else:
+            patch_cache_control(response, public=True, max_age=settings.HTML_CACHE_MAX_AGE, must_revalidate=True)
+        return response
+
+
+class LazyFormClassMixin:
+    # Формы импортируются при первом запросе к странице, а не при старте воркера
+    form_class_name = None
+
+    def get_form_class(self):
+        return import_string('mainpage.forms.' + self.form_class_name)
@@ -1,19 +1,44 @@
-from django.db import models
-from django.utils.text import slugify
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
-from django.db.models import Sum
+from django.db.models import Sum, F, Q, Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from mainpage.slugs import make_slug
+from mainpage import rendering
+from mainpage.media import ContentHashedUploadTo
 
-from transliterate import translit
 import uuid
 
 
 
+def render_on_save(obj, save_kwargs, source_field, render):
+    # перерисовываем HTML, только если сохраняется исходный текст
+    update_fields = save_kwargs.get('update_fields')
+    if update_fields is not None and source_field not in update_fields:
+        return
+    rendered = render(getattr(obj, source_field))
+    for field, value in rendered.items():
+        setattr(obj, field, value)
+    if update_fields is not None:
+        save_kwargs['update_fields'] = {*update_fields, *rendered}
+
+
+class ActiveManager(models.Manager):
+    # По умолчанию работаем только с "горячими" (активными) записями
+    def get_queryset(self):
+        return super().get_queryset().filter(is_active=True)
+
+
 class DefaultModel(models.Model):
     class Meta:
         abstract = True
 
+    objects = ActiveManager()
+    all_objects = models.Manager()
 
     is_active = models.BooleanField(default=True, verbose_name='Активен')
     created_at = models.DateField(auto_now_add=True, verbose_name='Время создания', editable=False, null=True)
@@ -26,12 +51,12 @@ class User(AbstractUser):
         verbose_name_plural = 'Пользователи'
 
 
-    avatar = models.ImageField(upload_to='avatars', null=True, blank=True)
+    avatar = models.ImageField(upload_to=ContentHashedUploadTo('avatars', 'avatar'), null=True, blank=True)
     slug = models.SlugField(max_length=150, blank=True, null=True)
 
     def save(self, *args, **kwargs):
         if not self.pk or not self.slug:
-            curr_slug = slugify(translit(self.username, 'ru', reversed=True))
+            curr_slug = make_slug(self.username)
         
             while User.objects.filter(slug=curr_slug).exists():
                 random_suffix = uuid.uuid4().hex[:4]
@@ -65,13 +90,30 @@ class Question(DefaultModel):
     class Meta:
         verbose_name = 'Вопрос'
         verbose_name_plural = 'Вопросы'
+        # частичные индексы: лента с фильтром читает только свою часть таблицы
+        indexes = [
+            models.Index(F('id').desc(), condition=Q(answers_count=0), name='question_unanswered_idx'),
+            models.Index(F('id').desc(), condition=Q(accepted_answer__isnull=False), name='question_solved_idx'),
+            models.Index(F('id').desc(), condition=Q(accepted_answer__isnull=True, answers_count__gt=0), name='question_open_idx'),
+        ]
 
+    is_archived = False
 
     slug = models.SlugField(max_length=200, unique=True)
     title = models.CharField(max_length=200)
     detailed = models.TextField()
     author = models.ForeignKey(User, on_delete=models.CASCADE)
     tags = models.ManyToManyField('Tag', blank=True, verbose_name='Теги')
+    # Денормализованные поля для лент "без ответа" / "решенные" / "открытые"
+    answers_count = models.PositiveIntegerField(default=0, verbose_name='Количество ответов')
+    accepted_answer = models.ForeignKey('Answer', null=True, blank=True, on_delete=models.SET_NULL, related_name='+', verbose_name='Принятый ответ')
+    # Счетчик изменений для ETag: updated_at - только дата и не меняется при
+    # правке в тот же день. Растет при сохранении вопроса, смене принятого ответа
+    # и сохранении любого его ответа
+    version = models.PositiveIntegerField(default=0, editable=False)
+    # HTML и короткий текст для ленты считаются при сохранении (mainpage.rendering)
+    detailed_html = models.TextField(blank=True, default='', editable=False)
+    excerpt = models.CharField(max_length=rendering.EXCERPT_LENGTH + 1, blank=True, default='', editable=False)
 
 
     
@@ -79,25 +121,51 @@ class Question(DefaultModel):
         return str(self.title)
     
     def save(self, *args, **kwargs):
+        render_on_save(self, kwargs, 'detailed', rendering.render_question)
+
         if not self.pk or not self.slug: # генерим slug когда объект создается или если у объекта вообще нет slug
-            curr_slug = slugify(translit(self.title, 'ru', reversed=True))
+            curr_slug = make_slug(self.title)
 
-            while Question.objects.filter(slug=curr_slug).exists(): #если занят текущий slug
+            while slug_taken(curr_slug): #если занят текущий slug
                 random_suffix = uuid.uuid4().hex[:4]
                 curr_slug = f"{curr_slug}+{random_suffix}"
 
             self.slug = curr_slug
 
-        return super(Question, self).save(*args, **kwargs)
+        bump = not self._state.adding
+        if bump:
+            self.version = F('version') + 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'version'}
+        result = super(Question, self).save(*args, **kwargs)
+        if bump:
+            self.refresh_from_db(fields=['version'])
+        return result
     
     def get_tags(self):
         return self.tags.all()
 
-    def answers_count(self):
-        return self.answer_set.count()
-    
+    def update_accepted_answer(self, answer):
+        # вызывается после изменения answer.is_correct, внутри транзакции
+        if answer.is_correct:
+            accepted_id = answer.id
+        elif self.accepted_answer_id == answer.id:
+            # снятый ответ был принятым - берем следующий отмеченный, если есть
+            accepted_id = (
+                Answer.objects.filter(question_id=self.id, is_correct=True)
+                .order_by('id').values_list('id', flat=True).first()
+            )
+        else:
+            return
+
+        Question.all_objects.filter(pk=self.pk).update(accepted_answer_id=accepted_id, version=F('version') + 1)
+        self.accepted_answer_id = accepted_id
+
     @property
     def rating(self):
+        # списки могут посчитать рейтинг в том же запросе: .annotate(annotated_rating=...)
+        if hasattr(self, 'annotated_rating'):
+            return self.annotated_rating
         ct = ContentType.objects.get_for_model(self)
         total = Vote.objects.filter(content_type=ct, object_id=self.id).aggregate(Sum('value'))['value__sum']
         return total or 0
@@ -123,12 +191,22 @@ class Answer(DefaultModel):
     answer_text = models.TextField()
     author = models.ForeignKey(User, on_delete=models.CASCADE)
     is_correct = models.BooleanField(default=False)
+    answer_html = models.TextField(blank=True, default='', editable=False)
 
     def __str__(self):
         return "Ответ на вопрос ID=" + str(self.question_id)
+
+    def save(self, *args, **kwargs):
+        render_on_save(self, kwargs, 'answer_text', rendering.render_answer)
+
+        # answers_count меняет сигнал post_save - в одной транзакции с ответом
+        with transaction.atomic():
+            super().save(*args, **kwargs)
     
     @property
     def rating(self):
+        if hasattr(self, 'annotated_rating'):
+            return self.annotated_rating
         cp = ContentType.objects.get_for_model(self)
         total = Vote.objects.filter(content_type=cp, object_id=self.id).aggregate(Sum('value'))['value__sum']
         return total or 0
@@ -152,6 +230,8 @@ class Tag(models.Model):
 
     title = models.CharField(max_length=200, verbose_name='Название тега', unique=True)
     slug = models.SlugField(max_length=200, unique=True)
+    # по нему выбирается путь ленты: fan-out при записи или чтение при показе (mainpage.timeline)
+    followers_count = models.PositiveIntegerField(default=0, editable=False, verbose_name='Подписчиков')
 
     def __str__(self):
         return self.title
@@ -164,7 +244,7 @@ class Tag(models.Model):
         # Не уверен, что он тут нужен, поскольку у title есть свойство unique=True
         # Но пускай будет
         if not self.pk or not self.slug:
-            curr_slug = slugify(translit(self.title, 'ru', reversed=True))
+            curr_slug = make_slug(self.title)
         
             while Tag.objects.filter(slug=curr_slug).exists():
                 random_suffix = uuid.uuid4().hex[:4]
@@ -173,3 +253,259 @@ class Tag(models.Model):
             self.slug = curr_slug
         
         super().save(*args, **kwargs)
+
+
+# Индекс похожих вопросов (mainpage.similarity): MinHash-подпись и LSH-корзины
+
+class QuestionSignature(models.Model):
+    question = models.OneToOneField(Question, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    signature = models.BinaryField() # NUM_PERM беззнаковых 64-битных чисел
+
+
+class QuestionLshBucket(models.Model):
+    class Meta:
+        indexes = [models.Index(fields=['key'])]
+
+    key = models.BigIntegerField()
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='+')
+
+
+# Подписки и персональная лента. Новый вопрос раскладывается в TimelineEntry
+# подписчиков его тегов и автора (mainpage.timeline), страница ленты - чтение
+# по индексу (user, question) от курсора вниз.
+
+class FollowedTag(models.Model):
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'tag'], name='unique_followed_tag'),
+        ]
+        indexes = [models.Index(fields=['tag', 'user'])]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='followed_tags')
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name='follows')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+
+class FollowedAuthor(models.Model):
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['follower', 'author'], name='unique_followed_author'),
+        ]
+        indexes = [models.Index(fields=['author', 'follower'])]
+
+    follower = models.ForeignKey(User, on_delete=models.CASCADE, related_name='followed_authors')
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='followers')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+
+class TimelineEntry(models.Model):
+    class Meta:
+        # индекс уникальности (user, question) и есть индекс чтения ленты
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'question'], name='unique_timeline_entry'),
+        ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='+')
+    # сколько подписок пользователя совпало: теги + автор
+    score = models.PositiveSmallIntegerField(default=1)
+
+
+def slug_taken(slug):
+    # slug вопроса уникален и среди активных, и среди неактивных, и среди архивных вопросов
+    return Question.all_objects.filter(slug=slug).exists() or ArchivedQuestion.objects.filter(slug=slug).exists()
+
+
+# Архив: старые и неактивные вопросы переносятся сюда командой archive_questions,
+# чтобы основные таблицы и их индексы оставались маленькими.
+# id сохраняются, поэтому старые ссылки /question/id/<id> продолжают работать.
+
+class ArchivedVote(models.Model):
+    class Meta:
+        indexes = [models.Index(fields=['content_type', 'object_id'])]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    value = models.SmallIntegerField(choices=Vote.VALUE_CHOISES)
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveIntegerField()
+
+
+class ArchivedVotesMixin:
+    @property
+    def rating(self):
+        if hasattr(self, 'annotated_rating'):
+            return self.annotated_rating
+        ct = ContentType.objects.get_for_model(self.ARCHIVED_FROM)
+        total = ArchivedVote.objects.filter(content_type=ct, object_id=self.id).aggregate(Sum('value'))['value__sum']
+        return total or 0
+
+    def get_user_vote(self, user):
+        if not user or not user.is_authenticated:
+            return 0
+        ct = ContentType.objects.get_for_model(self.ARCHIVED_FROM)
+        vote = ArchivedVote.objects.filter(user=user, content_type=ct, object_id=self.id).first()
+
+        if vote:
+            return vote.value
+        return 0
+
+
+class ArchivedQuestion(ArchivedVotesMixin, models.Model):
+    class Meta:
+        verbose_name = 'Архивный вопрос'
+        verbose_name_plural = 'Архивные вопросы'
+
+    ARCHIVED_FROM = Question
+    is_archived = True
+
+    objects = models.Manager()
+    # неактивные вопросы архивируются вместе с флагом и наружу не показываются
+    visible = ActiveManager()
+
+    id = models.BigIntegerField(primary_key=True)
+    slug = models.SlugField(max_length=200, unique=True)
+    title = models.CharField(max_length=200)
+    detailed = models.TextField()
+    detailed_html = models.TextField(blank=True, default='')
+    author = models.ForeignKey(User, on_delete=models.CASCADE)
+    tags = models.ManyToManyField(Tag, blank=True, related_name='archived_questions')
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateField(null=True)
+    updated_at = models.DateField(null=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return str(self.title)
+
+    def get_tags(self):
+        return self.tags.all()
+
+    def answers_count(self):
+        return self.answer_set.filter(is_active=True).count()
+
+
+class ArchivedAnswer(ArchivedVotesMixin, models.Model):
+    class Meta:
+        verbose_name = 'Архивный ответ'
+        verbose_name_plural = 'Архивные ответы'
+
+    ARCHIVED_FROM = Answer
+
+    id = models.BigIntegerField(primary_key=True)
+    # related_name как у Answer, чтобы QuestionView работал с архивом без изменений
+    question = models.ForeignKey(ArchivedQuestion, on_delete=models.CASCADE, related_name='answer_set')
+    answer_text = models.TextField()
+    answer_html = models.TextField(blank=True, default='')
+    author = models.ForeignKey(User, on_delete=models.CASCADE)
+    is_correct = models.BooleanField(default=False)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateField(null=True)
+    updated_at = models.DateField(null=True)
+
+    def __str__(self):
+        return "Архивный ответ на вопрос ID=" + str(self.question_id)
+
+
+def refresh_answer_stats(question_ids=None):
+    # Пересчет answers_count и accepted_answer, например после bulk-импорта
+    questions = Question.all_objects.all()
+    if question_ids is not None:
+        questions = questions.filter(pk__in=question_ids)
+
+    answers = Answer.objects.filter(question=OuterRef('pk')).order_by()
+    questions.update(
+        answers_count=Coalesce(Subquery(answers.values('question').annotate(cnt=Count('id')).values('cnt')), 0),
+        accepted_answer=Subquery(answers.filter(is_correct=True).order_by('id').values('id')[:1]),
+    )
+
+
+# Счетчики вопроса ведут сигналы, а не Answer.save/delete: post_delete приходит
+# и при каскадном удалении (вопроса, автора) через коллектор, и в его транзакции.
+# Массовые update()/bulk_create() сигналов не шлют - там зовется refresh_answer_stats.
+
+@receiver(post_save, sender=Answer)
+def count_new_answer(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    # любая правка ответа (текст, is_correct) меняет страницу вопроса
+    changes = {'version': F('version') + 1}
+    if created and instance.is_active:
+        changes['answers_count'] = F('answers_count') + 1
+    Question.all_objects.filter(pk=instance.question_id).update(**changes)
+
+
+@receiver(post_delete, sender=Answer)
+def uncount_deleted_answer(sender, instance, **kwargs):
+    if instance.is_active:
+        # пересчет, а не -1: удаленный ответ мог быть принятым
+        refresh_answer_stats([instance.question_id])
+
+
+# Модерация (mainpage.moderation): пользователь или вопрос сначала скрываются
+# через is_active, затем фоновая очистка удаляет связанные строки пачками.
+# Задание хранит прогресс, чтобы большие очистки можно было отслеживать и продолжать.
+
+class PurgeJob(models.Model):
+    class Meta:
+        verbose_name = 'Очистка'
+        verbose_name_plural = 'Очистки'
+        indexes = [models.Index(fields=['status', 'id'])]
+
+    TARGET_CHOICES = (('user', 'Пользователь'), ('question', 'Вопрос'))
+    STATUS_CHOICES = (
+        ('pending', 'В очереди'),
+        ('running', 'Выполняется'),
+        ('done', 'Готово'),
+        ('failed', 'Ошибка'),
+        ('cancelled', 'Отменено'),
+    )
+
+    target = models.CharField(max_length=20, choices=TARGET_CHOICES, verbose_name='Объект')
+    target_id = models.BigIntegerField(verbose_name='ID объекта')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', verbose_name='Статус')
+    step = models.CharField(max_length=100, blank=True, default='', verbose_name='Шаг')
+    total_rows = models.PositiveIntegerField(default=0, verbose_name='Строк всего')
+    deleted_rows = models.PositiveIntegerField(default=0, verbose_name='Строк удалено')
+    error = models.TextField(blank=True, default='')
+    moderator = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name='+', verbose_name='Модератор')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.get_target_display()} ID={self.target_id}: {self.get_status_display()}'
+
+    @property
+    def progress(self):
+        if not self.total_rows:
+            return 1.0 if self.status == 'done' else 0.0
+        return min(self.deleted_rows / self.total_rows, 1.0)
+
+
+class ImportRun(models.Model):
+    """Прогресс import_forum: строка дампа, до которой все уже в базе.
+
+    Пишется в той же транзакции, что и пачка, поэтому после сбоя
+    импорт продолжается ровно с первой незакоммиченной строки.
+    """
+    class Meta:
+        verbose_name = 'Импорт'
+        verbose_name_plural = 'Импорты'
+
+    name = models.CharField(max_length=255, unique=True, verbose_name='Имя')
+    line = models.PositiveBigIntegerField(default=0, verbose_name='Строка')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.name}: строка {self.line}'
+
+
+class ImportIdMap(models.Model):
+    # id из дампа -> id в этой базе, чтобы не держать карты всех импортированных строк в памяти
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['run', 'model', 'old_id'], name='import_id_map_unique')]
+
+    run = models.ForeignKey(ImportRun, on_delete=models.CASCADE, related_name='id_maps')
+    model = models.CharField(max_length=20)
+    old_id = models.BigIntegerField()
+    new_id = models.BigIntegerField()
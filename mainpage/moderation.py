@@ -0,0 +1,288 @@
+import logging
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from mainpage import suggest
+from mainpage.models import (
+    User, Question, Answer, Tag, Vote, FollowedTag, FollowedAuthor, TimelineEntry,
+    QuestionSignature, QuestionLshBucket, ArchivedQuestion, ArchivedAnswer, ArchivedVote,
+    PurgeJob, refresh_answer_stats,
+)
+
+
+# Модерация: удаление пользователя или вопроса в два этапа.
+# 1. Сразу: is_active=False у самого объекта и его вопросов/ответов, пересчет
+#    answers_count и принятого ответа - с этого момента объект не виден.
+# 2. В фоне (PurgeJob): связанные строки удаляются шагами, каждый шаг - пачки
+#    по MODERATION_PURGE_CHUNK_SIZE id одним DELETE ... WHERE id IN (...), без
+#    коллектора Django, который грузит в память все связанные объекты.
+#    Каждая пачка - своя короткая транзакция, между пачками пауза для писателей.
+# Шаги пересчитываются из базы на каждой пачке, поэтому прерванную очистку
+# можно просто запустить заново (команда purge_deleted).
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # один поток: очистки идут по очереди и не конкурируют друг с другом за запись
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='purge')
+        return _executor
+
+
+def id_batches(queryset, batch_size=BATCH_SIZE):
+    ids = list(queryset.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(ids), batch_size):
+        yield ids[start:start + batch_size]
+
+
+# Этап 1: скрытие
+
+def deactivate_answers(answers):
+    # неактивные ответы не считаются в answers_count, поэтому сразу пересчитываем вопросы
+    for batch in id_batches(answers):
+        with transaction.atomic():
+            question_ids = set(Answer.all_objects.filter(pk__in=batch).values_list('question_id', flat=True))
+            Answer.all_objects.filter(pk__in=batch).update(is_active=False)
+            refresh_answer_stats(question_ids)
+
+
+def deactivate_questions(questions):
+    for batch in id_batches(questions):
+        Question.all_objects.filter(pk__in=batch).update(is_active=False)
+        for question_id in batch:
+            suggest.index.remove(suggest.QUESTION, question_id)
+
+
+def soft_delete(target, ids, moderator=None, schedule=True):
+    """Скрывает пользователей или вопросы и ставит их очистку в очередь.
+
+    schedule=False - задания только создаются, выполнить их можно через run_purge().
+    """
+    ids = list(ids)
+    if target == 'question':
+        deactivate_questions(Question.all_objects.filter(pk__in=ids))
+        ArchivedQuestion.objects.filter(pk__in=ids).update(is_active=False)
+    elif target == 'user':
+        # is_active=False сразу закрывает вход и существующие сессии
+        User.objects.filter(pk__in=ids).update(is_active=False)
+        deactivate_questions(Question.all_objects.filter(author_id__in=ids, is_active=True))
+        deactivate_answers(Answer.all_objects.filter(author_id__in=ids, is_active=True))
+        # архивные копии видны через QuestionView так же, как живые
+        ArchivedQuestion.objects.filter(author_id__in=ids).update(is_active=False)
+        ArchivedAnswer.objects.filter(author_id__in=ids).update(is_active=False)
+    else:
+        raise ValueError(f'Unknown purge target: {target}')
+
+    jobs = PurgeJob.objects.bulk_create([PurgeJob(target=target, target_id=pk, moderator=moderator) for pk in ids])
+    if schedule:
+        for job in jobs:
+            schedule_purge(job.pk)
+    return jobs
+
+
+def soft_delete_question(question, moderator=None):
+    return soft_delete('question', [question.pk], moderator)[0]
+
+
+def soft_delete_user(user, moderator=None):
+    return soft_delete('user', [user.pk], moderator)[0]
+
+
+# Этап 2: очистка
+
+class Step:
+    """Шаг очистки: queryset строк и необязательный хук before_delete(ids).
+
+    Хук вызывается в той же транзакции, что и удаление пачки, - так
+    денормализованные счетчики меняются вместе со строками.
+    """
+    def __init__(self, label, queryset, before_delete=None):
+        self.label = label
+        self.queryset = queryset
+        self.before_delete = before_delete
+
+    def count(self):
+        return self.queryset.count()
+
+    def delete_chunk(self, chunk_size):
+        model = self.queryset.model
+        using = self.queryset.db
+        ids = list(self.queryset.order_by().values_list('pk', flat=True)[:chunk_size])
+        if not ids:
+            return 0
+        with transaction.atomic(using=using):
+            if self.before_delete is not None:
+                self.before_delete(ids)
+            raw_delete(model, ids, using)
+        return len(ids)
+
+
+def raw_delete(model, ids, using='default'):
+    connection = connections[using]
+    table = connection.ops.quote_name(model._meta.db_table)
+    pk = connection.ops.quote_name(model._meta.pk.column)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE {pk} IN ({", ".join(["%s"] * len(ids))})', ids)
+        return cursor.rowcount
+
+
+def clear_accepted_answers(answer_ids):
+    Question.all_objects.filter(accepted_answer_id__in=answer_ids).update(accepted_answer=None)
+
+
+def unfollow_tags(followed_ids):
+    # followers_count тегов уменьшается вместе с удалением подписок
+    counts = Counter(FollowedTag.objects.filter(pk__in=followed_ids).values_list('tag_id', flat=True))
+    for tag_id, count in counts.items():
+        Tag.objects.filter(pk=tag_id).update(followers_count=F('followers_count') - count)
+
+
+def unindex_questions(question_ids):
+    for question_id in question_ids:
+        suggest.index.remove(suggest.QUESTION, question_id)
+
+
+def answer_steps(answers):
+    answer_ct = ContentType.objects.get_for_model(Answer)
+    return [
+        Step('Голоса за ответы', Vote.objects.filter(content_type=answer_ct, object_id__in=answers.values('id'))),
+        Step('Ответы', answers, clear_accepted_answers),
+    ]
+
+
+def question_steps(questions):
+    question_ct = ContentType.objects.get_for_model(Question)
+    question_ids = questions.values('id')
+    return answer_steps(Answer.all_objects.filter(question_id__in=question_ids)) + [
+        Step('Голоса за вопросы', Vote.objects.filter(content_type=question_ct, object_id__in=question_ids)),
+        Step('Лента', TimelineEntry.objects.filter(question_id__in=question_ids)),
+        Step('Индекс похожих', QuestionLshBucket.objects.filter(question_id__in=question_ids)),
+        Step('Подписи вопросов', QuestionSignature.objects.filter(question_id__in=question_ids)),
+        Step('Теги вопросов', Question.tags.through.objects.filter(question_id__in=question_ids)),
+        Step('Вопросы', questions, unindex_questions),
+    ]
+
+
+def archived_steps(questions, answers, votes=Q()):
+    # questions/answers - архивные строки к удалению, votes - дополнительное условие на ArchivedVote
+    question_ct = ContentType.objects.get_for_model(Question)
+    answer_ct = ContentType.objects.get_for_model(Answer)
+    answers = answers | ArchivedAnswer.objects.filter(question_id__in=questions.values('id'))
+    return [
+        Step('Архивные голоса', ArchivedVote.objects.filter(
+            votes |
+            Q(content_type=question_ct, object_id__in=questions.values('id')) |
+            Q(content_type=answer_ct, object_id__in=answers.values('id'))
+        )),
+        Step('Архивные ответы', answers),
+        Step('Теги архивных вопросов', ArchivedQuestion.tags.through.objects.filter(archivedquestion_id__in=questions.values('id'))),
+        Step('Архивные вопросы', questions),
+    ]
+
+
+def user_steps(user_id):
+    return question_steps(Question.all_objects.filter(author_id=user_id)) + answer_steps(Answer.all_objects.filter(author_id=user_id)) + [
+        Step('Голоса пользователя', Vote.objects.filter(user_id=user_id)),
+        *archived_steps(
+            ArchivedQuestion.objects.filter(author_id=user_id),
+            ArchivedAnswer.objects.filter(author_id=user_id),
+            Q(user_id=user_id),
+        ),
+        Step('Подписки на теги', FollowedTag.objects.filter(user_id=user_id), unfollow_tags),
+        Step('Подписки на авторов', FollowedAuthor.objects.filter(Q(follower_id=user_id) | Q(author_id=user_id))),
+        Step('Лента пользователя', TimelineEntry.objects.filter(user_id=user_id)),
+    ]
+
+
+def unfinished_jobs():
+    return PurgeJob.objects.filter(status__in=('pending', 'running', 'failed'))
+
+
+def get_steps(job):
+    # None - объект снова активен или уже удален, очищать нечего
+    if job.target == 'question':
+        # вопрос мог успеть уехать в архив (archive_questions) - чистим обе копии
+        questions = Question.all_objects.filter(pk=job.target_id, is_active=False)
+        archived = ArchivedQuestion.objects.filter(pk=job.target_id, is_active=False)
+        if not questions.exists() and not archived.exists():
+            return None
+        return question_steps(questions) + archived_steps(archived, ArchivedAnswer.objects.none())
+    if job.target == 'user':
+        return user_steps(job.target_id) if User.objects.filter(pk=job.target_id, is_active=False).exists() else None
+    return None
+
+
+def finish(job):
+    if job.target == 'user':
+        # все тяжелые связи уже удалены, коллектору остаются единичные строки (журнал админки и т.п.)
+        User.objects.filter(pk=job.target_id, is_active=False).delete()
+
+
+def update_job(job, **fields):
+    # update() не трогает auto_now, а по updated_at видно зависшие задания
+    fields['updated_at'] = timezone.now()
+    for name, value in fields.items():
+        setattr(job, name, value)
+    PurgeJob.objects.filter(pk=job.pk).update(**fields)
+
+
+def run_purge(job_id, progress=None):
+    job = PurgeJob.objects.get(pk=job_id)
+    if job.status in ('done', 'cancelled'):
+        return job
+
+    steps = get_steps(job)
+    if steps is None:
+        update_job(job, status='cancelled', step='')
+        return job
+
+    update_job(job, status='running', error='', total_rows=job.deleted_rows + sum(step.count() for step in steps))
+    chunk_size = settings.MODERATION_PURGE_CHUNK_SIZE
+    try:
+        for step in steps:
+            update_job(job, step=step.label)
+            while deleted := step.delete_chunk(chunk_size):
+                update_job(job, deleted_rows=job.deleted_rows + deleted)
+                if progress is not None:
+                    progress(job)
+                time.sleep(settings.MODERATION_PURGE_PAUSE)
+        finish(job)
+    except Exception as e:
+        update_job(job, status='failed', error=repr(e))
+        raise
+    # total_rows - оценка (шаги пересекаются, например ответы автора на свои вопросы)
+    update_job(job, status='done', step='', total_rows=job.deleted_rows)
+    return job
+
+
+def run_purge_in_background(job_id):
+    try:
+        run_purge(job_id)
+    except Exception:
+        logger.exception('Purge job %s failed', job_id)
+    finally:
+        connections.close_all() # у потока пула свои соединения
+
+
+def schedule_purge(job_id):
+    # объект уже скрыт в текущей транзакции, очищаем только после коммита
+    if settings.MODERATION_PURGE_ASYNC:
+        transaction.on_commit(lambda: get_executor().submit(run_purge_in_background, job_id))
+    else:
+        transaction.on_commit(lambda: run_purge(job_id))
@@ -0,0 +1,125 @@
+import contextlib
+import logging
+import os
+import re
+import sys
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+
+# Поиск N+1: все SQL запроса группируются по "форме" (SQL без значений),
+# формы, выполненные больше N_PLUS_ONE_THRESHOLD раз, попадают в лог вместе
+# с местом вызова - строкой шаблона или первой строкой кода проекта в стеке.
+# Включается N_PLUS_ONE_DETECTION, в тестах удобнее guard():
+#
+#     with nplusone.guard(threshold=3):
+#         client.get('/')
+
+logger = logging.getLogger(__name__)
+
+_string_re = re.compile(r"'(?:[^']|'')*'")
+_number_re = re.compile(r'\b\d+(?:\.\d+)?\b')
+_in_list_re = re.compile(r'\bIN \((?:\s*(?:%s|\?)\s*,?)+\)', re.I)
+_spaces_re = re.compile(r'\s+')
+
+_own_file = os.path.abspath(__file__)
+
+
+class RepeatedQueriesError(Exception):
+    pass
+
+
+def normalize_sql(sql):
+    sql = _string_re.sub('?', sql)
+    sql = _number_re.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = _in_list_re.sub('IN (...)', sql)
+    return _spaces_re.sub(' ', sql).strip()
+
+
+def find_origin():
+    # самый вложенный узел шаблона, иначе первая строка проекта не из site-packages
+    project_dir = str(settings.BASE_DIR)
+    code_origin = None
+    frame = sys._getframe(2)
+    while frame is not None:
+        if frame.f_code.co_name == 'render_annotated':
+            node = frame.f_locals.get('self')
+            token = getattr(node, 'token', None)
+            origin = getattr(node, 'origin', None)
+            if token is not None and origin is not None:
+                return f'{origin.template_name}:{token.lineno}'
+        filename = frame.f_code.co_filename
+        if (code_origin is None and filename.startswith(project_dir) and filename != _own_file
+                and 'site-packages' not in filename):
+            code_origin = f'{os.path.relpath(filename, project_dir)}:{frame.f_lineno} ({frame.f_code.co_name})'
+        frame = frame.f_back
+    return code_origin or '?'
+
+
+class QueryCollector:
+    def __init__(self):
+        self.total = 0
+        self.shapes = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        self.total += 1
+        entry = self.shapes.setdefault(normalize_sql(sql), {'count': 0, 'origins': Counter()})
+        entry['count'] += 1
+        entry['origins'][find_origin()] += 1
+        return execute(sql, params, many, context)
+
+    def repeated(self, threshold):
+        found = [(shape, entry) for shape, entry in self.shapes.items() if entry['count'] > threshold]
+        return sorted(found, key=lambda item: -item[1]['count'])
+
+    def report(self, threshold):
+        lines = []
+        for shape, entry in self.repeated(threshold):
+            lines.append(f"{entry['count']}x {shape}")
+            for origin, count in entry['origins'].most_common(3):
+                lines.append(f"    {count}x {origin}")
+        return '\n'.join(lines)
+
+    def check(self, threshold):
+        if self.repeated(threshold):
+            raise RepeatedQueriesError(f'Repeated queries (threshold {threshold}):\n{self.report(threshold)}')
+
+
+@contextlib.contextmanager
+def capture(collector):
+    with contextlib.ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(collector))
+        yield collector
+
+
+@contextlib.contextmanager
+def guard(threshold=None):
+    threshold = settings.N_PLUS_ONE_THRESHOLD if threshold is None else threshold
+    with capture(QueryCollector()) as collector:
+        yield collector
+    collector.check(threshold)
+
+
+class NPlusOneMiddleware:
+    # ставить первым в MIDDLEWARE, чтобы видеть запросы сессий и пользователя
+    def __init__(self, get_response):
+        if not settings.N_PLUS_ONE_DETECTION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        threshold = settings.N_PLUS_ONE_THRESHOLD
+        with capture(QueryCollector()) as collector:
+            response = self.get_response(request)
+
+        response.headers['X-Query-Count'] = f'{collector.total}/{len(collector.shapes)}'
+        if collector.repeated(threshold):
+            if settings.N_PLUS_ONE_RAISE:
+                collector.check(threshold)
+            logger.warning('Repeated queries in %s %s:\n%s', request.method, request.path, collector.report(threshold))
+        return response
@@ -0,0 +1,91 @@
+import functools
+import gzip
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import hashers, password_validation
+
+
+# Хеширование паролей в ограниченном пуле потоков.
+# PBKDF2 и scrypt в hashlib отпускают GIL, поэтому пул действительно
+# считает параллельно, а PASSWORD_HASHING_WORKERS ограничивает, сколько ядер
+# (и памяти: scrypt берет ~16 Мб на хеш) может уйти на вход при всплеске логинов.
+# Остальные запросы в это время не ждут освобождения процессора.
+# Проверка пароля тоже идет через encode(), так что пул покрывает и вход, и регистрацию.
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASHING_WORKERS, thread_name_prefix='passwords')
+        return _executor
+
+
+def reset_executor():
+    # после fork (uWSGI, gunicorn --preload) потоков родительского пула в дочернем
+    # процессе нет: задачи в унаследованный пул никогда бы не выполнились
+    global _executor, _executor_lock
+    _executor = None
+    _executor_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=reset_executor)
+
+
+def run_in_pool(func, *args, **kwargs):
+    if threading.current_thread().name.startswith('passwords'):
+        return func(*args, **kwargs) # уже в пуле, второй раз в очередь не встаем
+    return get_executor().submit(func, *args, **kwargs).result()
+
+
+class PooledScryptPasswordHasher(hashers.ScryptPasswordHasher):
+    # algorithm тот же, поэтому хеши совместимы со стандартным хешером Django
+    def encode(self, password, salt, *args, **kwargs):
+        return run_in_pool(super().encode, password, salt, *args, **kwargs)
+
+
+class PooledPBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    def encode(self, password, salt, *args, **kwargs):
+        return run_in_pool(super().encode, password, salt, *args, **kwargs)
+
+
+DEFAULT_PASSWORD_LIST_PATH = Path(password_validation.__file__).resolve().parent / 'common-passwords.txt.gz'
+
+
+def common_passwords(path=None):
+    # путь приводим к одному виду до кеша: None, str и Path - один и тот же ключ
+    return load_passwords(Path(path or DEFAULT_PASSWORD_LIST_PATH).resolve())
+
+
+@functools.cache
+def load_passwords(path):
+    # список читается один раз на процесс и дальше общий для всех валидаторов
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            return frozenset(line.strip() for line in f)
+    except OSError:
+        with open(path, encoding='utf-8') as f:
+            return frozenset(line.strip() for line in f)
+
+
+class CommonPasswordValidator(password_validation.CommonPasswordValidator):
+    def __init__(self, password_list_path=None):
+        # родительский __init__ читает файл в каждый экземпляр, здесь - общий frozenset
+        self.password_list_path = password_list_path
+
+    @property
+    def passwords(self):
+        return common_passwords(self.password_list_path)
+
+
+def preload():
+    # вызывается из AppConfig.ready(): список читается сразу, без пула потоков,
+    # чтобы при pre-fork сервере воркеры унаследовали уже готовый frozenset
+    common_passwords()
@@ -0,0 +1,146 @@
+import functools
+import itertools
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+
+# Лимиты записи: скользящее окно из двух соседних счетчиков фиксированных окон.
+# Счетчики живут в кеше Django (add + incr атомарны), если кеш недоступен -
+# в памяти процесса.
+
+
+def parse_rate(rate):
+    # '30/m' -> (30, 60)
+    count, period = rate.split('/')
+    seconds = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[period[-1]]
+    multiplier = int(period[:-1]) if len(period) > 1 else 1
+    return int(count), seconds * multiplier
+
+
+def get_identities(request):
+    identities = ['ip:' + request.META.get('REMOTE_ADDR', '')]
+    if request.user.is_authenticated:
+        identities.append(f'user:{request.user.pk}')
+    return identities
+
+
+class LocalCounters:
+    # ключ - клиент и номер окна, поэтому без очистки словарь рос бы всю жизнь процесса
+    MAX_KEYS = 100000
+    SWEEP_INTERVAL = 60 # секунд между очистками просроченных окон
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._next_sweep = 0
+
+    def __len__(self):
+        return len(self._counters)
+
+    def get_many(self, keys):
+        with self._lock:
+            return {k: self._counters[k][0] for k in keys if k in self._counters and self._counters[k][1] > time.time()}
+
+    def evict(self, now):
+        self._counters = {k: v for k, v in self._counters.items() if v[1] > now}
+        # все окна еще живы (запросы с множества адресов) - выбрасываем самые старые
+        overflow = len(self._counters) - self.MAX_KEYS + 1
+        for key in list(itertools.islice(self._counters, max(overflow, 0))):
+            del self._counters[key]
+        self._next_sweep = now + self.SWEEP_INTERVAL
+
+    def incr(self, key, timeout):
+        now = time.time()
+        with self._lock:
+            if now >= self._next_sweep or len(self._counters) >= self.MAX_KEYS:
+                self.evict(now)
+            count, expires = self._counters.get(key, (0, now + timeout))
+            if expires <= now:
+                count, expires = 0, now + timeout
+            self._counters[key] = (count + 1, expires)
+            return count + 1
+
+
+local_counters = LocalCounters()
+
+
+class SlidingWindowLimiter:
+    def __init__(self, name, rate):
+        self.name = name
+        self.limit, self.period = parse_rate(rate)
+
+    def get_keys(self, identity, now):
+        window = int(now // self.period)
+        prefix = f'rl:{self.name}:{identity}:'
+        return prefix + str(window), prefix + str(window - 1)
+
+    def hit(self, identity, store):
+        # возвращает 0, если запрос пропускаем, иначе через сколько секунд повторить
+        now = time.time()
+        current_key, previous_key = self.get_keys(identity, now)
+        timeout = self.period * 2
+
+        if isinstance(store, LocalCounters):
+            current = store.incr(current_key, timeout)
+        else:
+            store.add(current_key, 0, timeout)
+            current = store.incr(current_key)
+        previous = store.get_many([previous_key]).get(previous_key, 0)
+
+        elapsed = (now % self.period) / self.period
+        estimated = previous * (1 - elapsed) + current
+        if estimated <= self.limit:
+            return 0
+        return max(1, math.ceil(self.period * (1 - elapsed)))
+
+
+def check_rate(request, name):
+    rate = settings.RATE_LIMITS.get(name)
+    if not rate:
+        return 0
+
+    limiter = SlidingWindowLimiter(name, rate)
+    retry_after = 0
+    for identity in get_identities(request):
+        try:
+            wait = limiter.hit(identity, caches[settings.RATE_LIMIT_CACHE_ALIAS])
+        except Exception:
+            wait = limiter.hit(identity, local_counters)
+        retry_after = max(retry_after, wait)
+    return retry_after
+
+
+def too_many_requests(retry_after):
+    response = HttpResponse('Too many requests, try again later.', status=429)
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+def ratelimit(name, methods=('POST', )):
+    def decorator(view_func):
+        @functools.wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method in methods:
+                retry_after = check_rate(request, name)
+                if retry_after:
+                    return too_many_requests(retry_after)
+            return view_func(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class RateLimitMixin:
+    ratelimit_name = None
+    ratelimit_methods = ('POST', )
+
+    def dispatch(self, request, *args, **kwargs):
+        if self.ratelimit_name and request.method in self.ratelimit_methods:
+            retry_after = check_rate(request, self.ratelimit_name)
+            if retry_after:
+                return too_many_requests(retry_after)
+        return super().dispatch(request, *args, **kwargs)
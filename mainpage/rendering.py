@@ -0,0 +1,121 @@
+import re
+
+from django.utils.html import escape
+
+try:
+    from pygments import highlight
+    from pygments.formatters import HtmlFormatter
+    from pygments.lexers import get_lexer_by_name
+    from pygments.util import ClassNotFound
+except ImportError: # pygments не обязателен, без него код выводится без подсветки
+    highlight = None
+
+
+# Тексты вопросов и ответов пишутся в упрощенном Markdown:
+# абзацы, списки "- ", **жирный**, *курсив*, `код`, [ссылка](https://...)
+# и блоки кода ```lang ... ```. HTML рендерится один раз при сохранении
+# (Question.detailed_html, Answer.answer_html), поэтому все пользовательские
+# данные сначала экранируются, а теги добавляет только этот модуль.
+
+EXCERPT_LENGTH = 200
+
+_fence_re = re.compile(r'^```[ \t]*([\w+-]*)[ \t]*\n(.*?)^```[ \t]*$', re.M | re.S)
+_code_re = re.compile(r'`([^`\n]+)`')
+_bold_re = re.compile(r'\*\*(?=\S)(.+?)(?<=\S)\*\*')
+_italic_re = re.compile(r'(?<![\w*])\*(?=\S)(.+?)(?<=\S)\*(?![\w*])')
+_link_re = re.compile(r'\[([^\]\n]+)\]\(((?:https?://|/)[^)\s]*)\)')
+_list_item_re = re.compile(r'^[-*] +')
+_spaces_re = re.compile(r'\s+')
+
+
+def render_code(code, language):
+    if highlight is not None and language:
+        try:
+            lexer = get_lexer_by_name(language)
+        except ClassNotFound:
+            pass
+        else:
+            html = highlight(code, lexer, HtmlFormatter(nowrap=True))
+            return f'<pre class="highlight"><code class="language-{language}">{html}</code></pre>'
+    language_class = f' class="language-{language}"' if language else ''
+    return f'<pre><code{language_class}>{escape(code)}</code></pre>'
+
+
+def render_inline(text):
+    # код выносим в заглушки, чтобы внутри него не срабатывала разметка
+    codes = []
+
+    def stash(match):
+        codes.append(f'<code>{match.group(1)}</code>')
+        return f'\x00{len(codes) - 1}\x00'
+
+    text = _code_re.sub(stash, escape(text))
+    text = _link_re.sub(r'<a href="\2" rel="nofollow noopener">\1</a>', text)
+    text = _bold_re.sub(r'<strong>\1</strong>', text)
+    text = _italic_re.sub(r'<em>\1</em>', text)
+    text = text.replace('\n', '<br>')
+    return re.sub(r'\x00(\d+)\x00', lambda m: codes[int(m.group(1))], text)
+
+
+def render_blocks(text):
+    html = []
+    for block in re.split(r'\n\s*\n', text.strip()):
+        lines = block.strip().split('\n')
+        if all(_list_item_re.match(line) for line in lines):
+            items = ''.join(f'<li>{render_inline(_list_item_re.sub("", line))}</li>' for line in lines)
+            html.append(f'<ul>{items}</ul>')
+        elif block.strip():
+            html.append(f'<p>{render_inline(block.strip())}</p>')
+    return html
+
+
+def render_markdown(text):
+    text = text.replace('\r\n', '\n')
+    html = []
+    position = 0
+    for match in _fence_re.finditer(text):
+        html.extend(render_blocks(text[position:match.start()]))
+        html.append(render_code(match.group(2), match.group(1).lower()))
+        position = match.end()
+    html.extend(render_blocks(text[position:]))
+    return ''.join(html)
+
+
+def make_excerpt(text, length=EXCERPT_LENGTH):
+    # короткий текст для карточки в ленте, без разметки
+    text = _fence_re.sub(lambda m: m.group(2), text.replace('\r\n', '\n'))
+    text = _link_re.sub(r'\1', text)
+    text = _bold_re.sub(r'\1', text)
+    text = _italic_re.sub(r'\1', text)
+    text = _code_re.sub(r'\1', text)
+    text = _spaces_re.sub(' ', text).strip()
+    if len(text) <= length:
+        return text
+    cut = text[:length].rsplit(' ', 1)[0] or text[:length]
+    return cut.rstrip(' .,;:') + '…'
+
+
+def render_question(detailed):
+    return {'detailed_html': render_markdown(detailed), 'excerpt': make_excerpt(detailed)}
+
+
+def render_answer(answer_text):
+    return {'answer_html': render_markdown(answer_text)}
+
+
+def rerender_all(queryset, source_field, render, batch_size=1000):
+    # для существующих строк: миграция и команда render_bodies
+    model = queryset.model
+    batch = []
+    fields = None
+    updated = 0
+    for pk, source in queryset.order_by('pk').values_list('pk', source_field).iterator(chunk_size=batch_size):
+        rendered = render(source)
+        fields = list(rendered)
+        batch.append(model(pk=pk, **rendered))
+        if len(batch) >= batch_size:
+            updated += model._base_manager.bulk_update(batch, fields)
+            batch = []
+    if batch:
+        updated += model._base_manager.bulk_update(batch, fields)
+    return updated
@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+
+
+class SessionStore(CachedDBStore):
+    """Сессии: чтение из кеша, запись сквозная - в БД и сразу в кеш.
+
+    Каждое изменение сессии сначала коммитится в django_session, поэтому
+    падение или очистка кеша ничего не теряют, а выход и смена пароля
+    действуют сразу. Экономия - на чтении: SELECT из django_session идет
+    только при промахе кеша. Записей столько же, сколько у 'db', но Django
+    пишет сессию только когда она изменилась (SESSION_SAVE_EVERY_REQUEST=False).
+
+    Кеш должен быть общим для всех воркеров (Redis/Memcached): в LocMem
+    у каждого процесса своя копия, и после записи в одном воркере другие
+    продолжат читать старую сессию.
+    """
+    cache_key_prefix = 'mainpage.sessions.'
+
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        if isinstance(self._cache, LocMemCache):
+            raise ImproperlyConfigured(
+                "SESSION_BACKEND = 'cache' требует общего кеша в CACHES[%r], "
+                "LocMemCache у каждого процесса свой" % settings.SESSION_CACHE_ALIAS
+            )
@@ -0,0 +1,123 @@
+import hashlib
+import random
+import re
+import zlib
+from array import array
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from mainpage.models import Question, QuestionSignature, QuestionLshBucket
+
+
+# Поиск похожих вопросов при создании нового.
+# Текст (заголовок + начало вопроса) режется на символьные шинглы, по ним
+# считается MinHash-подпись из NUM_PERM чисел. Подпись делится на BANDS полос,
+# хеш каждой полосы - ключ LSH-корзины: вопросы с общей корзиной - кандидаты,
+# для них похожесть оцениваем по долям совпавших чисел подписи.
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 5
+# длинные вопросы сравниваем по началу, подпись от этого почти не меняется
+MAX_TEXT_LENGTH = 1500
+MAX_CANDIDATES = 200
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240611) # подписи хранятся в БД, поэтому перестановки фиксированы
+PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+_word_re = re.compile(r'\w+')
+
+
+def shingles(text):
+    words = ' '.join(_word_re.findall(text.lower()))[:MAX_TEXT_LENGTH]
+    if len(words) <= SHINGLE_SIZE:
+        return {words} if words else set()
+    return {words[i:i + SHINGLE_SIZE] for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def signature(title, detailed=''):
+    hashes = [zlib.crc32(s.encode()) for s in shingles(f'{title} {detailed}')]
+    if not hashes:
+        return None
+    return array('Q', (min((a * h + b) % _PRIME for h in hashes) for a, b in PERMUTATIONS))
+
+
+def band_keys(sig):
+    keys = []
+    for band in range(BANDS):
+        rows = sig[band * ROWS:(band + 1) * ROWS]
+        digest = hashlib.blake2b(band.to_bytes(1, 'little') + rows.tobytes(), digest_size=8).digest()
+        keys.append(int.from_bytes(digest, 'little', signed=True)) # BigIntegerField знаковый
+    return keys
+
+
+def similarity(sig_a, sig_b):
+    return sum(a == b for a, b in zip(sig_a, sig_b)) / NUM_PERM
+
+
+def load_signature(raw):
+    sig = array('Q')
+    sig.frombytes(bytes(raw))
+    return sig
+
+
+def index_rows(question_id, sig):
+    # строки для QuestionSignature и QuestionLshBucket одного вопроса
+    return (
+        QuestionSignature(question_id=question_id, signature=sig.tobytes()),
+        [QuestionLshBucket(key=key, question_id=question_id) for key in band_keys(sig)],
+    )
+
+
+def signatures_for_batch(rows):
+    # для пула процессов в build_similarity_index: без обращений к БД
+    result = []
+    for question_id, title, detailed in rows:
+        sig = signature(title, detailed)
+        if sig is not None:
+            result.append((question_id, sig))
+    return result
+
+
+def index_question(question_id, title, detailed):
+    sig = signature(title, detailed)
+    with transaction.atomic():
+        QuestionSignature.objects.filter(question_id=question_id).delete()
+        QuestionLshBucket.objects.filter(question_id=question_id).delete()
+        if sig is None:
+            return
+        sig_row, bucket_rows = index_rows(question_id, sig)
+        sig_row.save(force_insert=True)
+        QuestionLshBucket.objects.bulk_create(bucket_rows)
+
+
+def find_similar(title, detailed='', limit=5, exclude_id=None):
+    # [(похожесть, вопрос)] от самых похожих, только активные вопросы
+    sig = signature(title, detailed)
+    if sig is None:
+        return []
+
+    candidates = (
+        QuestionLshBucket.objects.filter(key__in=band_keys(sig))
+        .values_list('question_id', flat=True).distinct()[:MAX_CANDIDATES]
+    )
+    scored = []
+    for question_id, raw in QuestionSignature.objects.filter(question_id__in=list(candidates)).values_list('question_id', 'signature'):
+        score = similarity(sig, load_signature(raw))
+        if score >= settings.SIMILAR_QUESTIONS_THRESHOLD and question_id != exclude_id:
+            scored.append((score, question_id))
+    scored.sort(reverse=True)
+
+    questions = Question.objects.only('id', 'slug', 'title').in_bulk([question_id for _, question_id in scored])
+    return [(score, questions[question_id]) for score, question_id in scored if question_id in questions][:limit]
+
+
+@receiver(post_save, sender=Question)
+def reindex_question(sender, instance, created, update_fields=None, **kwargs):
+    if created or update_fields is None or {'title', 'detailed'} & set(update_fields):
+        index_question(instance.pk, instance.title, instance.detailed)
@@ -0,0 +1,56 @@
+import functools
+import uuid
+
+from django.utils.text import slugify
+
+
+# Таблица транслитерации кириллицы в латиницу, совпадающая с
+# translit(text, 'ru', reversed=True) из пакета transliterate.
+# Все правила пакета посимвольные, поэтому хватает одного str.translate.
+# Совпадение проверяет `manage.py bench_slugs --check`.
+RU_TO_LATIN = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e', 'ж': 'zh',
+    'з': 'z', 'и': 'i', 'й': 'j', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o',
+    'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 'ф': 'f', 'х': 'h', 'ц': 'ts',
+    'ч': 'ch', 'ш': 'sh', 'щ': 'sch', 'ъ': "'", 'ы': 'y', 'ь': "'", 'э': 'e', 'ю': 'ju',
+    'я': 'ja',
+    'А': 'A', 'Б': 'B', 'В': 'V', 'Г': 'G', 'Д': 'D', 'Е': 'E', 'Ё': 'E', 'Ж': 'Zh',
+    'З': 'Z', 'И': 'I', 'Й': 'J', 'К': 'K', 'Л': 'L', 'М': 'M', 'Н': 'N', 'О': 'O',
+    'П': 'P', 'Р': 'R', 'С': 'S', 'Т': 'T', 'У': 'U', 'Ф': 'F', 'Х': 'H', 'Ц': 'Ts',
+    'Ч': 'Ch', 'Ш': 'Sh', 'Щ': 'Sch', 'Ъ': "'", 'Ы': 'Y', 'Ь': "'", 'Э': 'E', 'Ю': 'Ju',
+    'Я': 'Ja',
+}
+TRANSLATION_TABLE = str.maketrans(RU_TO_LATIN)
+
+BATCH_SEPARATOR = '\n'
+
+
+def transliterate(text):
+    return text.translate(TRANSLATION_TABLE)
+
+
+@functools.lru_cache(maxsize=8192)
+def make_slug(text):
+    return slugify(text.translate(TRANSLATION_TABLE))
+
+
+def make_slugs(texts):
+    # Для массового импорта: одна транслитерация на всю пачку вместо вызова на строку
+    texts = list(texts)
+    if any(BATCH_SEPARATOR in text for text in texts):
+        return [make_slug(text) for text in texts]
+
+    joined = BATCH_SEPARATOR.join(texts).translate(TRANSLATION_TABLE)
+    return [slugify(part) for part in joined.split(BATCH_SEPARATOR)] if texts else []
+
+
+def make_unique_slugs(slugs, taken):
+    # Та же схема суффиксов, что и в save() моделей, но без запроса в БД на каждую строку.
+    # taken - множество уже занятых slug-ов, пополняется на месте
+    unique = []
+    for slug in slugs:
+        while slug in taken:
+            slug = f"{slug}+{uuid.uuid4().hex[:4]}"
+        taken.add(slug)
+        unique.append(slug)
+    return unique
@@ -0,0 +1,50 @@
+// Подсказки для полей с data-suggest="tag|question" через /api/suggest/.
+// Варианты кладем в <datalist>; в поле тегов дополняется только последний тег.
+(function () {
+    var DELAY = 120;
+
+    function attach(input, index) {
+        var kind = input.dataset.suggest;
+        var list = document.createElement('datalist');
+        list.id = 'suggest-' + index;
+        input.setAttribute('list', list.id);
+        input.after(list);
+
+        var timer = null;
+        var lastQuery = null;
+
+        input.addEventListener('input', function () {
+            clearTimeout(timer);
+            timer = setTimeout(function () {
+                var value = input.value;
+                var head = '';
+                if (kind === 'tag') {
+                    var cut = Math.max(value.lastIndexOf(','), value.lastIndexOf(';')) + 1;
+                    head = value.slice(0, cut);
+                    value = value.slice(cut);
+                    if (head) {
+                        head = head.trimEnd() + ' ';
+                    }
+                }
+                value = value.trim();
+                if (!value || value === lastQuery) {
+                    return;
+                }
+                lastQuery = value;
+
+                fetch('/api/suggest/?kind=' + kind + '&q=' + encodeURIComponent(value))
+                    .then(function (response) { return response.json(); })
+                    .then(function (data) {
+                        list.replaceChildren.apply(list, data[kind + 's'].map(function (item) {
+                            var option = document.createElement('option');
+                            option.value = head + item.title;
+                            return option;
+                        }));
+                    })
+                    .catch(function () {});
+            }, DELAY);
+        });
+    }
+
+    document.querySelectorAll('input[data-suggest]').forEach(attach);
+})();
@@ -0,0 +1,161 @@
+import bisect
+import re
+import threading
+
+from django.conf import settings
+from django.db.models import Count
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from mainpage.models import Question, Tag
+
+
+# Подсказки для строки поиска и поля тегов без запросов в БД.
+# Индекс - отсортированный список ключей (нормализованная строка, вид, id),
+# поиск по префиксу - bisect. Для вопросов ключом служит каждый "хвост" заголовка,
+# начиная с очередного слова, чтобы "docker" находил "How to run docker".
+# Строится при первом обращении, дальше дополняется по сигналам.
+# Один экземпляр на процесс, общий для всех потоков.
+
+TAG = 'tag'
+QUESTION = 'question'
+
+# сколько ключей просматриваем после найденной позиции, прежде чем ранжировать
+SCAN_LIMIT = 1000
+
+_spaces_re = re.compile(r'\s+')
+
+
+def normalize(text):
+    return _spaces_re.sub(' ', text).strip().lower()
+
+
+def title_keys(title):
+    words = normalize(title).split(' ')
+    return {' '.join(words[i:]) for i in range(len(words)) if words[i]}
+
+
+class PrefixIndex:
+    def __init__(self, questions_limit):
+        self.questions_limit = questions_limit
+        self._keys = []
+        self._items = {} # (вид, id) -> [заголовок, slug, популярность, ключи]
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            self._load()
+            self._loaded = True
+
+    def _load(self):
+        tags = Tag.objects.annotate(popularity=Count('question')).values_list('id', 'title', 'slug', 'popularity')
+        questions = (
+            Question.objects.order_by('-answers_count', '-id')
+            .values_list('id', 'title', 'slug', 'answers_count')[:self.questions_limit]
+        )
+
+        keys = []
+        for kind, rows, make_keys in ((TAG, tags, lambda title: {normalize(title)}), (QUESTION, questions, title_keys)):
+            for pk, title, slug, popularity in rows:
+                item_keys = make_keys(title)
+                self._items[kind, pk] = [title, slug, popularity, item_keys]
+                keys.extend((key, kind, pk) for key in item_keys)
+        keys.sort()
+        self._keys = keys
+
+    def add(self, kind, pk, title, slug, popularity=0):
+        if not self._loaded: # при загрузке объект все равно попадет в индекс
+            return
+        item_keys = title_keys(title) if kind == QUESTION else {normalize(title)}
+        with self._lock:
+            self._remove((kind, pk))
+            self._items[kind, pk] = [title, slug, popularity, item_keys]
+            for key in item_keys:
+                bisect.insort(self._keys, (key, kind, pk))
+
+    def remove(self, kind, pk):
+        if not self._loaded:
+            return
+        with self._lock:
+            self._remove((kind, pk))
+
+    def bump(self, kind, pk, delta):
+        if not self._loaded:
+            return
+        with self._lock:
+            item = self._items.get((kind, pk))
+            if item is not None:
+                item[2] += delta
+
+    def _remove(self, item_id):
+        item = self._items.pop(item_id, None)
+        if item is None:
+            return
+        for key in item[3]:
+            i = bisect.bisect_left(self._keys, (key, *item_id))
+            if i < len(self._keys) and self._keys[i] == (key, *item_id):
+                del self._keys[i]
+
+    def suggest(self, prefix, kinds=(TAG, QUESTION), limit=10):
+        prefix = normalize(prefix)
+        if not prefix:
+            return {kind: [] for kind in kinds}
+
+        self.ensure_loaded()
+        found = {}
+        with self._lock:
+            i = bisect.bisect_left(self._keys, (prefix, ))
+            for key, kind, pk in self._keys[i:i + SCAN_LIMIT]:
+                if not key.startswith(prefix):
+                    break
+                if kind in kinds and (kind, pk) not in found:
+                    title, slug, popularity, _ = self._items[kind, pk]
+                    found[kind, pk] = (popularity, title, slug)
+
+        result = {kind: [] for kind in kinds}
+        for (kind, pk), (popularity, title, slug) in sorted(found.items(), key=lambda item: (-item[1][0], item[1][1])):
+            if len(result[kind]) < limit:
+                result[kind].append({'id': pk, 'title': title, 'slug': slug})
+        return result
+
+    def __len__(self):
+        return len(self._keys)
+
+
+index = PrefixIndex(settings.SUGGEST_QUESTIONS_LIMIT)
+
+
+@receiver(post_save, sender=Tag)
+def index_tag(sender, instance, created, **kwargs):
+    # теги только создаются, популярность растет через m2m_changed
+    if created:
+        index.add(TAG, instance.pk, instance.title, instance.slug)
+
+
+@receiver(post_save, sender=Question)
+def index_question(sender, instance, created, **kwargs):
+    if not instance.is_active:
+        index.remove(QUESTION, instance.pk)
+    elif created:
+        index.add(QUESTION, instance.pk, instance.title, instance.slug, instance.answers_count)
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Question)
+def unindex(sender, instance, **kwargs):
+    index.remove(TAG if sender is Tag else QUESTION, instance.pk)
+
+
+@receiver(m2m_changed, sender=Question.tags.through)
+def count_tag_usage(sender, instance, action, reverse, pk_set, **kwargs):
+    # question.tags.set(...) при создании вопроса
+    if reverse or not pk_set or action not in ('post_add', 'post_remove'):
+        return
+    delta = 1 if action == 'post_add' else -1
+    for tag_id in pk_set:
+        index.bump(TAG, tag_id, delta)
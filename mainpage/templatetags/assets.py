@@ -0,0 +1,19 @@
+from django import template
+from django.conf import settings
+from django.templatetags.static import static
+from django.utils.html import format_html_join
+
+from mainpage.assets import BUNDLES, bundle_name
+
+
+register = template.Library()
+
+
+@register.simple_tag
+def css_bundle(name):
+    # В DEBUG подключаем исходники по отдельности, чтобы правки CSS были видны сразу
+    if settings.ASSET_BUNDLES:
+        files = [bundle_name(name)]
+    else:
+        files = BUNDLES[name]
+    return format_html_join('\n', '<link rel="stylesheet" href="{}">', ((static(f), ) for f in files))
@@ -0,0 +1,48 @@
+import re
+
+from django.conf import settings
+from django.template.loaders import app_directories
+
+
+# Минификация шаблонов при загрузке, а не каждого ответа: исходник шаблона
+# ужимается один раз перед компиляцией, а cached.Loader хранит уже
+# скомпилированный результат. Содержимое переменных ({{ question.detailed_html }})
+# не трогается, поэтому код в <pre> из markdown остается как есть.
+
+# Теги Django всегда однострочные, поэтому построчная обработка их не ломает
+PRESERVE_RE = re.compile(r'<(pre|textarea)\b.*?</\1\s*>', re.S | re.I)
+
+
+def strip_lines(text):
+    # отступы и пустые строки убираем, перевод строки между строками оставляем:
+    # он значим как пробел между inline-элементами и для ASI в <script>
+    stripped = '\n'.join(line.strip() for line in text.splitlines() if line.strip())
+    if not stripped:
+        return '\n' if text else ''
+    lead = '\n' if text[0].isspace() else ''
+    trail = '\n' if text[-1].isspace() else ''
+    return lead + stripped + trail
+
+
+def minify_template(source):
+    parts = []
+    position = 0
+    for match in PRESERVE_RE.finditer(source):
+        parts.append(strip_lines(source[position:match.start()]))
+        parts.append(match.group(0))
+        position = match.end()
+    parts.append(strip_lines(source[position:]))
+    return ''.join(parts)
+
+
+class MinifyingLoader(app_directories.Loader):
+    """app_directories.Loader, который ужимает HTML-шаблоны из TEMPLATE_MINIFY_PREFIXES.
+
+    Ставится внутрь django.template.loaders.cached.Loader.
+    """
+    def get_contents(self, origin):
+        contents = super().get_contents(origin)
+        if settings.TEMPLATE_MINIFY and origin.template_name.endswith('.html') \
+                and origin.template_name.startswith(tuple(settings.TEMPLATE_MINIFY_PREFIXES)):
+            return minify_template(contents)
+        return contents
@@ -1,3 +1,461 @@
-from django.test import TestCase
+import io
+import os
+import signal
+import tempfile
+import unittest
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.sessions.models import Session
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils.text import slugify
+from transliterate import translit
+
+from mainpage import lookups, media, moderation, nplusone, passwords, ratelimit, timeline
+from mainpage.assets import StaticFilesApplication
+from mainpage.sessions import SessionStore
+from mainpage.management.commands.bench_slugs import EXTRA_CORPUS
+from mainpage.slugs import make_slug, make_slugs, make_unique_slugs
+from mainpage.models import (
+    User, Question, Answer, Tag, Vote, ArchivedQuestion, ArchivedAnswer,
+    FollowedAuthor, QuestionSignature, TimelineEntry,
+)
+
+
+class ForumTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', 'author@example.com', 'Secret-pass-123')
+        cls.tag = Tag.objects.create(title='python')
+        cls.question = Question.objects.create(title='How to test pages', detailed='Some **text**', author=cls.author)
+        cls.question.tags.add(cls.tag)
+        cls.answer = Answer.objects.create(question=cls.question, answer_text='Use the test client', author=cls.author)
+
+
+@override_settings(DEBUG=False)
+class PagesWithoutCollectstaticTests(ForumTestCase):
+    # без collectstatic manifest пуст, страницы должны рендериться с обычными именами статики
+    def test_pages_render(self):
+        for path in ('/', f'/question/id/{self.question.id}', '/login/'):
+            with self.subTest(path=path):
+                response = self.client.get(path)
+                self.assertEqual(response.status_code, 200)
+                self.assertContains(response, '/static/css/base.css')
+
+
+class ArchiveVisibilityTests(ForumTestCase):
+    def archive(self):
+        call_command('archive_questions', older_than_days=-1, stdout=io.StringIO())
+
+    def test_inactive_question_stays_hidden_after_archiving(self):
+        Question.all_objects.filter(pk=self.question.pk).update(is_active=False)
+        self.archive()
+        self.assertEqual(self.client.get(f'/question/id/{self.question.id}').status_code, 404)
+        self.assertEqual(self.client.get(f'/question/{self.question.slug}').status_code, 404)
+
+    def test_archived_question_hides_inactive_answers(self):
+        hidden = Answer.objects.create(question=self.question, answer_text='Hidden spam', author=self.author)
+        Answer.all_objects.filter(pk=hidden.pk).update(is_active=False)
+        self.archive()
+        response = self.client.get(f'/question/id/{self.question.id}')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Use the test client')
+        self.assertNotContains(response, 'Hidden spam')
+
+
+class ModerationArchiveTests(ForumTestCase):
+    def archive(self):
+        call_command('archive_questions', older_than_days=-1, stdout=io.StringIO())
+
+    def test_pending_purge_is_not_archived(self):
+        job = moderation.soft_delete('question', [self.question.pk], schedule=False)[0]
+        self.archive()
+        self.assertFalse(ArchivedQuestion.objects.filter(pk=self.question.pk).exists())
+        self.assertEqual(self.client.get(f'/question/id/{self.question.id}').status_code, 404)
+
+        job = moderation.run_purge(job.pk)
+        self.assertEqual(job.status, 'done')
+        self.assertFalse(Question.all_objects.filter(pk=self.question.pk).exists())
+
+    def test_purge_removes_archived_copy(self):
+        self.archive()
+        job = moderation.soft_delete('question', [self.question.pk], schedule=False)[0]
+        self.assertEqual(self.client.get(f'/question/id/{self.question.id}').status_code, 404)
+
+        job = moderation.run_purge(job.pk)
+        self.assertEqual(job.status, 'done')
+        self.assertFalse(ArchivedQuestion.objects.filter(pk=self.question.pk).exists())
+        self.assertFalse(ArchivedAnswer.objects.filter(pk=self.answer.pk).exists())
+
+    def test_soft_deleted_user_hides_archived_questions(self):
+        self.archive()
+        moderation.soft_delete('user', [self.author.pk], schedule=False)
+        self.assertEqual(self.client.get(f'/question/id/{self.question.id}').status_code, 404)
+
+
+class AnswerStatsTests(ForumTestCase):
+    def refresh(self):
+        self.question.refresh_from_db()
+        return self.question
+
+    def test_answer_create_and_delete(self):
+        self.assertEqual(self.refresh().answers_count, 1)
+        extra = Answer.objects.create(question=self.question, answer_text='Another way', author=self.author)
+        self.assertEqual(self.refresh().answers_count, 2)
+        extra.delete()
+        self.assertEqual(self.refresh().answers_count, 1)
+
+    def test_cascade_delete_of_answer_author(self):
+        # ответ удаляется коллектором вместе с автором, Answer.delete() не вызывается
+        other = User.objects.create_user('other', 'other@example.com', 'Secret-pass-123')
+        answer = Answer.objects.create(question=self.question, answer_text='Accepted', author=other, is_correct=True)
+        self.question.update_accepted_answer(answer)
+        self.assertEqual((self.refresh().answers_count, self.question.accepted_answer_id), (2, answer.id))
+        other.delete()
+        self.assertEqual((self.refresh().answers_count, self.question.accepted_answer_id), (1, None))
+
+    def test_filter_links_keep_search_and_author(self):
+        response = self.client.get('/', {'search': 'test', 'author': self.author.slug})
+        self.assertContains(response, f'?filter=unanswered&author={self.author.slug}&search=test')
+
+
+class SlugTests(SimpleTestCase):
+    corpus = EXTRA_CORPUS + [
+        'How to test pages',
+        'Мой первый вопрос',
+        'Почему не работает print() в цикле?',
+        'подъезд, объём, семья',
+        'C++ или Rust',
+        '',
+        'Строка\nс переводом строки',
+    ]
+
+    def reference(self, text):
+        return slugify(translit(text, 'ru', reversed=True))
+
+    def test_make_slug_matches_transliterate(self):
+        for text in self.corpus:
+            with self.subTest(text=text):
+                self.assertEqual(make_slug(text), self.reference(text))
+
+    def test_make_slugs_matches_transliterate(self):
+        self.assertEqual(make_slugs(self.corpus), [self.reference(text) for text in self.corpus])
+        # без перевода строки вся пачка транслитерируется одним вызовом
+        single_line = [text for text in self.corpus if '\n' not in text]
+        self.assertEqual(make_slugs(single_line), [self.reference(text) for text in single_line])
+        self.assertEqual(make_slugs([]), [])
+
+    def test_make_unique_slugs(self):
+        taken = {'python'}
+        slugs = make_unique_slugs(['python', 'django', 'django'], taken)
+        self.assertEqual(slugs[1], 'django')
+        self.assertTrue(slugs[0].startswith('python+') and slugs[2].startswith('django+'))
+        self.assertEqual(len(set(slugs)), 3)
+        self.assertTrue(taken.issuperset(slugs))
+
+
+class LookupCacheTests(ForumTestCase):
+    def setUp(self):
+        lookups.process_cache.clear()
+
+    def test_sidebar_caches_only_public_fields(self):
+        response = self.client.get('/')
+        self.assertContains(response, f'/?author={self.author.slug}')
+        members = lookups.process_cache.get(('user_all', None))
+        self.assertEqual(set(members[0]), {'id', 'username', 'slug', 'avatar'})
+
+    def test_old_slug_is_invalidated(self):
+        self.assertEqual(lookups.get_tag_id('python'), self.tag.id)
+        self.tag.slug = 'python3'
+        self.tag.save()
+        self.assertIsNone(lookups.get_tag_id('python'))
+        self.assertEqual(lookups.get_tag_id('python3'), self.tag.id)
+
+    def test_rows_by_id(self):
+        with self.assertNumQueries(1):
+            rows = lookups.get_rows(Tag, [self.tag.id, self.tag.id, 0], ('slug', ))
+        self.assertEqual(rows, {self.tag.id: {'id': self.tag.id, 'slug': 'python'}, 0: None})
+        with self.assertNumQueries(0):
+            lookups.get_rows(Tag, [self.tag.id, 0], ('slug', ))
+
+        self.tag.slug = 'python3'
+        self.tag.save()
+        self.assertEqual(lookups.get_rows(Tag, [self.tag.id], ('slug', ))[self.tag.id]['slug'], 'python3')
+
+
+class FeedVersionTests(ForumTestCase):
+    def test_tag_change_updates_etag(self):
+        # в ленте по тегу python набор вопросов тот же, но у карточки появился новый тег
+        other = Tag.objects.create(title='django')
+        url = f'/?tag={self.tag.slug}'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.question.tags.add(other)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'django')
+
+    def test_question_etag_changes(self):
+        first = self.answer
+        second = Answer.objects.create(question=self.question, answer_text='Second answer', author=self.author)
+        self.client.force_login(self.author)
+
+        def mark(answer, checked):
+            data = {'is_correct': 'on'} if checked else {}
+            self.client.post(f'/answer/{answer.id}/mark_correct/', data)
+
+        mark(first, True)
+        paths = [f'/question/id/{self.question.id}', f'/api/questions/{self.question.id}/']
+        etags = {path: self.client.get(path)['ETag'] for path in paths}
+
+        # принятый ответ переходит на другой: число отмеченных и голоса те же
+        mark(first, False)
+        mark(second, True)
+        for path in paths:
+            with self.subTest(path=path, change='accepted answer'):
+                response = self.client.get(path, HTTP_IF_NONE_MATCH=etags[path])
+                self.assertEqual(response.status_code, 200)
+                self.assertFalse(response.has_header('Last-Modified'))
+                etags[path] = response['ETag']
+
+        # правка в тот же день: updated_at (дата) не меняется
+        self.question.title = 'How to test pages quickly'
+        self.question.save()
+        for path in paths:
+            with self.subTest(path=path, change='same-day edit'):
+                response = self.client.get(path, HTTP_IF_NONE_MATCH=etags[path])
+                self.assertEqual(response.status_code, 200)
+                self.assertContains(response, 'quickly')
+
+    def test_feed_etag_changes_on_same_day_edit(self):
+        for path in ('/', '/api/questions/'):
+            etag = self.client.get(path)['ETag']
+            self.question.title += '!'
+            self.question.save()
+            with self.subTest(path=path):
+                response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertFalse(response.has_header('Last-Modified'))
+
+    def test_search_has_no_etag(self):
+        for path in ('/', '/api/questions/'):
+            with self.subTest(path=path):
+                response = self.client.get(path, {'search': 'test'})
+                self.assertEqual(response.status_code, 200)
+                self.assertFalse(response.has_header('ETag'))
+
+
+class StaticEncodingTests(SimpleTestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        for name in ('app.css', 'app.css.gz', 'app.css.br'):
+            with open(os.path.join(root.name, name), 'wb') as f:
+                f.write(name.encode())
+        self.app = StaticFilesApplication(None, root=root.name, prefix='/static/')
+
+    def get_encoding(self, accept_encoding):
+        headers = {}
+        def start_response(status, response_headers):
+            headers.update(response_headers)
+        body = self.app({'PATH_INFO': '/static/app.css', 'REQUEST_METHOD': 'GET', 'HTTP_ACCEPT_ENCODING': accept_encoding}, start_response)
+        b''.join(body)
+        body.close()
+        return headers.get('Content-Encoding')
+
+    def test_accept_encoding_q_values(self):
+        cases = {
+            'gzip, deflate, br': 'br',
+            'br;q=0, gzip': 'gzip',
+            'gzip;q=0, br;q=0': None,
+            'identity': None,
+            '*': 'br',
+            'x-gzip-like': None,
+        }
+        for header, expected in cases.items():
+            with self.subTest(header=header):
+                self.assertEqual(self.get_encoding(header), expected)
+
+
+class AvatarUploadTests(ForumTestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.media_root = root.name
+        self.enterContext(override_settings(MEDIA_ROOT=root.name))
+
+    def test_same_avatar_is_stored_once(self):
+        other = User.objects.create_user('other', 'other@example.com', 'Secret-pass-123')
+        for user in (self.author, other):
+            # как после ModelForm: файл присваивается полю, сохраняется в save()
+            user.avatar = ContentFile(b'same picture', name='me.PNG')
+            user.save()
+
+        self.assertEqual(self.author.avatar.name, other.avatar.name)
+        self.assertTrue(media.is_hashed(other.avatar.name))
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'avatars')), [os.path.basename(other.avatar.name)])
+
+
+class RepeatedQueriesTests(ForumTestCase):
+    # на странице несколько вопросов, ответов и авторов: запрос в цикле повторился бы больше THRESHOLD раз
+    THRESHOLD = 2
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        tags = [cls.tag, Tag.objects.create(title='django')]
+        question_ct = ContentType.objects.get_for_model(Question)
+        answer_ct = ContentType.objects.get_for_model(Answer)
+        for i in range(6):
+            user = User.objects.create_user(f'user{i}', f'user{i}@example.com', 'Secret-pass-123')
+            question = Question.objects.create(title=f'Question number {i}', detailed='Text', author=user)
+            question.tags.add(*tags)
+            answer = Answer.objects.create(question=cls.question, answer_text=f'Answer {i}', author=user)
+            Vote.objects.create(user=user, value=1, content_type=question_ct, object_id=cls.question.id)
+            Vote.objects.create(user=user, value=1, content_type=answer_ct, object_id=answer.id)
+        cls.user = user
+
+    def assert_no_repeated_queries(self, paths):
+        for path in paths:
+            with self.subTest(path=path):
+                with nplusone.guard(threshold=self.THRESHOLD):
+                    response = self.client.get(path)
+                self.assertEqual(response.status_code, 200)
+
+    def get_paths(self):
+        return [
+            '/',
+            f'/?tag={self.tag.slug}',
+            f'/question/id/{self.question.id}',
+            '/api/questions/',
+            f'/api/questions/{self.question.id}/',
+            '/api/tags/',
+        ]
+
+    def test_anonymous(self):
+        self.assert_no_repeated_queries(self.get_paths())
+
+    def test_authenticated(self):
+        self.client.force_login(self.user)
+        timeline.follow_tag(self.user, self.tag)
+        self.assertContains(self.client.get('/feed/'), 'Question number 0')
+        self.assert_no_repeated_queries(self.get_paths() + ['/feed/'])
+
+    def test_archived_question(self):
+        call_command('archive_questions', older_than_days=-1, stdout=io.StringIO())
+        self.assertTrue(ArchivedQuestion.objects.filter(pk=self.question.pk).exists())
+        self.client.force_login(self.user)
+        self.assert_no_repeated_queries([f'/question/id/{self.question.id}'])
+
+
+class PasswordPoolTests(SimpleTestCase):
+    @unittest.skipUnless(hasattr(os, 'fork'), 'нужен fork')
+    def test_pool_works_after_fork(self):
+        passwords.run_in_pool(len, 'x') # пул и его поток созданы в родителе
+        pid = os.fork()
+        if pid == 0:
+            signal.alarm(5) # зависший пул убьет дочерний процесс сигналом
+            os._exit(0 if passwords.run_in_pool(len, 'abc') == 3 else 1)
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+
+    def test_preload_and_validator_share_cache(self):
+        passwords.preload()
+        self.assertIs(passwords.CommonPasswordValidator().passwords, passwords.common_passwords())
+
+
+class ExportImportTests(ForumTestCase):
+    def test_round_trip(self):
+        follower = User.objects.create_user('follower', 'follower@example.com', 'Secret-pass-123')
+        FollowedAuthor.objects.create(follower=follower, author=self.author)
+        Vote.objects.create(user=follower, value=1, content_type=ContentType.objects.get_for_model(Question), object_id=self.question.id)
+
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        path = os.path.join(root.name, 'forum.jsonl.gz')
+        call_command('export_forum', path, verbosity=0)
+
+        # пользователи остаются (импорт сопоставляет их по username), остальное удаляем
+        Vote.objects.all().delete()
+        Question.all_objects.all().delete()
+        Tag.objects.all().delete()
+        call_command('import_forum', path, batch_size=2, stdout=io.StringIO())
+
+        question = Question.objects.get()
+        self.assertEqual(question.title, 'How to test pages')
+        self.assertEqual(question.author, self.author)
+        self.assertEqual([tag.title for tag in question.tags.all()], ['python'])
+        self.assertEqual(question.answers_count, 1)
+        self.assertEqual(question.rating, 1)
+        self.assertIn('<strong>text</strong>', question.detailed_html)
+        # побочные эффекты save(), которые bulk_create пропускает
+        self.assertTrue(QuestionSignature.objects.filter(question=question).exists())
+        self.assertTrue(TimelineEntry.objects.filter(user=follower, question=question).exists())
+
+
+@override_settings(RATE_LIMITS={'ask': '2/m'})
+class RateLimitTests(ForumTestCase):
+    def setUp(self):
+        caches[ratelimit.settings.RATE_LIMIT_CACHE_ALIAS].clear()
+
+    def test_limit_returns_429(self):
+        self.client.force_login(self.author)
+        statuses = [self.client.post('/ask/', {}).status_code for _ in range(2)]
+        self.assertEqual(statuses, [200, 200]) # форма с ошибками, но лимит не превышен
+        response = self.client.post('/ask/', {})
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        # GET не ограничивается
+        self.assertEqual(self.client.get('/ask/').status_code, 200)
+
+    def test_limit_resets_after_window(self):
+        limiter = ratelimit.SlidingWindowLimiter('ask', '2/m')
+        counters = ratelimit.LocalCounters()
+        with mock.patch('mainpage.ratelimit.time.time', return_value=6000.0):
+            self.assertEqual([limiter.hit('ip:1', counters) for _ in range(2)], [0, 0])
+            self.assertGreater(limiter.hit('ip:1', counters), 0)
+        # через два окна предыдущее окно уже не учитывается
+        with mock.patch('mainpage.ratelimit.time.time', return_value=6120.0):
+            self.assertEqual(limiter.hit('ip:1', counters), 0)
+
+    def test_local_counters_evict_expired_windows(self):
+        counters = ratelimit.LocalCounters()
+        with mock.patch('mainpage.ratelimit.time.time', return_value=1000.0):
+            for i in range(50):
+                counters.incr(f'rl:ask:ip:{i}:16', 120)
+        self.assertEqual(len(counters), 50)
+        with mock.patch('mainpage.ratelimit.time.time', return_value=1000.0 + 121):
+            counters.incr('rl:ask:ip:new:18', 120)
+        self.assertEqual(len(counters), 1)
+
+    def test_local_counters_are_bounded(self):
+        counters = ratelimit.LocalCounters()
+        counters.MAX_KEYS = 10
+        for i in range(25):
+            counters.incr(f'key:{i}', 120)
+        self.assertLessEqual(len(counters), 10)
+        self.assertEqual(counters.get_many(['key:24']), {'key:24': 1})
+
+
+class SessionStoreTests(TestCase):
+    def test_refuses_local_cache(self):
+        with self.assertRaises(ImproperlyConfigured):
+            SessionStore()
+
+    def test_writes_through_to_db(self):
+        with tempfile.TemporaryDirectory() as cache_dir, override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': cache_dir,
+        }}):
+            store = SessionStore()
+            store['user'] = 1
+            store.save()
+            self.assertTrue(Session.objects.filter(session_key=store.session_key).exists())
+            # кеш потерян - сессия читается из БД
+            caches['default'].clear()
+            self.assertEqual(SessionStore(store.session_key)['user'], 1)
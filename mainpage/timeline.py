@@ -0,0 +1,156 @@
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F, Q
+
+from mainpage.models import Question, Tag, FollowedTag, FollowedAuthor, TimelineEntry
+
+
+# Персональная лента по подпискам на теги и авторов.
+# Запись (fan-out): новый вопрос раскладывается строками TimelineEntry всем
+# подписчикам его тегов и автора, в фоновом потоке после коммита.
+# Теги, у которых подписчиков больше FEED_FANOUT_MAX_FOLLOWERS, не раскладываются -
+# их вопросы дочитываются при показе ленты (гибридный путь).
+# Чтение: диапазон по индексу (user, question) от курсора вниз.
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.FEED_FANOUT_WORKERS, thread_name_prefix='fanout')
+        return _executor
+
+
+def push_tag_ids(tag_ids):
+    return list(
+        Tag.objects.filter(id__in=tag_ids, followers_count__lte=settings.FEED_FANOUT_MAX_FOLLOWERS)
+        .values_list('id', flat=True)
+    )
+
+
+def pull_tag_ids(user_id):
+    return list(
+        FollowedTag.objects.filter(user_id=user_id, tag__followers_count__gt=settings.FEED_FANOUT_MAX_FOLLOWERS)
+        .values_list('tag_id', flat=True)
+    )
+
+
+def write_entries(rows):
+    # rows: (user_id, question_id, score)
+    return len(TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id, question_id=question_id, score=score) for user_id, question_id, score in rows],
+        batch_size=settings.FEED_FANOUT_BATCH_SIZE,
+        ignore_conflicts=True,
+    ))
+
+
+def fan_out(question_id):
+    question = Question.objects.filter(pk=question_id).values('author_id').first()
+    if question is None:
+        return 0
+
+    tag_ids = Question.tags.through.objects.filter(question_id=question_id).values_list('tag_id', flat=True)
+    scores = Counter()
+    for user_id in FollowedTag.objects.filter(tag_id__in=push_tag_ids(tag_ids)).values_list('user_id', flat=True).iterator():
+        scores[user_id] += 1
+    for user_id in FollowedAuthor.objects.filter(author_id=question['author_id']).values_list('follower_id', flat=True).iterator():
+        scores[user_id] += 1
+    scores.pop(question['author_id'], None) # свои вопросы в ленту не кладем
+
+    return write_entries((user_id, question_id, score) for user_id, score in scores.items())
+
+
+def run_fan_out(question_id):
+    try:
+        fan_out(question_id)
+    except Exception:
+        logger.exception('Fan-out of question %s failed', question_id)
+    finally:
+        connections.close_all() # у потока пула свои соединения
+
+
+def schedule_fan_out(question_id):
+    # вопрос и его теги должны быть видны фоновому потоку, поэтому только после коммита
+    if settings.FEED_FANOUT_ASYNC:
+        transaction.on_commit(lambda: get_executor().submit(run_fan_out, question_id))
+    else:
+        transaction.on_commit(lambda: fan_out(question_id))
+
+
+def rebuild_timeline(user_id):
+    # лента пользователя заново из последних FEED_BACKFILL_SIZE вопросов его подписок
+    tag_ids = push_tag_ids(FollowedTag.objects.filter(user_id=user_id).values_list('tag_id', flat=True))
+    author_ids = list(FollowedAuthor.objects.filter(follower_id=user_id).values_list('author_id', flat=True))
+
+    scores = Counter()
+    if tag_ids or author_ids:
+        question_ids = list(
+            Question.objects.filter(Q(tags__in=tag_ids) | Q(author_id__in=author_ids))
+            .exclude(author_id=user_id)
+            .order_by('-id').values_list('id', flat=True).distinct()[:settings.FEED_BACKFILL_SIZE]
+        )
+        links = Question.tags.through.objects.filter(question_id__in=question_ids, tag_id__in=tag_ids)
+        scores.update(links.values_list('question_id', flat=True))
+        scores.update(
+            Question.objects.filter(id__in=question_ids, author_id__in=author_ids).values_list('id', flat=True)
+        )
+
+    with transaction.atomic():
+        TimelineEntry.objects.filter(user_id=user_id).delete()
+        return write_entries((user_id, question_id, score) for question_id, score in scores.items())
+
+
+def set_follow(model, counter_model, lookup, counter_id, follow):
+    # общая часть подписки/отписки; возвращает True, если что-то изменилось
+    with transaction.atomic():
+        if follow:
+            _, changed = model.objects.get_or_create(**lookup)
+        else:
+            changed = model.objects.filter(**lookup).delete()[0] > 0
+        if changed and counter_model is not None:
+            counter_model.objects.filter(pk=counter_id).update(followers_count=F('followers_count') + (1 if follow else -1))
+    return changed
+
+
+def follow_tag(user, tag, follow=True):
+    changed = set_follow(FollowedTag, Tag, {'user': user, 'tag': tag}, tag.pk, follow)
+    if changed:
+        rebuild_timeline(user.pk)
+    return changed
+
+
+def follow_author(user, author, follow=True):
+    if author.pk == user.pk:
+        return False
+    changed = set_follow(FollowedAuthor, None, {'follower': user, 'author': author}, author.pk, follow)
+    if changed:
+        rebuild_timeline(user.pk)
+    return changed
+
+
+def read_feed(user_id, before=None, limit=20):
+    # id вопросов страницы ленты, от новых к старым
+    entries = TimelineEntry.objects.filter(user_id=user_id)
+    if before is not None:
+        entries = entries.filter(question_id__lt=before)
+    question_ids = list(entries.order_by('-question_id').values_list('question_id', flat=True)[:limit])
+
+    pull_tags = pull_tag_ids(user_id)
+    if pull_tags:
+        pulled = Question.objects.filter(tags__in=pull_tags).exclude(author_id=user_id)
+        if before is not None:
+            pulled = pulled.filter(id__lt=before)
+        pulled = pulled.order_by('-id').values_list('id', flat=True).distinct()[:limit]
+        question_ids = sorted(set(question_ids).union(pulled), reverse=True)[:limit]
+
+    return question_ids
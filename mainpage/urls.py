@@ -1,19 +1,30 @@
 from django.contrib.auth.views import LogoutView
 from django.contrib.auth import views as auth_views
+from django.conf import settings
 from django.urls import path, include
-from mainpage import views
+from mainpage import views, api, async_views
 
 app_name = 'mainpage'
 
+# лента и страница вопроса: асинхронные версии имеют смысл только под ASGI
+page_views = async_views if settings.ASYNC_VIEWS else views
+
 urlpatterns = [
-    path('', views.IndexView.as_view(), name='index'),
+    path('', page_views.IndexView.as_view(), name='index'),
+    path('feed/', views.FeedView.as_view(), name='feed'),
     path('ask/', views.AskView.as_view(), name='ask'),
-    path('question/id/<int:qid>', views.QuestionView.as_view(), name='question_by_id'),
-    path('question/<slug:slug>', views.QuestionView.as_view(), name='question_by_slug'),
+    path('question/id/<int:qid>', page_views.QuestionView.as_view(), name='question_by_id'),
+    path('question/<slug:slug>', page_views.QuestionView.as_view(), name='question_by_slug'),
     path('registration/', views.RegistrationView.as_view(), name='registration'),
     path('logout/', LogoutView.as_view(next_page='mainpage:index'), name='logout'),
     path('login/', views.LoginView.as_view(), name='login'),
     path('settings/', views.SettingsView.as_view(), name='settings'),
     path('vote/', views.vote, name='vote'),
+    path('follow/', views.follow, name='follow'),
     path('answer/<int:aid>/mark_correct/', views.mark_correct, name='mark_correct'),
+    path('api/questions/', api.QuestionListApiView.as_view(), name='api_questions'),
+    path('api/questions/<int:qid>/', api.QuestionDetailApiView.as_view(), name='api_question'),
+    path('api/tags/', api.TagListApiView.as_view(), name='api_tags'),
+    path('api/suggest/', api.SuggestApiView.as_view(), name='api_suggest'),
+    path('api/lookup-stats/', api.LookupCacheStatsApiView.as_view(), name='api_lookup_stats'),
 ]
@@ -1,24 +1,53 @@
 from django.contrib.contenttypes.models import ContentType
-from django.db import transaction
+from django.db import connection
 from django.db.models import Sum
 from mainpage.models import Vote
+from mainpage import live
+
+
+MAX_VOTE_ATTEMPTS = 5
+
+
+def insert_vote(user, ct, obj, value):
+    # INSERT ... ON CONFLICT DO NOTHING: вставляет голос, только если его еще нет
+    table = connection.ops.quote_name(Vote._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (user_id, content_type_id, object_id, value) VALUES (%s, %s, %s, %s) "
+            "ON CONFLICT (user_id, content_type_id, object_id) DO NOTHING",
+            [user.pk, ct.pk, obj.id, value],
+        )
+        return cursor.rowcount
+
+
+def apply_vote(user, ct, obj, value):
+    # Каждый шаг - один условный запрос без предварительного SELECT, поэтому
+    # параллельные запросы не падают на уникальном ограничении.
+    # Возвращает изменение рейтинга или None, если строку успели поменять между шагами
+    if insert_vote(user, ct, obj, value):
+        return value
+
+    votes = Vote.objects.filter(user=user, content_type=ct, object_id=obj.id)
+    if votes.filter(value=value).delete()[0]:
+        return -value # повторное нажатие снимает голос
+    if votes.filter(value=-value).update(value=value):
+        return 2 * value
+    return None
+
 
 def toggle_vote(user, obj, value):
     ct = ContentType.objects.get_for_model(obj.__class__)
 
-    with transaction.atomic(): #защита от race condition в БД
-        vote = Vote.objects.filter(user=user, content_type=ct, object_id=obj.id).first()
-
-        if not vote:
-            Vote.objects.create(user=user, content_type=ct, object_id=obj.id, value=value)
-        else:
-            if vote.value == value:
-                vote.delete()
-            else:
-                vote.value = value
-                vote.save(update_fields=['value'])
+    for _ in range(MAX_VOTE_ATTEMPTS):
+        delta = apply_vote(user, ct, obj, value)
+        if delta is not None:
+            break
+    else:
+        return 0
 
+    # полный пересчет суммы нужен только тем, кто смотрит страницу прямо сейчас
+    if live.has_subscribers(obj):
         total = Vote.objects.filter(content_type=ct, object_id=obj.id).aggregate(Sum('value'))['value__sum'] or 0
+        live.publish_rating(obj, total)
 
-    return total
-        
+    return delta
@@ -0,0 +1,113 @@
+import hashlib
+
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Count, Max, Q, Sum
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from mainpage.models import Answer, Question, Tag, User, Vote, FollowedTag, FollowedAuthor
+
+
+# "Версия" страницы - это несколько дешевых агрегатов, которые меняются
+# при любом изменении данных страницы. Из них считаем ETag и отдаем 304,
+# не выполняя основные запросы.
+
+
+def make_etag(*parts):
+    raw = '|'.join(str(part) for part in parts)
+    return quote_etag(hashlib.md5(raw.encode()).hexdigest())
+
+
+def votes_version(votes):
+    agg = votes.aggregate(cnt=Count('id'), last=Max('id'), total=Sum('value'))
+    return agg['cnt'], agg['last'], agg['total']
+
+
+def feed_version(questions):
+    # questions - лента без поиска: агрегат по ней идет по индексам,
+    # а с ?search= он стоил бы столько же, сколько сама страница.
+    # Last-Modified не отдаем: updated_at - дата без времени, правка в тот же
+    # день дала бы 304 на If-Modified-Since. Правки ловит сумма version
+    agg = questions.aggregate(cnt=Count('id', distinct=True), last=Max('id'), changes=Sum('version'))
+
+    ct = ContentType.objects.get_for_model(Question)
+    answers = Answer.objects.aggregate(cnt=Count('id'), last=Max('id'))
+    # теги вопроса меняются без updated_at, а от них зависят ленты по тегу
+    links = Question.tags.through.objects.aggregate(cnt=Count('id'), last=Max('id'))
+
+    etag = make_etag(
+        'feed', agg['cnt'], agg['last'], agg['changes'],
+        answers['cnt'], answers['last'], links['cnt'], links['last'],
+        *votes_version(Vote.objects.filter(content_type=ct)),
+    )
+    return etag, None
+
+
+def question_version(question_id):
+    question = Question.objects.filter(pk=question_id).values('id', 'version', 'accepted_answer_id').first()
+    if question is None:
+        return None, None
+
+    answers = Answer.objects.filter(question_id=question_id)
+    # version вопроса растет и при правке ответов, здесь - только удаления и скрытия
+    answers_agg = answers.aggregate(cnt=Count('id'), last=Max('id'))
+
+    q_ct = ContentType.objects.get_for_model(Question)
+    a_ct = ContentType.objects.get_for_model(Answer)
+    votes = Vote.objects.filter(
+        Q(content_type=q_ct, object_id=question_id) |
+        Q(content_type=a_ct, object_id__in=answers.values('id'))
+    )
+
+    etag = make_etag(
+        'question', question['id'], question['version'], question['accepted_answer_id'],
+        answers_agg['cnt'], answers_agg['last'],
+        *votes_version(votes),
+    )
+    # Last-Modified не отдаем по той же причине, что и в feed_version
+    return etag, None
+
+
+def tags_version():
+    agg = Tag.objects.aggregate(cnt=Count('id'), last=Max('id'))
+    links = Question.tags.through.objects.aggregate(cnt=Count('id'), last=Max('id'))
+    return make_etag('tags', agg['cnt'], agg['last'], links['cnt'], links['last']), None
+
+
+def sidebar_version():
+    # боковая панель со списками тегов и пользователей есть на каждой странице
+    tags = Tag.objects.aggregate(cnt=Count('id'), last=Max('id'))
+    users = User.objects.aggregate(cnt=Count('id'), last=Max('id'))
+    return tags['cnt'], tags['last'], users['cnt'], users['last']
+
+
+def user_version(user):
+    # шапка, подсветка голосов и кнопки подписки зависят от текущего пользователя
+    if not user or not user.is_authenticated:
+        return ('anonymous', )
+    follows = (
+        FollowedTag.objects.filter(user=user).aggregate(cnt=Count('id'), last=Max('id')),
+        FollowedAuthor.objects.filter(follower=user).aggregate(cnt=Count('id'), last=Max('id')),
+    )
+    return (
+        user.pk, user.username, user.avatar.name if user.avatar else '',
+        *votes_version(Vote.objects.filter(user=user)),
+        *(agg[key] for agg in follows for key in ('cnt', 'last')),
+    )
+
+
+def not_modified_response(request, etag):
+    # Решение о 304 принимаем только по ETag: updated_at хранит лишь дату,
+    # а голоса вообще без времени, поэтому If-Modified-Since без ETag
+    # отдал бы устаревшую страницу
+    if etag is None:
+        return None
+    return get_conditional_response(request, etag=etag)
+
+
+def set_version_headers(response, etag, last_modified=None):
+    if etag is not None:
+        response.headers['ETag'] = etag
+    if last_modified is not None:
+        response.headers['Last-Modified'] = http_date(last_modified.timestamp())
+    return response
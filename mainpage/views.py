@@ -8,18 +8,21 @@ from django.views.decorators.http import require_POST
 from django.http import JsonResponse, HttpResponseForbidden, Http404
 from django.urls import reverse_lazy
 from django.utils.decorators import method_decorator
-from django.db.models import Q
+from django.db import transaction
+from django.contrib.contenttypes.models import ContentType
 
-from mainpage.forms import QuestionForm, SettingsForm, RegistrationForm, AnswerForm
-from mainpage.models import Question, Answer, Tag, User
-from mainpage.mixins import TagsAndMembersMixin
+from mainpage.models import Question, Answer, Tag, User, Vote, ArchivedQuestion, ArchivedVote, FollowedTag, FollowedAuthor
+from mainpage.mixins import TagsAndMembersMixin, QuestionFilterMixin, ConditionalPageMixin, LazyFormClassMixin, PaginationMixin
+from mainpage import versions, live, lookups, timeline
 from mainpage.utilts import toggle_vote
+from mainpage.api import rating_subquery
+from mainpage.ratelimit import ratelimit, RateLimitMixin
 
-import math
 
 
 @login_required
 @require_POST
+@ratelimit('vote')
 def vote(request):
     target = request.POST.get('target')
     
@@ -53,78 +56,50 @@ def mark_correct(request, aid):
 
     is_checked = 'is_correct' in request.POST
 
-    answer.is_correct = is_checked
-    answer.save(update_fields=['is_correct'])
+    with transaction.atomic():
+        answer.is_correct = is_checked
+        answer.save(update_fields=['is_correct'])
+        question.update_accepted_answer(answer)
+    live.publish_correct(answer)
 
     return redirect(request.META.get('HTTP_REFERER', '/'))
 
+@login_required
+@require_POST
+def follow(request):
+    target = request.POST.get('target')
+    slug = request.POST.get('slug', '')
+    subscribe = request.POST.get('action') != 'unfollow'
 
-class IndexView(TagsAndMembersMixin, TemplateView):
+    if target == 'tag':
+        timeline.follow_tag(request.user, get_object_or_404(Tag, slug=slug), subscribe)
+    elif target == 'author':
+        timeline.follow_author(request.user, get_object_or_404(User, slug=slug), subscribe)
+
+    return redirect(request.META.get('HTTP_REFERER', '/'))
+
+
+class IndexView(ConditionalPageMixin, QuestionFilterMixin, TagsAndMembersMixin, PaginationMixin, TemplateView):
     http_method_names = [ 'get', ]
     template_name = 'mainpage/index.html'
     QUESTIONS_PER_PAGE = 4
 
-    def get_questions(self, tag = None, user = None, search = None):
-        question = Question.objects.all()
-        if tag:
-            tag_obj = Tag.objects.filter(slug=tag).first()
-            if tag_obj:
-                question = question.filter(tags=tag_obj)
-        if user:
-            question = question.filter(author=user)
-        
-        if search:
-            words = search.split()
-            for word in words:
-                question = question.filter(
-                    Q(slug__icontains=word) |
-                    Q(title__icontains=word) |
-                    Q(detailed__icontains=word) |
-                    Q(author__username__icontains=word) |
-                    Q(tags__slug__icontains=word)
-                ).distinct()
-        
-        return question
+    def get_page_version(self):
+        return self.get_feed_version()
 
     def get_context_data(self, **kwargs):
         context = super(IndexView, self).get_context_data(**kwargs) 
 
-        tag = self.request.GET.get('tag', None)
-        author_slug = self.request.GET.get('author', None)
-        author = None
-        if author_slug:
-            author = User.objects.filter(slug=author_slug).first()
-        
         search_query = self.request.GET.get('search', '').strip()
-        questions = self.get_questions(tag=tag, user=author, search=search_query).order_by('-id')
+        questions = self.get_filtered_questions().order_by('-id')
         context['search_query'] = search_query
         context['count_questions'] = questions.count()
         context['questions_per_page'] = self.QUESTIONS_PER_PAGE
-        context['max_page'] = math.ceil(questions.count() / self.QUESTIONS_PER_PAGE)
-        if context['max_page'] <= 0: context['max_page'] = 1
-
-        page = self.request.GET.get('page', 1)
-        try: # Защищаемся от выхода за предел страниц и ввод строки
-            page = int(page)
-            if page < 1:
-                page = 1
-            elif page > context['max_page']:
-                page = context['max_page']
-        except:
-            page = 1
-        context['page'] = page
-
-        # Вычисляем номера страниц, которые нужно показывать
-        # Вроде максимально просто сделал
-        if context['max_page'] < 6:
-            context['pages'] = [i for i in range(1, context['max_page'] + 1)]
-        elif page < 4:
-            context['pages'] = [i for i in range(1, 5)] + [context['max_page']]
-        elif page > (context['max_page'] - 3):
-            context['pages'] = [1] + [i for i in range(context['max_page'] - 3, context['max_page'] + 1)]
-        else: 
-            context['pages'] = [1] + [i for i in range(page - 1, page + 2)] + [context['max_page']]
+        context.update(self.get_pagination(context['count_questions'], self.QUESTIONS_PER_PAGE))
+        page = context['page']
 
+        # карточке нужен только excerpt, полный текст и HTML не читаем
+        questions = with_card_data(questions).defer('detailed', 'detailed_html')
         if page == 1:
             context["new_questions"] = questions[0:self.QUESTIONS_PER_PAGE]
         else:
@@ -133,20 +108,71 @@ class IndexView(TagsAndMembersMixin, TemplateView):
         # Временная затычка, выводим первые 20 тегов и пользователей
         context['tags_list'], context['members_list'] = self.get_tags_and_members()[:20]
 
+        context.update(self.get_follow_context())
+        return context
+
+    def get_follow_context(self):
+        # кнопки подписки на выбранный тег / автора
+        context = {}
+        if self.request.user.is_authenticated:
+            tag_id = lookups.get_tag_id(self.request.GET.get('tag', ''))
+            if tag_id:
+                context['follow_tag'] = FollowedTag.objects.filter(user=self.request.user, tag_id=tag_id).exists()
+            author_id = lookups.get_user_id(self.request.GET.get('author', ''))
+            if author_id and author_id != self.request.user.pk:
+                context['follow_author'] = FollowedAuthor.objects.filter(follower=self.request.user, author_id=author_id).exists()
         return context
     
     
     def dispatch(self, request, *args, **kwargs):
         print(request)
         return super(IndexView, self).dispatch(request, *args, **kwargs)
+
+
+def with_card_data(questions):
+    # все, что читает _question_card.html: автор, теги и рейтинг - без запроса на карточку
+    return (
+        questions.select_related('author')
+        .prefetch_related('tags')
+        .annotate(annotated_rating=rating_subquery(Question))
+    )
+
+
+class FeedView(LoginRequiredMixin, TagsAndMembersMixin, TemplateView):
+    # Персональная лента: вопросы подписанных тегов и авторов, курсор ?before=<id>
+    http_method_names = [ 'get', ]
+    template_name = 'mainpage/feed.html'
+    QUESTIONS_PER_PAGE = 20
+
+    def get_context_data(self, **kwargs):
+        context = super(FeedView, self).get_context_data(**kwargs)
+
+        try:
+            before = int(self.request.GET['before'])
+        except (KeyError, ValueError):
+            before = None
+
+        question_ids = timeline.read_feed(self.request.user.pk, before, self.QUESTIONS_PER_PAGE)
+        questions = (
+            with_card_data(Question.objects.filter(id__in=question_ids))
+            .defer('detailed', 'detailed_html')
+            .order_by('-id')
+        )
+        context['new_questions'] = questions
+        context['next_before'] = question_ids[-1] if len(question_ids) == self.QUESTIONS_PER_PAGE else None
+        context['followed_tags'] = Tag.objects.filter(follows__user=self.request.user).order_by('title')
+        context['followed_authors'] = User.objects.filter(followers__follower=self.request.user).order_by('username')
+        context['tags_list'], context['members_list'] = self.get_tags_and_members()
+        return context
     
 
 
-class AskView(TagsAndMembersMixin, LoginRequiredMixin, FormView):
+class AskView(LazyFormClassMixin, TagsAndMembersMixin, LoginRequiredMixin, RateLimitMixin, FormView):
     http_method_names = [ 'get', 'post', ]
     template_name = 'mainpage/ask.html'
-    form_class = QuestionForm
+    form_class_name = 'QuestionForm'
     success_url = reverse_lazy('mainpage:index')
+    ratelimit_name = 'ask'
 
     def form_valid(self, form):
         question = form.save(commit=False)
@@ -159,6 +185,7 @@ class AskView(TagsAndMembersMixin, LoginRequiredMixin, FormView):
             tag_obj, _ = Tag.objects.get_or_create(title=t.strip().lower())
             tag_objs.append(tag_obj)
         question.tags.set(tag_objs)
+        timeline.schedule_fan_out(question.id)
 
         return super().form_valid(form)
     
@@ -172,10 +199,10 @@ class AskView(TagsAndMembersMixin, LoginRequiredMixin, FormView):
         return super(AskView, self).dispatch(request, *args, **kwargs)
 
 
-class SettingsView(TagsAndMembersMixin, LoginRequiredMixin, FormView):
+class SettingsView(LazyFormClassMixin, TagsAndMembersMixin, LoginRequiredMixin, FormView):
     http_method_names = [ 'get', 'post']
     template_name = 'mainpage/settings.html'
-    form_class = SettingsForm
+    form_class_name = 'SettingsForm'
     success_url = reverse_lazy('mainpage:settings')
 
     def get_form_kwargs(self): # для заполнения полей инфой о текущем пользователе
@@ -191,7 +218,7 @@ class SettingsView(TagsAndMembersMixin, LoginRequiredMixin, FormView):
         return super().form_valid(form)
     
     def post(self, request, *args, **kwargs):
-        form = self.form_class(request.POST, request.FILES, instance=request.user)
+        form = self.get_form_class()(request.POST, request.FILES, instance=request.user)
 
         if form.is_valid():
             return self.form_valid(form)
@@ -208,27 +235,49 @@ class SettingsView(TagsAndMembersMixin, LoginRequiredMixin, FormView):
         return super(SettingsView, self).dispatch(request, *args, **kwargs)
     
 
-class QuestionView(TagsAndMembersMixin, FormView):
+class QuestionView(LazyFormClassMixin, ConditionalPageMixin, TagsAndMembersMixin, PaginationMixin, FormView):
     http_method_names = [ 'get', 'post' ]
     template_name = 'mainpage/question.html'
-    form_class = AnswerForm
+    form_class_name = 'AnswerForm'
     success_url = reverse_lazy('')
     ANSWERS_PER_PAGE = 4
+    PUBLIC_CACHE = False # форма ответа содержит csrf_token
 
     def get_object(self):
         slug = self.kwargs.get('slug')
         qid = self.kwargs.get('qid')
         
         if slug:
-            question = Question.objects.filter(slug=slug).first()
+            qid = lookups.get_question_id(slug)
+            question = (Question.objects.filter(pk=qid).first() if qid else None) or ArchivedQuestion.visible.filter(slug=slug).first()
             if question:
                 return question
         
         elif qid > 0:
-            return get_object_or_404(Question, pk=qid)
+            question = Question.objects.filter(pk=qid).first() or ArchivedQuestion.visible.filter(pk=qid).first()
+            if question:
+                return question
         
         raise Http404("Question not found")
 
+    def get_page_version(self):
+        qid = self.kwargs.get('qid')
+        slug = self.kwargs.get('slug')
+        if slug:
+            qid = lookups.get_question_id(slug)
+        if not qid:
+            return None, None # пусть 404 отдаст обычный путь
+        return versions.question_version(qid)
+
+    def get_user_votes(self, vote_model, answers):
+        # голоса пользователя за все ответы страницы одним запросом: {id ответа: значение}
+        if not self.request.user.is_authenticated or not answers:
+            return {}
+        model = type(answers[0])
+        ct = ContentType.objects.get_for_model(getattr(model, 'ARCHIVED_FROM', model))
+        votes = vote_model.objects.filter(user=self.request.user, content_type=ct, object_id__in=[answer.id for answer in answers])
+        return dict(votes.values_list('object_id', 'value'))
+
     def get_context_data(self, **kwargs):
         context = super(QuestionView, self).get_context_data(**kwargs)
         question = self.get_object()
@@ -237,34 +286,18 @@ class QuestionView(TagsAndMembersMixin, FormView):
         context['question_rating'] = question.rating
         context['user_vote_question'] = question.get_user_vote(self.request.user)
 
-        answers = question.answer_set.select_related('author').all()
+        # у архивных ответов менеджер по умолчанию не скрывает неактивные, фильтруем явно
+        answers = question.answer_set.filter(is_active=True).select_related('author').defer('answer_text')
+        vote_model = ArchivedVote if question.is_archived else Vote
+        answers = list(answers.annotate(annotated_rating=rating_subquery(answers.model, vote_model)))
+        user_votes = self.get_user_votes(vote_model, answers)
         # сортируем от лучших ответов к худшим
-        context['answers'] = sorted([(ans, ans.get_user_vote(self.request.user), ans.rating) for ans in answers], key=lambda x: x[2], reverse=True)
+        context['answers'] = sorted([(ans, user_votes.get(ans.id, 0), ans.rating) for ans in answers], key=lambda x: x[2], reverse=True)
 
-        context['count_answers'] = answers.count()
+        context['count_answers'] = len(answers)
         context['answers_per_page'] = self.ANSWERS_PER_PAGE
-        context['max_page'] = math.ceil(answers.count() / self.ANSWERS_PER_PAGE)
-        if context['max_page'] <= 0: context['max_page'] = 1
-
-        page = self.request.GET.get('page', 1)
-        try:
-            page = int(page)
-            if page < 1:
-                page = 1
-            elif page > context['max_page']:
-                page = context['max_page']
-        except:
-            page = 1
-        context['page'] = page
-
-        if context['max_page'] < 6:
-            context['pages'] = [i for i in range(1, context['max_page'] + 1)]
-        elif page < 4:
-            context['pages'] = [i for i in range(1, 5)] + [context['max_page']]
-        elif page > (context['max_page'] - 3):
-            context['pages'] = [1] + [i for i in range(context['max_page'] - 3, context['max_page'] + 1)]
-        else: 
-            context['pages'] = [1] + [i for i in range(page - 1, page + 2)] + [context['max_page']]
+        context.update(self.get_pagination(context['count_answers'], self.ANSWERS_PER_PAGE))
+        page = context['page']
 
         if page == 1:
             context["best_answers"] = context['answers'][0:self.ANSWERS_PER_PAGE]
@@ -275,22 +308,28 @@ class QuestionView(TagsAndMembersMixin, FormView):
         return context
     
     @method_decorator(login_required)
+    @method_decorator(ratelimit('answer'))
     def post(self, request, *args, **kwargs):
+        question = self.get_object()
+        if question.is_archived:
+            return HttpResponseForbidden("Question is archived.")
+
         form = self.get_form()
         if form.is_valid():
             answer = form.save(commit=False)
             answer.author = request.user
-            answer.question = self.get_object()
+            answer.question = question
             answer.save()
+            live.publish_answer(answer)
             return redirect(request.path)
         
         return self.form_invalid(form)
 
 
-class RegistrationView(TagsAndMembersMixin, FormView):
+class RegistrationView(LazyFormClassMixin, TagsAndMembersMixin, FormView):
     http_method_names = [ 'get', 'post', ]
     template_name = 'mainpage/registration.html'
-    form_class = RegistrationForm
+    form_class_name = 'RegistrationForm'
     success_url = reverse_lazy('mainpage:index')
 
     def get_form_kwargs(self):
@@ -13,4 +13,15 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'vibecode_forum.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from mainpage.live import EVENTS_PATH_RE, events_application
+
+
+async def application(scope, receive, send):
+    # SSE-поток вопроса обслуживаем напрямую, минуя middleware Django
+    if scope['type'] == 'http':
+        match = EVENTS_PATH_RE.match(scope['path'])
+        if match:
+            return await events_application(scope, receive, send, int(match['qid']))
+    return await django_application(scope, receive, send)
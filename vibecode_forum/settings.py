@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 from config import secret # SECRET_KEY хранится в config.py в этой же директории
 
@@ -45,11 +46,14 @@ INSTALLED_APPS += [
 ]
 
 MIDDLEWARE = [
+    'mainpage.nplusone.NPlusOneMiddleware', # включается N_PLUS_ONE_DETECTION
     'django.middleware.security.SecurityMiddleware',
+    'mainpage.compression.CompressionMiddleware', # до всех, кто читает или меняет тело ответа
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'mainpage.lookups.RequestLookupCacheMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -60,8 +64,14 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # шаблоны ужимаются один раз при загрузке и кешируются скомпилированными
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'mainpage.templating.MinifyingLoader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
@@ -71,8 +81,23 @@ TEMPLATES = [
     },
 ]
 
+# Убирать отступы и пустые строки из HTML-шаблонов с этими префиксами (mainpage.templating)
+TEMPLATE_MINIFY = True
+TEMPLATE_MINIFY_PREFIXES = ['mainpage/']
+
+# Сжатие динамических ответов (mainpage.compression): ответы меньше порога не сжимаются
+RESPONSE_COMPRESS_MIN_SIZE = 512
+RESPONSE_GZIP_LEVEL = 6
+RESPONSE_BROTLI_QUALITY = 5
+
 WSGI_APPLICATION = 'vibecode_forum.wsgi.application'
 
+# Бюджет холодного старта воркера для `manage.py profile_startup --check`
+STARTUP_BUDGET_MS = {
+    'boot': 1500,
+    'first_request': 1000,
+}
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
@@ -88,6 +113,16 @@ DATABASES = {
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
+# Хеши считаются в ограниченном пуле (mainpage.passwords). Первый хешер - основной:
+# при входе пароли со старым pbkdf2_sha256 прозрачно перехешируются в scrypt
+PASSWORD_HASHERS = [
+    'mainpage.passwords.PooledScryptPasswordHasher',
+    'mainpage.passwords.PooledPBKDF2PasswordHasher',
+]
+PASSWORD_HASHING_WORKERS = os.cpu_count() or 1
+# Список частых паролей читается в фоне при старте, а не при первой регистрации
+PASSWORD_PRELOAD_COMMON = True
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -96,7 +131,7 @@ AUTH_PASSWORD_VALIDATORS = [
         'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
     },
     {
-        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
+        'NAME': 'mainpage.passwords.CommonPasswordValidator',
     },
     {
         'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
@@ -106,8 +141,86 @@ AUTH_PASSWORD_VALIDATORS = [
 AUTH_USER_MODEL = 'mainpage.User'
 
 
+# Кеш по умолчанию - свой у каждого процесса. Для нескольких воркеров лучше общий
+# (django.core.cache.backends.redis.RedisCache / memcached): тогда лимиты записи
+# общие для всех воркеров, а сессии сами переходят на 'cache' (см. ниже)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+SHARED_CACHE = not CACHES['default']['BACKEND'].endswith('LocMemCache')
+
+
+# Хранилище сессий:
+#   'db'      - стандартные сессии в таблице django_session
+#   'cache'   - чтение из кеша, запись сквозная: в БД и в кеш (mainpage.sessions).
+#               Нужен общий для воркеров кеш в CACHES (Redis/Memcached), с LocMem не запустится.
+#               Выбирается сам, если такой кеш настроен
+#   'cookies' - подписанные cookie, к БД не обращается вообще. Цена:
+#               * выход не отзывает cookie: ее копия остается рабочей до истечения
+#                 SESSION_COOKIE_AGE (сессию сбросит только смена пароля или SECRET_KEY);
+#               * размер сессии ограничен ~4 КБ cookie и она уходит с каждым запросом;
+#               * данные подписаны, но не зашифрованы - клиент их видит.
+# Переход на 'cookies' и обратно разлогинивает всех: старые сессии новый бэкенд не читает
+# ('db' и 'cache' хранят сессии в одной таблице и взаимозаменяемы).
+SESSION_BACKEND = 'cache' if SHARED_CACHE else 'db'
+
+SESSION_ENGINE = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cache': 'mainpage.sessions',
+    'cookies': 'django.contrib.sessions.backends.signed_cookies',
+}[SESSION_BACKEND]
+
+
 LOGIN_REDIRECT_URL = '/'
 
+# Лимиты на запись: 'N/s|m|h|d' на пользователя и на IP отдельно
+RATE_LIMITS = {
+    'vote': '60/m',
+    'ask': '5/m',
+    'answer': '20/m',
+}
+RATE_LIMIT_CACHE_ALIAS = 'default'
+
+# Кеш частых поисков по slug и списков для боковой панели (mainpage.lookups)
+LOOKUP_CACHE_SIZE = 10000
+LOOKUP_CACHE_TTL = 60
+
+# Сколько самых обсуждаемых вопросов попадает в индекс подсказок (mainpage.suggest)
+SUGGEST_QUESTIONS_LIMIT = 50000
+
+# Асинхронные IndexView и QuestionView (mainpage.async_views), для запуска под ASGI
+ASYNC_VIEWS = False
+
+# Поиск N+1 (mainpage.nplusone): одинаковые по форме SQL больше THRESHOLD раз за запрос
+# попадают в лог, при N_PLUS_ONE_RAISE - исключение (для тестов и staging)
+N_PLUS_ONE_DETECTION = False
+N_PLUS_ONE_THRESHOLD = 5
+N_PLUS_ONE_RAISE = False
+
+# Минимальная оценка похожести (0..1), с которой вопрос показывается как возможный дубликат
+SIMILAR_QUESTIONS_THRESHOLD = 0.5
+
+# Персональная лента (mainpage.timeline)
+# Теги с большим числом подписчиков не раскладываются при записи, а читаются при показе
+FEED_FANOUT_MAX_FOLLOWERS = 5000
+FEED_FANOUT_BATCH_SIZE = 1000
+# False - раскладка в том же потоке, что и запрос (удобно в командах и отладке)
+FEED_FANOUT_ASYNC = True
+FEED_FANOUT_WORKERS = 2
+# Сколько последних вопросов кладется в ленту при подписке или пересборке
+FEED_BACKFILL_SIZE = 200
+
+# Модерация (mainpage.moderation): удаление сразу скрывает через is_active,
+# связанные строки удаляются в фоне пачками по MODERATION_PURGE_CHUNK_SIZE
+# с паузой между пачками, чтобы SQLite успевал пропускать запись
+MODERATION_PURGE_CHUNK_SIZE = 500
+MODERATION_PURGE_PAUSE = 0.05
+# False - очистка в том же потоке после коммита (удобно в командах и отладке)
+MODERATION_PURGE_ASYNC = True
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
@@ -126,9 +239,29 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'static'
 
+# collectstatic собирает CSS-бандлы, добавляет хеш в имена и кладет рядом .gz/.br
+STORAGES = {
+    'default': {
+        # одинаковые аватары (имя - хеш содержимого) хранятся одним файлом
+        'BACKEND': 'mainpage.media.ContentHashedFileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'mainpage.assets.CompressedManifestStaticFilesStorage',
+    },
+}
+
+# Подключать ли собранные бандлы вместо отдельных CSS-файлов
+ASSET_BUNDLES = not DEBUG
+
+# Сколько секунд анонимам можно не перепроверять HTML-страницы (ETag все равно отдается)
+HTML_CACHE_MAX_AGE = 30
+
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media/'
 
+# Отдавать MEDIA_ROOT из приложения (mainpage.media.serve) и без DEBUG - для локальных установок без nginx
+MEDIA_SERVE = True
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'vibecode_forum.settings')
 
 application = get_wsgi_application()
+
+# Собранная статика отдается прямо из процесса, с вечным кешем для файлов с хешем
+from mainpage.assets import StaticFilesApplication
+
+application = StaticFilesApplication(application)